@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Compares the speed of reader.count_lines with reading the same file.
+
+For each file, prints the throughput of:
+
+* read: reading the whole file into a reused buffer and doing nothing
+  else, i.e. the sequential read throughput;
+* count_lines: counting its newlines with reader.count_lines;
+* python lines: iterating over its lines in Python.
+
+The file is read once first so that every method reads it from the page
+cache.  Without FILE arguments, the mains.dat files of a 1 day synthetic
+dataset (see run_benchmarks.py) are used.
+
+Run from the repository root, e.g.
+`python benchmarks/count_lines.py /data/house_1/mains.dat`.
+"""
+from __future__ import print_function, division
+import sys
+import time
+from argparse import ArgumentParser
+from os.path import abspath, dirname, getsize, join
+
+REPO_PATH = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+
+from ukdale_metadata.reader import CHUNK_SIZE, count_lines  # noqa: E402
+from ukdale_metadata.synthetic import SCPM_HOUSES  # noqa: E402
+from run_benchmarks import DATA_DIR, dataset_path  # noqa: E402
+
+REPEATS = 5
+
+
+def read(filename, block_size=CHUNK_SIZE):
+    buf = bytearray(block_size)
+    with open(filename, 'rb') as fh:
+        while fh.readinto(buf):
+            pass
+
+
+def python_lines(filename):
+    with open(filename, 'rb') as fh:
+        return sum(1 for _ in fh)
+
+
+def best_time(func, filename, repeats):
+    durations = []
+    for _ in range(repeats):
+        t0 = time.time()
+        func(filename)
+        durations.append(time.time() - t0)
+    return min(durations)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--repeats', type=int, default=REPEATS)
+    parser.add_argument('filenames', metavar='FILE', nargs='*')
+    args = parser.parse_args()
+    filenames = args.filenames
+    if not filenames:
+        path = dataset_path(DATA_DIR, 1, 0)
+        filenames = [join(path, 'house_{:d}'.format(building_i), 'mains.dat')
+                     for building_i in SCPM_HOUSES]
+
+    methods = [('read', read), ('count_lines', count_lines),
+               ('python lines', python_lines)]
+    for filename in filenames:
+        read(filename)
+        n_megabytes = getsize(filename) / 1e6
+        print('{} ({:.1f} MB, {:d} lines)'.format(
+            filename, n_megabytes, count_lines(filename)))
+        for name, func in methods:
+            duration = best_time(func, filename, args.repeats)
+            print('  {:<13} {:8.1f} MB/s'.format(
+                name, n_megabytes / duration))
+
+
+if __name__ == "__main__":
+    main()
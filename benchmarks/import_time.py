@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Times importing the converter in fresh Python processes.
+
+Each module is imported REPEATS times, each time in a new interpreter so
+that nothing is already imported, and the median time is reported along
+with the heavyweight modules that the import pulled in.  `pandas` is
+included for comparison because the converter used to import it just to
+parse APPLIANCE_PARAMS.
+
+Run from the repository root, e.g. `python benchmarks/import_time.py`.
+"""
+from __future__ import print_function, division
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from os.path import abspath, dirname
+
+REPO_PATH = dirname(dirname(abspath(__file__)))
+MODULES = ['ukdale_metadata.metadata', 'ukdale_metadata.snapshot',
+           'ukdale_metadata.convert', 'pandas']
+HEAVYWEIGHT = ['numpy', 'pandas', 'yaml']
+REPEATS = 20
+
+_TIME_IMPORT = """
+import json, sys, time
+sys.path.insert(0, {path!r})
+t0 = time.time()
+import {module}
+duration = time.time() - t0
+print(json.dumps([duration, [m for m in {heavyweight!r} if m in sys.modules]]))
+"""
+
+
+def time_import(module, python=sys.executable):
+    """Returns the time taken to import `module` in a fresh interpreter,
+    in seconds, and the HEAVYWEIGHT modules which were imported."""
+    code = _TIME_IMPORT.format(
+        path=REPO_PATH, module=module, heavyweight=HEAVYWEIGHT)
+    output = subprocess.check_output([python, '-c', code])
+    duration, imported = json.loads(output.decode('ascii'))
+    return duration, imported
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--repeats', type=int, default=REPEATS)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args()
+    for module in args.modules:
+        try:
+            results = [time_import(module) for _ in range(args.repeats)]
+        except subprocess.CalledProcessError:
+            print('{:<28} not importable'.format(module))
+            continue
+        durations = sorted(duration for duration, _ in results)
+        median = durations[len(durations) // 2]
+        print('{:<28} {:7.1f} ms  imports: {}'.format(
+            module, median * 1000, ', '.join(results[0][1]) or '-'))
+
+
+if __name__ == "__main__":
+    main()
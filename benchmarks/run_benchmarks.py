@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""Times each stage of the converter on synthetic datasets.
+
+A synthetic UK-DALE-shaped dataset is written for each scale (in days of
+recording) and kept in --data-dir so later runs can reuse it.  Each stage
+is then timed REPEATS times:
+
+* labels: load_labels() for every house;
+* boundaries: reading the first and last line of every data file;
+* samples: counting the lines of every data file;
+* statistics: a full statistics pass over every data file;
+* yaml: writing dataset.yaml and the building YAML files;
+* convert: a whole conversion without the cache or optional stages.
+
+The results are written as JSON to benchmarks/results/ and, with
+--compare, printed next to an earlier results file.
+
+Run from the repository root, e.g.
+`python benchmarks/run_benchmarks.py --scales 1 7 --compare OLD.json`.
+"""
+from __future__ import print_function, division
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from os import listdir, makedirs
+from os.path import abspath, dirname, getsize, isdir, join
+
+REPO_PATH = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+
+from ukdale_metadata import convert  # noqa: E402
+from ukdale_metadata.cache import NEW, scan_boundaries  # noqa: E402
+from ukdale_metadata.metadata import load_labels  # noqa: E402
+from ukdale_metadata.output import write_yaml  # noqa: E402
+from ukdale_metadata.reader import count_lines  # noqa: E402
+from ukdale_metadata.stats import update_statistics  # noqa: E402
+from ukdale_metadata.synthetic import N_CHANNELS, write_dataset  # noqa: E402
+
+SCALES = [0.25, 1]
+REPEATS = 3
+DATA_DIR = join(tempfile.gettempdir(), 'ukdale_synthetic')
+RESULTS_DIR = join(REPO_PATH, 'benchmarks', 'results')
+
+
+def dataset_path(data_dir, days, extra_channels):
+    """Returns the path of the synthetic dataset for a scale, writing the
+    dataset first if it does not exist yet."""
+    path = join(data_dir, '{:g}d_{:d}x'.format(days, extra_channels))
+    if not isdir(path):
+        print('writing {:g} day dataset to {}'.format(days, path))
+        tmp_path = path + '.tmp'
+        if isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        write_dataset(tmp_path, days, extra_channels=extra_channels)
+        shutil.move(tmp_path, path)
+    return path
+
+
+def data_files(path):
+    """Returns the absolute paths of all data files under `path`."""
+    filenames = []
+    for building_i in sorted(N_CHANNELS):
+        house_path = join(path, 'house_{:d}'.format(building_i))
+        filenames.extend(
+            join(house_path, name) for name in sorted(listdir(house_path))
+            if name != 'labels.dat')
+    return filenames
+
+
+def time_stage(func, repeats, setup=None):
+    """Returns the wall times of `repeats` calls of `func`, in seconds."""
+    durations = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        t0 = time.time()
+        func()
+        durations.append(time.time() - t0)
+    return durations
+
+
+def benchmark_scale(path, repeats):
+    """Returns dict mapping stage name to a list of wall times."""
+    filenames = data_files(path)
+    building_ids = sorted(N_CHANNELS)
+    output_path = tempfile.mkdtemp()
+    convert.set_paths(path, output_path)
+    try:
+        results = convert.convert_buildings(building_ids)
+
+        def labels():
+            for building_i in building_ids:
+                load_labels(join(path, 'house_{:d}'.format(building_i)))
+
+        def boundaries():
+            for filename in filenames:
+                scan_boundaries(filename)
+
+        def samples():
+            for filename in filenames:
+                count_lines(filename)
+
+        def statistics():
+            for filename in filenames:
+                update_statistics(filename, NEW, None)
+
+        def clear_output():
+            shutil.rmtree(output_path)
+            makedirs(output_path)
+
+        def emit_yaml():
+            write_yaml(join(output_path, 'dataset.yaml'), convert.dataset)
+            for building_i, result in zip(building_ids, results):
+                write_yaml(join(output_path,
+                                'building{:d}.yaml'.format(building_i)),
+                           result[0])
+
+        def conversion():
+            convert.main(['--no-cache', '--data-path', path,
+                          '--output-path', output_path])
+
+        return {
+            'labels': time_stage(labels, repeats),
+            'boundaries': time_stage(boundaries, repeats),
+            'samples': time_stage(samples, repeats),
+            'statistics': time_stage(statistics, repeats),
+            'yaml': time_stage(emit_yaml, repeats, setup=clear_output),
+            'convert': time_stage(conversion, repeats, setup=clear_output),
+        }
+    finally:
+        shutil.rmtree(output_path)
+
+
+def git_commit():
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_PATH)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def compare(results, old_results):
+    """Prints the best time of each stage next to that in `old_results`."""
+    old_scales = {(scale['days'], scale['extra_channels']): scale
+                  for scale in old_results['scales']}
+    print('{:>8} {:>6} {:<11} {:>10} {:>10} {:>7}'.format(
+        'days', 'extra', 'stage', 'old (s)', 'new (s)', 'ratio'))
+    for scale in results['scales']:
+        old_scale = old_scales.get((scale['days'], scale['extra_channels']))
+        for stage, durations in sorted(scale['stages'].items()):
+            new = min(durations)
+            old = None
+            if old_scale is not None and stage in old_scale['stages']:
+                old = min(old_scale['stages'][stage])
+            print('{:>8g} {:>6d} {:<11} {:>10} {:>10.4f} {:>7}'.format(
+                scale['days'], scale['extra_channels'], stage,
+                '-' if old is None else '{:.4f}'.format(old), new,
+                '-' if not old else '{:.2f}'.format(new / old)))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--scales', type=float, nargs='+', default=SCALES,
+                        help='days of data in each synthetic dataset')
+    parser.add_argument('--extra-channels', type=int, default=0,
+                        help='extra channels to add to each house')
+    parser.add_argument('-n', '--repeats', type=int, default=REPEATS)
+    parser.add_argument('--data-dir', default=DATA_DIR,
+                        help='where to keep the synthetic datasets')
+    parser.add_argument('-o', '--output',
+                        help='results file (default: a new file in {})'
+                        .format(RESULTS_DIR))
+    parser.add_argument('--compare', metavar='RESULTS',
+                        help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    results = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeats': args.repeats,
+        'scales': []}
+    for days in args.scales:
+        path = dataset_path(args.data_dir, days, args.extra_channels)
+        filenames = data_files(path)
+        print('benchmarking {:g} days'.format(days))
+        results['scales'].append({
+            'days': days,
+            'extra_channels': args.extra_channels,
+            'n_files': len(filenames),
+            'n_bytes': sum(getsize(filename) for filename in filenames),
+            'stages': benchmark_scale(path, args.repeats)})
+
+    output = args.output
+    if output is None:
+        if not isdir(RESULTS_DIR):
+            makedirs(RESULTS_DIR)
+        output = join(RESULTS_DIR, '{}_{}.json'.format(
+            time.strftime('%Y%m%d-%H%M%S'), results['commit'] or 'unknown'))
+    with open(output, 'w') as fh:
+        json.dump(results, fh, indent=1, sort_keys=True)
+    print('results written to', output)
+
+    old_results = {'scales': []}
+    if args.compare:
+        with open(args.compare) as fh:
+            old_results = json.load(fh)
+    compare(results, old_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+from ukdale_metadata import cache, convert
+from ukdale_metadata.synthetic import START, write_dataset
+
+# A quarter of a day keeps the conversions below quick
+DAYS = 0.25
+
+STAGES = ['--index', '--activations', '--calibrate']
+
+
+def run_converter(data_path, output_path, *args):
+    convert.main(['--data-path', str(data_path),
+                  '--output-path', str(output_path),
+                  '--processes', '1'] + list(args))
+
+
+@pytest.fixture(scope='session')
+def data_path(tmpdir_factory):
+    """A synthetic dataset laid out like the raw UK-DALE data."""
+    path = tmpdir_factory.mktemp('data')
+    write_dataset(str(path), days=DAYS)
+    return path
+
+
+@pytest.fixture(scope='session')
+def output_path(data_path, tmpdir_factory):
+    """The converter's output for `data_path`, with STAGES run."""
+    path = tmpdir_factory.mktemp('output')
+    run_converter(data_path, path, *STAGES)
+    return path
+
+
+# The stages which resume from where they left off when a file grows
+RESUMING_STAGES = ['--pyramid', '--energy', '--aligned', '--residual',
+                   '--columnar']
+
+
+@pytest.fixture(scope='session')
+def resumed_outputs(tmpdir_factory):
+    """Converts a dataset, appends lines to most of its data files and
+    converts it again, resuming from the cache.
+
+    The recording runs from 3 hours before midnight on New Year's Eve, so
+    the appends cross day and month boundaries.
+
+    Returns
+    -------
+    resumed, fresh : py.path.local
+        The output of the second conversion and of a conversion of the
+        whole dataset from scratch.
+    """
+    full = tmpdir_factory.mktemp('full_data')
+    write_dataset(str(full), days=0.5, start=START - 3 * 3600)
+    data = tmpdir_factory.mktemp('resumed_data')
+    rests = {}
+    for i, filename in enumerate(sorted(full.visit('*.dat'))):
+        target = data.join(filename.relto(full))
+        target.dirpath().ensure(dir=True)
+        lines = filename.readlines(cr=True)
+        if filename.basename == 'labels.dat' or i % 5 == 0:
+            target.write(''.join(lines))
+            continue
+        # Cut before and after midnight, part-way through buckets
+        cut = int(len(lines) * (0.2 + 0.6 * (i % 7) / 6))
+        target.write(''.join(lines[:cut]))
+        rests[target] = ''.join(lines[cut:])
+
+    resumed = tmpdir_factory.mktemp('resumed_output')
+    run_converter(data, resumed, *RESUMING_STAGES)
+    for target, rest in rests.items():
+        target.write(rest, mode='a')
+
+    statuses = []
+    original_scan_boundaries = cache.scan_boundaries
+
+    def scan_boundaries(*args, **kwargs):
+        entry, status = original_scan_boundaries(*args, **kwargs)
+        statuses.append(status)
+        return entry, status
+
+    cache.scan_boundaries = scan_boundaries
+    try:
+        run_converter(data, resumed, *RESUMING_STAGES)
+    finally:
+        cache.scan_boundaries = original_scan_boundaries
+    assert statuses.count(cache.APPENDED) == len(rests)
+    assert statuses.count(cache.UNCHANGED) == len(statuses) - len(rests)
+
+    fresh = tmpdir_factory.mktemp('fresh_output')
+    run_converter(full, fresh, *RESUMING_STAGES)
+    return resumed, fresh
+
+
+def assert_same_sidecars(resumed, fresh, kind):
+    """Checks that every sidecar under `kind` is the same in the output
+    directories `resumed` and `fresh`, up to rounding."""
+    files = sorted(fresh.join(kind).visit(lambda path: path.ext in (
+        '.npy', '.npz')))
+    assert files
+    assert (sorted(path.relto(resumed) for path in resumed.join(kind).visit(
+        lambda path: path.ext in ('.npy', '.npz'))) ==
+        [path.relto(fresh) for path in files])
+    for filename in files:
+        expected = np.load(str(filename))
+        actual = np.load(str(resumed.join(filename.relto(fresh))))
+        if filename.ext == '.npy':
+            expected, actual = {'': expected}, {'': actual}
+        assert sorted(actual) == sorted(expected), filename
+        for name in expected:
+            a, b = actual[name], expected[name]
+            assert a.dtype == b.dtype, (filename, name)
+            if a.dtype.kind == 'f':
+                np.testing.assert_allclose(a, b, rtol=1e-9,
+                                           err_msg=str(filename))
+            else:
+                np.testing.assert_array_equal(a, b, err_msg=str(filename))
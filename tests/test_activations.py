@@ -0,0 +1,41 @@
+from __future__ import print_function, division
+import numpy as np
+
+from ukdale_metadata import activations
+from ukdale_metadata.cache import NEW, UNCHANGED
+from ukdale_metadata.sidecars import load_arrays
+
+PARAMS = {'on_power_threshold': 10, 'min_on_duration': 12,
+          'min_off_duration': 30, 'max_sample_period': 20}
+
+LOCATION = 'activations/house_1/kettle_1.npz'
+
+
+def _update(filename, status, old_entry, output_path):
+    new_entry = {}
+    n_activations = activations.update_activations(
+        filename, status, old_entry, new_entry, PARAMS, str(output_path),
+        LOCATION)
+    return n_activations, new_entry
+
+
+def test_unchanged_file_is_not_read_again(data_path, tmpdir, monkeypatch):
+    filename = str(data_path.join('house_1', 'channel_2.dat'))
+    n_activations, entry = _update(filename, NEW, None, tmpdir)
+    assert n_activations
+    saved = load_arrays(str(tmpdir), LOCATION)
+    assert len(saved['start']) == n_activations
+
+    def find_activations(*args, **kwargs):
+        raise AssertionError('the data file was read again')
+
+    monkeypatch.setattr(activations, 'find_activations', find_activations)
+    assert _update(filename, UNCHANGED, entry, tmpdir) == (
+        n_activations, entry)
+
+    # A missing sidecar is written again
+    monkeypatch.undo()
+    tmpdir.join(LOCATION).remove()
+    assert _update(filename, UNCHANGED, entry, tmpdir)[0] == n_activations
+    for name, array in load_arrays(str(tmpdir), LOCATION).items():
+        np.testing.assert_array_equal(array, saved[name])
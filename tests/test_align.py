@@ -0,0 +1,7 @@
+from __future__ import print_function, division
+
+from conftest import assert_same_sidecars
+
+
+def test_resumed_alignment_matches_fresh(resumed_outputs):
+    assert_same_sidecars(resumed_outputs[0], resumed_outputs[1], 'aligned')
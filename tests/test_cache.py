@@ -0,0 +1,101 @@
+from __future__ import print_function, division
+import gzip
+import io
+import os
+
+from ukdale_metadata import compressed
+from ukdale_metadata.cache import (
+    APPENDED, NEW, REWRITTEN, UNCHANGED, scan_boundaries)
+
+LINES = [b'1364515200 1\n', b'1364515206 22\n', b'1364515212 333\n']
+MORE_LINES = [b'1364515218 4\n', b'1364515224 55\n']
+
+
+def _write(filename, data, mode='wb'):
+    with open(filename, mode) as fh:
+        fh.write(data)
+    # Make sure the mtime moves on even on coarse-grained filesystems
+    st = os.stat(filename)
+    os.utime(filename, (st.st_atime, st.st_mtime + 1))
+
+
+def _gzip(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as fh:
+        fh.write(data)
+    return buf.getvalue()
+
+
+def test_new_and_unchanged(tmpdir):
+    filename = str(tmpdir.join('channel_2.dat'))
+    _write(filename, b''.join(LINES))
+    entry, status = scan_boundaries(filename)
+    assert status == NEW
+    assert entry['start'] == 1364515200
+    assert entry['end'] == 1364515212
+    assert entry['last_line'] == '1364515212 333'
+    assert entry['last_line_offset'] == len(b''.join(LINES[:2]))
+    assert scan_boundaries(filename, entry) == (entry, UNCHANGED)
+
+
+def test_appended(tmpdir):
+    filename = str(tmpdir.join('channel_2.dat'))
+    _write(filename, b''.join(LINES))
+    entry, _ = scan_boundaries(filename)
+    _write(filename, b''.join(MORE_LINES), 'ab')
+    new_entry, status = scan_boundaries(filename, entry)
+    assert status == APPENDED
+    assert new_entry['start'] == 1364515200
+    assert new_entry['end'] == 1364515224
+    assert new_entry['last_line_offset'] == len(b''.join(
+        LINES + MORE_LINES[:1]))
+
+
+def test_rewritten(tmpdir):
+    filename = str(tmpdir.join('channel_2.dat'))
+    _write(filename, b''.join(LINES))
+    entry, _ = scan_boundaries(filename)
+    # The last line changed
+    _write(filename, b''.join(LINES[:2] + [b'1364515212 444\n'] + MORE_LINES))
+    assert scan_boundaries(filename, entry)[1] == REWRITTEN
+    # The file shrank
+    _write(filename, b''.join(LINES[:2]))
+    assert scan_boundaries(filename, entry)[1] == REWRITTEN
+
+
+def test_unterminated_last_line_is_rewritten(tmpdir):
+    filename = str(tmpdir.join('channel_2.dat'))
+    _write(filename, b''.join(LINES).rstrip(b'\n'))
+    entry, _ = scan_boundaries(filename)
+    # The append continues the last line
+    _write(filename, b'3\n' + b''.join(MORE_LINES), 'ab')
+    assert scan_boundaries(filename, entry)[1] == REWRITTEN
+
+
+def test_compressed_transitions(tmpdir):
+    output_path = str(tmpdir.mkdir('output'))
+    filename = str(tmpdir.join('channel_2.dat'))
+    _write(filename + '.gz', _gzip(b''.join(LINES)))
+
+    def scan(entry):
+        return scan_boundaries(filename, entry, output_path,
+                               'house_1/channel_2.dat')
+
+    entry, status = scan(None)
+    assert status == NEW
+    assert entry['end'] == 1364515212
+    assert os.path.isfile(os.path.join(
+        output_path, compressed.block_index_location('house_1/channel_2.dat')))
+    assert scan(entry) == (entry, UNCHANGED)
+
+    # Another member, as bgzip or pzstd would add
+    _write(filename + '.gz', _gzip(b''.join(MORE_LINES)), 'ab')
+    appended, status = scan(entry)
+    assert status == APPENDED
+    assert appended['end'] == 1364515224
+    assert appended['last_line_offset'] == len(b''.join(
+        LINES + MORE_LINES[:1]))
+
+    # Recompressed as a single member
+    _write(filename + '.gz', _gzip(b''.join(LINES + MORE_LINES)))
+    assert scan(appended)[1] == REWRITTEN
@@ -0,0 +1,98 @@
+from __future__ import print_function, division
+import csv
+import numpy as np
+import yaml
+
+from ukdale_metadata.calibrate import calibrate, new_sketch, update_sketch
+from ukdale_metadata.convert import CALIBRATED_PARAMS_FILENAME
+from ukdale_metadata.reader import iter_chunks
+from ukdale_metadata.synthetic import write_house
+
+from conftest import run_converter
+
+# Synthetic standby readings are below this many watts
+STANDBY = 5
+
+
+def _power(filename):
+    return np.concatenate([values[:, 0] for _, values in
+                           iter_chunks(filename)])
+
+
+def test_calibrate_splits_standby_from_on():
+    rng = np.random.RandomState(0)
+    power = np.concatenate([rng.uniform(0, STANDBY, 10000),
+                            rng.normal(1000, 50, 1000)])
+    sketch = new_sketch()
+    update_sketch(sketch, power)
+    params = calibrate(sketch)
+    assert STANDBY < params['on_power_threshold'] < 800
+    assert params['n_on_samples'] == 1000
+    assert abs(params['on_power']['mu'] - 1000) < 20
+    assert abs(params['on_power']['sigma'] - 50) < 10
+
+
+def test_calibrate_rejects_a_handful_of_spikes():
+    power = np.concatenate([np.full(100000, 2.0), np.full(50, 3000.0)])
+    sketch = new_sketch()
+    update_sketch(sketch, power)
+    assert calibrate(sketch) is None
+
+
+def test_calibrated_thresholds(data_path, output_path):
+    with open(str(output_path.join('building5.yaml'))) as fh:
+        building = yaml.safe_load(fh)
+    calibrated = [appliance for appliance in building['appliances']
+                  if 'calibrated_on_power_threshold' in appliance]
+    assert calibrated
+    for appliance in calibrated:
+        meter = building['elec_meters'][appliance['meters'][0]]
+        power = _power(str(data_path.join(meter['data_location'])))
+        threshold = appliance['calibrated_on_power_threshold']
+        on = power[power > STANDBY]
+        assert STANDBY < threshold < on.min()
+        assert abs(appliance['calibrated_on_power']['mu'] -
+                   np.median(on)) < 0.05 * np.median(on)
+
+    with open(str(output_path.join(CALIBRATED_PARAMS_FILENAME))) as fh:
+        rows = list(csv.DictReader(fh))
+    assert rows
+
+
+def _without_proposals(building):
+    for appliance in building['appliances']:
+        for name in list(appliance):
+            if name.startswith('calibrated_'):
+                del appliance[name]
+    return building
+
+
+def test_calibration_only_adds_proposals(data_path, output_path, tmpdir):
+    uncalibrated = tmpdir.mkdir('uncalibrated')
+    run_converter(data_path, uncalibrated, '--index', '--activations')
+    for building_i in range(1, 6):
+        filename = 'building{:d}.yaml'.format(building_i)
+        with open(str(output_path.join(filename))) as fh:
+            calibrated = yaml.safe_load(fh)
+        with open(str(uncalibrated.join(filename))) as fh:
+            assert _without_proposals(calibrated) == yaml.safe_load(fh)
+
+    activations = output_path.join('activations')
+    files = sorted(activations.visit('*.npz'))
+    assert files
+    for filename in files:
+        other = uncalibrated.join(filename.relto(output_path))
+        with np.load(str(filename)) as a, np.load(str(other)) as b:
+            assert sorted(a.files) == sorted(b.files)
+            for name in a.files:
+                np.testing.assert_array_equal(a[name], b[name])
+
+
+def test_synthetic_house_calibrates_every_channel(tmpdir):
+    write_house(str(tmpdir), 3, 86400)
+    for filename in tmpdir.join('house_3').visit('channel_*.dat'):
+        sketch = new_sketch()
+        update_sketch(sketch, _power(str(filename)))
+        params = calibrate(sketch)
+        assert params is not None
+        assert params['on_power_threshold'] > STANDBY
@@ -0,0 +1,61 @@
+from __future__ import print_function, division
+import numpy as np
+
+from ukdale_metadata import export
+
+from conftest import assert_same_sidecars
+
+LINES = [b'1364515200 1.5\n', b'1364515200.5 2\n', b'1364515201.123456 3\n',
+         b'1364515206 4\n', b'1364515212.000001 5\n']
+
+
+def _export(tmpdir, lines, chunk_rows=2, resume_from=None):
+    filename = tmpdir.join('channel_2.dat')
+    filename.write_binary(b''.join(lines))
+    return export.export_columnar(
+        str(filename), str(tmpdir), 'columnar/channel_2', ['power'],
+        chunk_rows=chunk_rows, resume_from=resume_from)
+
+
+def _read(tmpdir, start=None, end=None):
+    chunks = list(export.iter_columnar(str(tmpdir), 'columnar/channel_2',
+                                       start, end))
+    return {name: np.concatenate([chunk[name] for chunk in chunks])
+            for name in chunks[0]}
+
+
+def test_fractional_timestamps_are_exact_microseconds(tmpdir):
+    assert _export(tmpdir, LINES) == len(LINES)
+    columns = _read(tmpdir)
+    assert columns['timestamp'].dtype == np.int64
+    assert columns['timestamp'].tolist() == [
+        1364515200000000, 1364515200500000, 1364515201123456,
+        1364515206000000, 1364515212000001]
+    assert columns['power'].dtype == np.float32
+    np.testing.assert_array_equal(columns['power'], [1.5, 2, 3, 4, 5])
+
+    index = np.load(str(tmpdir.join('columnar', 'channel_2', 'chunks.npy')))
+    assert index.dtype == export.CHUNK_INDEX_DTYPE
+    assert index['start'].tolist() == [
+        1364515200000000, 1364515201123456, 1364515212000001]
+
+
+def test_iter_columnar_range_in_seconds(tmpdir):
+    _export(tmpdir, LINES)
+    timestamps = _read(tmpdir, 1364515200.5, 1364515212.000001)['timestamp']
+    assert timestamps.tolist() == [
+        1364515200500000, 1364515201123456, 1364515206000000]
+
+
+def test_resumed_export_matches_fresh(tmpdir):
+    _export(tmpdir, LINES[:3])
+    offset = len(b''.join(LINES[:2]))
+    assert _export(tmpdir, LINES, resume_from=offset) == len(LINES)
+    resumed = _read(tmpdir)
+    _export(tmpdir, LINES)
+    for name, column in _read(tmpdir).items():
+        np.testing.assert_array_equal(resumed[name], column)
+
+
+def test_resumed_store_matches_fresh(resumed_outputs):
+    assert_same_sidecars(resumed_outputs[0], resumed_outputs[1], 'columnar')
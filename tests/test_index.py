@@ -0,0 +1,56 @@
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+from ukdale_metadata.index import read_range
+from ukdale_metadata.reader import iter_chunks
+
+DATA_LOCATIONS = ['house_1/channel_2.dat', 'house_2/mains.dat']
+
+
+def _read_all(filename):
+    timestamps, values = zip(*iter_chunks(filename))
+    return np.concatenate(timestamps), np.concatenate(values)
+
+
+@pytest.fixture(params=[False, True], ids=['in_memory', 'sidecar'])
+def index_path(request, output_path):
+    return str(output_path) if request.param else None
+
+
+@pytest.mark.parametrize('data_location', DATA_LOCATIONS)
+def test_read_range_boundaries(data_location, data_path, index_path):
+    timestamps, values = _read_all(str(data_path.join(data_location)))
+
+    def check(start, end):
+        actual = read_range(data_location, start, end, str(data_path),
+                            index_path)
+        wanted = (timestamps >= start) & (timestamps < end)
+        np.testing.assert_array_equal(actual[0], timestamps[wanted])
+        np.testing.assert_array_equal(actual[1], values[wanted])
+        return actual
+
+    # The start is included and the end is not
+    n = len(timestamps)
+    timestamps_read, _ = check(timestamps[n // 4], timestamps[n // 2])
+    assert timestamps_read[0] == timestamps[n // 4]
+    assert timestamps_read[-1] == timestamps[n // 2 - 1]
+    # Between samples
+    check(timestamps[100] + 0.5, timestamps[200] - 0.5)
+    # The whole file, and beyond either end
+    assert len(check(timestamps[0], timestamps[-1] + 1)[0]) == n
+    check(timestamps[0] - 86400, timestamps[10])
+    check(timestamps[-10], timestamps[-1] + 86400)
+
+
+@pytest.mark.parametrize('data_location', DATA_LOCATIONS)
+def test_read_range_empty(data_location, data_path, index_path):
+    first, _ = next(iter_chunks(str(data_path.join(data_location))))
+    n_columns = _read_all(str(data_path.join(data_location)))[1].shape[1]
+    for start, end in [(first[0] - 100, first[0]),
+                       (first[0] + 0.25, first[0] + 0.5),
+                       (first[0], first[0])]:
+        timestamps, values = read_range(data_location, start, end,
+                                        str(data_path), index_path)
+        assert timestamps.shape == (0,)
+        assert values.shape == (0, n_columns)
@@ -0,0 +1,56 @@
+from __future__ import print_function, division
+from datetime import date, datetime
+import numpy as np
+import pytz
+
+from ukdale_metadata.localtime import isoformat, local_days, utc_offsets
+from ukdale_metadata.metadata import TIMEZONE
+
+TZ = pytz.timezone(TIMEZONE)
+
+# 2012-01-01 to 2016-01-01 UTC
+START, END = 1325376000, 1451606400
+
+# The BST transitions of 2013: 2013-03-31 01:00 and 2013-10-27 01:00 UTC
+TRANSITIONS = [1364691600, 1382835600]
+
+
+def _timestamps():
+    rng = np.random.RandomState(0)
+    around_transitions = np.concatenate(
+        [transition + np.arange(-3, 3) for transition in TRANSITIONS])
+    midnights = np.array([1370041200, 1370044800, 1356998400]) + np.arange(
+        -1, 2)[:, np.newaxis]
+    return np.concatenate([rng.randint(START, END, size=2000),
+                           around_transitions, midnights.ravel()])
+
+
+def test_utc_offsets():
+    timestamps = _timestamps()
+    expected = [int(datetime.fromtimestamp(t, TZ).utcoffset().total_seconds())
+                for t in timestamps.tolist()]
+    np.testing.assert_array_equal(utc_offsets(timestamps), expected)
+
+
+def test_local_days():
+    timestamps = _timestamps()
+    epoch = date(1970, 1, 1)
+    expected = [(datetime.fromtimestamp(t, TZ).date() - epoch).days
+                for t in timestamps.tolist()]
+    np.testing.assert_array_equal(local_days(timestamps), expected)
+    np.testing.assert_array_equal(local_days(timestamps + 0.5), expected)
+
+
+def test_isoformat():
+    timestamps = _timestamps()
+    expected = [datetime.fromtimestamp(t, TZ).isoformat()
+                for t in timestamps.tolist()]
+    assert list(isoformat(timestamps)) == expected
+
+
+def test_isoformat_fractional_seconds():
+    timestamps = _timestamps()[:100] + np.array([0, 0.25, 0.5, 0.000001])[
+        np.arange(100) % 4]
+    expected = [datetime.fromtimestamp(t, TZ).isoformat()
+                for t in timestamps.tolist()]
+    assert list(isoformat(timestamps)) == expected
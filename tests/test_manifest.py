@@ -0,0 +1,91 @@
+from __future__ import print_function, division
+import hashlib
+import json
+import shutil
+
+from ukdale_metadata import manifest
+
+PIECE_SIZE = 8 * 1024
+
+DATA_LOCATIONS = ['house_3/labels.dat', 'house_3/channel_1.dat',
+                  'house_3/channel_2.dat']
+
+
+def _manifest(files):
+    return {'version': manifest.MANIFEST_VERSION,
+            'algorithm': manifest.algorithm(PIECE_SIZE),
+            'piece_size': PIECE_SIZE, 'files': files}
+
+
+def test_hash_files_pieces(data_path):
+    files = manifest.hash_files(str(data_path), DATA_LOCATIONS, threads=2,
+                                piece_size=PIECE_SIZE)
+    for data_location in DATA_LOCATIONS:
+        data = data_path.join(data_location).read_binary()
+        pieces = [hashlib.sha256(data[i:i+PIECE_SIZE]).hexdigest()
+                  for i in range(0, len(data), PIECE_SIZE)]
+        assert files[data_location]['size'] == len(data)
+        assert files[data_location]['pieces'] == pieces
+        assert (files[data_location]['digest'] ==
+                manifest.file_digest(pieces))
+    assert len(files['house_3/channel_1.dat']['pieces']) > 3
+
+
+def test_hash_files_resumes_from_state(data_path, tmpdir, monkeypatch):
+    state_filename = str(tmpdir.join(manifest.MANIFEST_STATE_FILENAME))
+    files = manifest.hash_files(str(data_path), DATA_LOCATIONS, threads=2,
+                                state_filename=state_filename,
+                                piece_size=PIECE_SIZE)
+
+    # As if the run had been interrupted before these pieces were hashed
+    with open(state_filename) as fh:
+        state = json.load(fh)
+    cleared = [('house_3/channel_1.dat', 0), ('house_3/channel_1.dat', 2),
+               ('house_3/channel_2.dat', 1)]
+    for data_location, i in cleared:
+        state['files'][data_location]['pieces'][i] = None
+    with open(state_filename, 'w') as fh:
+        json.dump(state, fh)
+
+    hashed = []
+    hash_piece = manifest.hash_piece
+
+    def counting_hash_piece(filename, i, piece_size):
+        hashed.append((filename, i))
+        return hash_piece(filename, i, piece_size)
+
+    monkeypatch.setattr(manifest, 'hash_piece', counting_hash_piece)
+    resumed = manifest.hash_files(str(data_path), DATA_LOCATIONS, threads=2,
+                                  state_filename=state_filename,
+                                  piece_size=PIECE_SIZE)
+    assert resumed == files
+    assert sorted(hashed) == sorted(
+        (str(data_path.join(data_location)), i)
+        for data_location, i in cleared)
+
+    # Nothing is hashed again once the state is complete
+    del hashed[:]
+    assert manifest.hash_files(str(data_path), DATA_LOCATIONS,
+                               state_filename=state_filename,
+                               piece_size=PIECE_SIZE) == files
+    assert hashed == []
+
+
+def test_verify_reports_bad_pieces(data_path, tmpdir):
+    files = manifest.hash_files(str(data_path), DATA_LOCATIONS,
+                                piece_size=PIECE_SIZE)
+    copy = tmpdir.join('copy')
+    shutil.copytree(str(data_path.join('house_3')), str(copy.join('house_3')))
+    assert manifest.verify(str(copy), _manifest(files)) == []
+
+    channel_1 = copy.join('house_3', 'channel_1.dat')
+    data = bytearray(channel_1.read_binary())
+    data[2 * PIECE_SIZE + 100] ^= 1
+    channel_1.write_binary(bytes(data))
+    copy.join('house_3', 'channel_2.dat').write_binary(b'1364515200 1\n')
+    copy.join('house_3', 'labels.dat').remove()
+    assert sorted(manifest.verify(str(copy), _manifest(files))) == [
+        ('house_3/channel_1.dat', 'pieces 2 differ'),
+        ('house_3/channel_2.dat', 'size 13 != {:d}'.format(
+            files['house_3/channel_2.dat']['size'])),
+        ('house_3/labels.dat', 'missing')]
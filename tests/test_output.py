@@ -0,0 +1,62 @@
+from __future__ import print_function, division
+import glob
+from os.path import dirname, join
+import pytest
+import yaml
+
+from ukdale_metadata import output
+
+from conftest import run_converter
+
+REPO_PATH = dirname(dirname(__file__))
+
+
+@pytest.fixture(scope='module')
+def generated_metadata(data_path, tmpdir_factory):
+    """Everything the converter passes to write_yaml, with every stage
+    which adds to the metadata run."""
+    written = []
+    original_write_yaml = output.write_yaml
+
+    def write_yaml(filename, data):
+        written.append(data)
+        return original_write_yaml(filename, data)
+
+    output.write_yaml = write_yaml
+    try:
+        run_converter(data_path, tmpdir_factory.mktemp('output'),
+                      '--samples', '--stats', '--good-sections', '--index',
+                      '--activations', '--calibrate', '--pyramid', '--energy',
+                      '--columnar')
+    finally:
+        output.write_yaml = original_write_yaml
+    return written
+
+
+def _shipped_metadata():
+    metadata = []
+    for filename in sorted(glob.glob(join(REPO_PATH, '*.yaml'))):
+        with open(filename) as fh:
+            metadata.append(yaml.safe_load(fh))
+    return metadata
+
+
+@pytest.mark.skipif(not hasattr(yaml, 'CDumper'),
+                    reason='PyYAML was built without libyaml')
+def test_libyaml_dumper_matches_python_dumper(generated_metadata):
+    metadata = generated_metadata + _shipped_metadata()
+    assert len(generated_metadata) == 6
+    for data in metadata:
+        assert (yaml.dump(data, Dumper=yaml.CDumper) ==
+                yaml.dump(data, Dumper=yaml.Dumper))
+
+
+def test_write_yaml_leaves_identical_file_alone(tmpdir):
+    filename = str(tmpdir.join('building1.yaml'))
+    data = {'instance': 1, 'elec_meters': {1: {'site_meter': True}}}
+    assert output.write_yaml(filename, data)
+    assert not output.write_yaml(filename, data)
+    data['instance'] = 2
+    assert output.write_yaml(filename, data)
+    with open(filename) as fh:
+        assert yaml.safe_load(fh) == data
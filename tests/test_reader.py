@@ -0,0 +1,198 @@
+from __future__ import print_function, division
+import bz2
+import gzip
+import io
+import numpy as np
+import pytest
+
+from ukdale_metadata import compressed, reader
+from ukdale_metadata.index import read_range
+
+
+def _parse(lines):
+    block = ''.join(line + '\n' for line in lines).encode('ascii')
+    timestamps, values = reader.parse_block(block)
+    return np.concatenate([timestamps[:, np.newaxis], values], axis=1)
+
+
+def _expected(lines):
+    return np.array([[float(field) for field in line.split()]
+                     for line in lines])
+
+
+@pytest.mark.parametrize('n_decimals', range(7))
+def test_parse_block_matches_float(n_decimals):
+    rng = np.random.RandomState(n_decimals)
+    fmt = '%d %.{0:d}f %.{0:d}f'.format(n_decimals)
+    lines = [fmt % (1364515200 + i, watts, volts) for i, (watts, volts) in
+             enumerate(zip(rng.uniform(-50, 5000, 1000),
+                           rng.uniform(0, 300, 1000)))]
+    np.testing.assert_array_equal(_parse(lines), _expected(lines))
+
+
+def test_parse_block_mixed_decimals():
+    lines = ['1364515200 0.1 -0.30', '1364515201 12 2.675',
+             '1364515202 -7 0.000001', '1364515203 999999999.5 1.',
+             '1364515204 -0.0 .5']
+    np.testing.assert_array_equal(_parse(lines), _expected(lines))
+
+
+def test_parse_block_many_digits():
+    # Too many digits to accumulate exactly, so parsed the slow way
+    lines = ['1364515200 9007199254740993', '1364515201 0.12345678901234567']
+    np.testing.assert_array_equal(_parse(lines), _expected(lines))
+
+
+def test_parse_block_irregular_whitespace():
+    lines = ['1364515200  1.5', '1364515201\t2\r']
+    np.testing.assert_array_equal(_parse(lines), [[1364515200, 1.5],
+                                                  [1364515201, 2]])
+
+
+def _gzip(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as fh:
+        fh.write(data)
+    return buf.getvalue()
+
+
+def _zstd(data):
+    zstandard = pytest.importorskip('zstandard')
+    return zstandard.ZstdCompressor().compress(data)
+
+
+COMPRESSORS = {'.gz': _gzip, '.bz2': bz2.compress, '.zst': _zstd}
+
+# Small enough to put several members in each test file
+MEMBER_SIZE = 50000
+
+
+def _write_compressed(filename, data, suffix):
+    compress = COMPRESSORS[suffix]
+    with open(filename, 'wb') as fh:
+        for start in range(0, len(data), MEMBER_SIZE):
+            fh.write(compress(data[start:start+MEMBER_SIZE]))
+
+
+@pytest.fixture(params=sorted(COMPRESSORS))
+def compressed_copy(request, data_path, tmpdir):
+    """A copy of house_1's mains.dat, as several compressed members, in a
+    dataset of its own."""
+    plain = data_path.join('house_1', 'mains.dat')
+    house = tmpdir.mkdir('house_1')
+    _write_compressed(str(house.join('mains.dat' + request.param)),
+                      plain.read_binary(), request.param)
+    return plain, tmpdir
+
+
+def _read_all(filename, **kwargs):
+    timestamps, values = zip(*reader.iter_chunks(filename, **kwargs))
+    return np.concatenate(timestamps), np.concatenate(values)
+
+
+def test_compressed_reader_matches_plain(compressed_copy):
+    plain, path = compressed_copy
+    filename = str(path.join('house_1', 'mains.dat'))
+    assert compressed.find_data_file(filename) != filename
+    assert (reader.boundary_lines(filename) ==
+            reader.boundary_lines(str(plain)))
+    assert reader.count_lines(filename) == reader.count_lines(str(plain))
+
+    expected = _read_all(str(plain), chunk_size=10000)
+    actual = _read_all(filename, chunk_size=10000)
+    for a, b in zip(actual, expected):
+        np.testing.assert_array_equal(a, b)
+
+    timestamps = expected[0]
+    for timestamp in timestamps[[0, 1000, len(timestamps) // 2, -1]]:
+        offset = reader.find_offset(filename, timestamp)
+        assert offset == reader.find_offset(str(plain), timestamp)
+        np.testing.assert_array_equal(
+            _read_all(filename, offset=offset)[0],
+            _read_all(str(plain), offset=offset)[0])
+
+    start, end = timestamps[2000], timestamps[5000]
+    for a, b in zip(read_range('house_1/mains.dat', start, end, str(path)),
+                    read_range('house_1/mains.dat', start, end,
+                               str(plain.dirpath().dirpath()))):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_decompressing_reader_seeks(compressed_copy):
+    plain, path = compressed_copy
+    filename = compressed.find_data_file(str(path.join('house_1',
+                                                       'mains.dat')))
+    data = plain.read_binary()
+    index = compressed.build_block_index(filename, spacing=MEMBER_SIZE)
+    assert len(index['offset']) > 1
+    assert index['n_lines'] == data.count(b'\n')
+    assert index['uncompressed_size'] == len(data)
+    with compressed.DecompressingReader(filename, index) as fh:
+        for offset in (len(data) - 1000, 12345, 3 * MEMBER_SIZE + 7, 0):
+            fh.seek(offset)
+            assert fh.tell() == offset
+            assert fh.read(100) == data[offset:offset+100]
+            end = data.index(b'\n', offset + 100) + 1
+            assert fh.readline() == data[offset+100:end]
+
+
+def test_block_index_extended_by_appended_members(compressed_copy):
+    plain, path = compressed_copy
+    filename = compressed.find_data_file(str(path.join('house_1',
+                                                       'mains.dat')))
+    suffix = compressed.compressed_suffix(filename)
+    data = plain.read_binary()
+    split = data.index(b'\n', len(data) // 2) + 1
+    _write_compressed(filename, data[:split], suffix)
+    previous = compressed.build_block_index(filename, spacing=MEMBER_SIZE)
+    with open(filename, 'ab') as fh:
+        fh.write(COMPRESSORS[suffix](data[split:]))
+
+    extended = compressed.build_block_index(filename, spacing=MEMBER_SIZE,
+                                            previous=previous)
+    rebuilt = compressed.build_block_index(filename, spacing=MEMBER_SIZE)
+    assert sorted(extended) == sorted(rebuilt)
+    for name in rebuilt:
+        np.testing.assert_array_equal(extended[name], rebuilt[name])
+
+
+def test_decompressing_reader_reads_lines_of_a_big_file(tmpdir):
+    # A few MB in one member, read a line at a time as find_offset and
+    # align.HoldStream do
+    timestamps = 1364515200 + 6 * np.arange(300000)
+    data = b''.join(b'%d %d\n' % (t, t % 3000) for t in timestamps)
+    filename = str(tmpdir.join('channel_2.dat.gz'))
+    with open(filename, 'wb') as fh:
+        fh.write(_gzip(data))
+    lines = data.splitlines(True)
+    with compressed.DecompressingReader(filename) as fh:
+        for line in lines:
+            assert fh.readline() == line
+        assert fh.readline() == b''
+        assert fh.tell() == len(data)
+    plain = tmpdir.join('plain.dat')
+    plain.write_binary(data)
+    for timestamp in timestamps[[10, len(timestamps) // 2, -2]]:
+        assert (reader.find_offset(filename, timestamp) ==
+                reader.find_offset(str(plain), timestamp))
+
+
+@pytest.mark.parametrize('lines', [
+    ['1364515200 2', '1364515206 4 5', '1364515212 7 8'],
+    ['1364515200 2', '1364515206', '1364515212 7'],
+    ['1364515200  2', '1364515206 4 5'],
+    ['1364515200 2\r', '1364515206 4 5\r']])
+def test_parse_block_rejects_ragged_lines(lines):
+    with pytest.raises(ValueError) as excinfo:
+        _parse(lines)
+    assert '1364515206' in str(excinfo.value)
+
+
+@pytest.mark.parametrize('lines', [
+    ['1364515200 2', '1364515206 abc', '1364515212 7'],
+    ['1364515200  2', '1364515206 4x', '1364515212 7'],
+    ['1364515200 2e3', '1364515206 1.2.3', '1364515212 7']])
+def test_parse_block_rejects_non_numeric_values(lines):
+    with pytest.raises(ValueError) as excinfo:
+        _parse(lines)
+    assert '1364515206' in str(excinfo.value)
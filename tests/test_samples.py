@@ -0,0 +1,37 @@
+from __future__ import print_function, division
+import gzip
+import shutil
+import yaml
+
+from conftest import run_converter
+
+
+def _meters(output_path, building_i):
+    with open(str(output_path.join('building{:d}.yaml'.format(
+            building_i)))) as fh:
+        return yaml.safe_load(fh)['elec_meters']
+
+
+def test_sizes_of_compressed_files(data_path, tmpdir):
+    plain_output = tmpdir.mkdir('plain_output')
+    run_converter(data_path, plain_output, '--samples')
+
+    data = tmpdir.join('data')
+    shutil.copytree(str(data_path), str(data))
+    for filename in data.join('house_3').visit('channel_*.dat'):
+        with gzip.open(str(filename) + '.gz', 'wb') as fh:
+            fh.write(filename.read_binary())
+        filename.remove()
+    output = tmpdir.mkdir('output')
+    run_converter(data, output, '--samples')
+
+    plain_meters = _meters(plain_output, 3)
+    for instance, meter in _meters(output, 3).items():
+        plain_meter = plain_meters[instance]
+        filename = data_path.join(meter['data_location'])
+        assert meter['n_samples'] == plain_meter['n_samples']
+        assert (meter['n_uncompressed_bytes'] ==
+                plain_meter['n_uncompressed_bytes'] ==
+                plain_meter['n_bytes'] == filename.size())
+        assert meter['n_bytes'] == data.join(
+            meter['data_location'] + '.gz').size()
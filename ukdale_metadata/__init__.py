@@ -0,0 +1,2 @@
+"""Helpers used by convert_uk-dale_to_NILM_Metadata.py to read the raw
+UK-DALE data files and to cache what has been learnt about them."""
@@ -0,0 +1,222 @@
+"""Extracting appliance activations (on/off events) from meter data.
+
+An activation is a span during which an appliance draws at least its
+`on_power_threshold`.  Activations separated by less than
+`min_off_duration` seconds are merged and activations shorter than
+`min_on_duration` seconds are discarded.  These parameters come from
+APPLIANCE_PARAMS in the converter.
+
+Each sample is taken to last until the next sample, but for no more than
+the meter's `max_sample_period`.  A longer gap in the data ends any
+activation in progress.
+
+Activations are stored as a columnar .npz sidecar with the columns:
+
+* start, end : UNIX timestamps (float64)
+* energy : joules, i.e. watt-seconds (float64)
+* peak_power : watts (float64)
+"""
+from __future__ import print_function, division
+from os.path import isfile, join
+import numpy as np
+
+from .cache import UNCHANGED
+from .reader import iter_chunks
+from .sidecars import save_arrays
+
+COLUMNS = ('start', 'end', 'energy', 'peak_power')
+
+# APPLIANCE_PARAMS keys used by the extractor
+PARAMS = ('on_power_threshold', 'min_on_duration', 'min_off_duration')
+
+
+def activations_location(building_i, appliance):
+    """Returns the sidecar path, relative to OUTPUT_PATH, for `appliance`."""
+    name = '{}_{:d}'.format(appliance['type'], appliance['instance'])
+    return 'activations/house_{:d}/{}.npz'.format(
+        building_i, name.replace(' ', '_'))
+
+
+class ActivationFinder(object):
+    """Finds activations in a stream of (timestamps, power) chunks.
+
+    Call `update` for each chunk then `finish` to get the activations.
+    Each chunk is processed with vectorized operations; only a handful of
+    values are carried from one chunk to the next.
+    """
+
+    def __init__(self, on_power_threshold, min_on_duration, min_off_duration,
+                 max_sample_period):
+        self.on_power_threshold = on_power_threshold
+        self.min_on_duration = min_on_duration
+        self.min_off_duration = min_off_duration
+        self.max_sample_period = max_sample_period
+        # The last sample seen, which cannot be processed until the next
+        # sample's timestamp is known
+        self._last_sample = None
+        # [start, end, energy, peak_power] of the raw run of "on" samples
+        # which is still going at the end of the samples processed so far
+        self._open_run = None
+        # Merged activation which might still be merged with later runs
+        self._pending = None
+        self._activations = []
+
+    def update(self, timestamps, power):
+        if self._last_sample is not None:
+            timestamps = np.concatenate([[self._last_sample[0]], timestamps])
+            power = np.concatenate([[self._last_sample[1]], power])
+        if not timestamps.size:
+            return
+        self._last_sample = (timestamps[-1], power[-1])
+        if timestamps.size == 1:
+            return
+        intervals = np.diff(timestamps)
+        self._process(timestamps[:-1], power[:-1],
+                      np.minimum(intervals, self.max_sample_period),
+                      intervals > self.max_sample_period)
+
+    def finish(self):
+        """Returns a dict mapping each of COLUMNS to an array."""
+        if self._last_sample is not None:
+            timestamp, power = self._last_sample
+            self._process(np.array([timestamp]), np.array([power]),
+                          np.zeros(1), np.ones(1, dtype=bool))
+            self._last_sample = None
+        if self._pending is not None:
+            self._keep(*[np.array([value]) for value in self._pending])
+            self._pending = None
+        if self._activations:
+            columns = [np.concatenate(column)
+                       for column in zip(*self._activations)]
+        else:
+            columns = [np.empty(0)] * len(COLUMNS)
+        return dict(zip(COLUMNS, columns))
+
+    def _process(self, timestamps, power, durations, gap_after):
+        """Splits samples into runs of "on" samples.
+
+        `durations[i]` is how long sample i lasts and `gap_after[i]` is
+        True if there is a gap in the data after sample i.
+        """
+        n = timestamps.size
+        on = power >= self.on_power_threshold
+        # Does sample i continue a run from sample i - 1?
+        continues = np.empty(n, dtype=bool)
+        continues[0] = self._open_run is not None
+        continues[1:] = on[:-1] & ~gap_after[:-1]
+        run_starts = np.flatnonzero(on & ~continues)
+        segment_starts = np.concatenate([[0], run_starts])
+
+        # Sum, max and last index of the "on" samples in each segment.  A
+        # segment holds one run plus any "off" samples after it; the first
+        # segment holds the tail of the open run, if any.
+        energy = np.add.reduceat(np.where(on, power * durations, 0),
+                                 segment_starts)
+        peak_power = np.maximum.reduceat(np.where(on, power, -np.inf),
+                                         segment_starts)
+        last_on = np.maximum.reduceat(np.where(on, np.arange(n), -1),
+                                      segment_starts)
+        ends = np.where(last_on >= 0,
+                        timestamps[last_on] + durations[last_on], np.nan)
+
+        # Is the last run still going at the end of these samples?
+        still_on = bool(on[-1] and not gap_after[-1])
+
+        completed = []
+        if self._open_run is not None:
+            if last_on[0] >= 0:
+                self._open_run = [self._open_run[0], ends[0],
+                                  self._open_run[2] + energy[0],
+                                  max(self._open_run[3], peak_power[0])]
+            if run_starts.size or not still_on:
+                completed.append([np.array([value])
+                                  for value in self._open_run])
+                self._open_run = None
+
+        if run_starts.size:
+            run_columns = [timestamps[run_starts], ends[1:], energy[1:],
+                           peak_power[1:]]
+            if still_on:
+                self._open_run = [column[-1] for column in run_columns]
+                run_columns = [column[:-1] for column in run_columns]
+            completed.append(run_columns)
+
+        if completed:
+            self._merge(*[np.concatenate(column)
+                          for column in zip(*completed)])
+
+    def _merge(self, starts, ends, energy, peak_power):
+        """Merges completed runs which are separated by short gaps."""
+        if not starts.size:
+            return
+        if self._pending is not None:
+            starts, ends, energy, peak_power = [
+                np.concatenate([[pending], column]) for pending, column
+                in zip(self._pending, (starts, ends, energy, peak_power))]
+        new_group = np.empty(starts.size, dtype=bool)
+        new_group[0] = True
+        new_group[1:] = starts[1:] - ends[:-1] >= self.min_off_duration
+        groups = np.flatnonzero(new_group)
+        merged = [starts[groups],
+                  np.maximum.reduceat(ends, groups),
+                  np.add.reduceat(energy, groups),
+                  np.maximum.reduceat(peak_power, groups)]
+        self._pending = [column[-1] for column in merged]
+        self._keep(*[column[:-1] for column in merged])
+
+    def _keep(self, starts, ends, energy, peak_power):
+        long_enough = ends - starts >= self.min_on_duration
+        if np.any(long_enough):
+            self._activations.append(
+                [column[long_enough]
+                 for column in (starts, ends, energy, peak_power)])
+
+
+def find_activations(filename, on_power_threshold, min_on_duration,
+                     min_off_duration, max_sample_period):
+    """Streams through `filename` and returns its activations as a dict
+    mapping each of COLUMNS to an array."""
+    finder = ActivationFinder(on_power_threshold, min_on_duration,
+                              min_off_duration, max_sample_period)
+    for timestamps, values in iter_chunks(filename):
+        finder.update(timestamps, values[:, 0])
+    return finder.finish()
+
+
+def update_activations(filename, status, old_entry, new_entry, params,
+                       output_path, location):
+    """Finds activations and writes them to a sidecar, unless the data file
+    and the cached activations are unchanged.
+
+    Parameters
+    ----------
+    filename : str
+    status : str
+        How the file changed since `old_entry`, as reported by
+        `cache.scan_boundaries`.
+    old_entry, new_entry : dict
+        The previous and the up-to-date cache entries for `filename`.
+        `new_entry` is updated in place.
+    params : dict
+        The keys in PARAMS plus 'max_sample_period'.
+    output_path : str
+    location : str
+        Path of the sidecar relative to `output_path`.
+
+    Returns
+    -------
+    n_activations : int
+    """
+    cached = (old_entry or {}).get('activations', {}).get(location)
+    if (status == UNCHANGED and cached is not None and
+            cached['params'] == params and
+            isfile(join(output_path, location))):
+        n_activations = cached['n_activations']
+    else:
+        activations = find_activations(filename, **params)
+        save_arrays(output_path, location, **activations)
+        n_activations = len(activations['start'])
+
+    new_entry.setdefault('activations', {})[location] = {
+        'params': params, 'n_activations': n_activations}
+    return n_activations
@@ -0,0 +1,350 @@
+"""Aligning several meters' data onto a common time grid.
+
+Every channel has its own irregular clock, so before meters can be
+compared sample by sample they are put on a shared grid of GRID_PERIOD
+seconds.  A meter's value at a grid point is its last sample at or
+before that point, held for less than the meter's `max_sample_period`
+(as for the energy totals), and is missing (NaN) after that.
+
+All the meters are streamed together, one local (Europe/London) day at a
+time, each through a `HoldStream` reading small chunks of its file, so
+memory use depends on the number of meters and the length of a day, not
+on the length of the recording.  Each day is aligned with one vectorized
+lookup per meter.
+
+The aligned table of a building's meters is written to a directory (e.g.
+`aligned/house_1` in OUTPUT_PATH) of `YYYY-MM.npz` files, one per local
+month, each holding:
+
+* meters : the meter instance numbers of the columns (int64)
+* timestamp : grid points at which any meter has data (int64)
+* power : (n_timestamps, n_meters) float32 watts, NaN where missing
+
+`read_aligned` reads a time range back.
+"""
+from __future__ import print_function, division
+import posixpath
+import re
+from os import listdir, remove
+from os.path import isdir, isfile, join
+import numpy as np
+
+from .cache import UNCHANGED, APPENDED
+from .localtime import SECONDS_PER_DAY, local_days, utc_offsets
+from .metadata import TIMEZONE
+from .reader import find_offset, iter_chunks
+from .sidecars import load_arrays, save_arrays
+
+# Seconds between grid points.  The sample period of the individual
+# appliance monitors.
+GRID_PERIOD = 6
+
+# Bytes per chunk read by each stream.  Smaller than reader.CHUNK_SIZE
+# because a whole building's meters are streamed at once.
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_MONTH_FILENAME = re.compile(r'(\d{4}-\d{2})\.npz$')
+
+
+class HoldStream(object):
+    """Samples the power in a data file at increasing times, streaming
+    through the file as the times move on.
+
+    Parameters
+    ----------
+    filename : str
+    max_sample_period : number
+        A sample is held for less than this long.
+    start : number, optional
+        The earliest time which will be sampled.  Reading starts at the
+        first line which could still be held then.
+    chunk_size : int, optional
+    """
+
+    def __init__(self, filename, max_sample_period, start=None,
+                 chunk_size=STREAM_CHUNK_SIZE):
+        offset = 0
+        if start is not None:
+            offset = find_offset(filename, start - max_sample_period)
+        self.max_sample_period = max_sample_period
+        self._chunks = iter_chunks(filename, offset=offset,
+                                   chunk_size=chunk_size)
+        self._timestamps = np.empty(0)
+        self._power = np.empty(0)
+        self._exhausted = False
+
+    def sample(self, times):
+        """Returns a float64 array of the power at each of the sorted
+        `times`, NaN where there is no data.  `times` must not be earlier
+        than those of the previous call."""
+        while not self._exhausted and (
+                not self._timestamps.size or
+                self._timestamps[-1] <= times[-1]):
+            try:
+                timestamps, values = next(self._chunks)
+            except StopIteration:
+                self._exhausted = True
+                break
+            self._timestamps = np.concatenate([self._timestamps, timestamps])
+            self._power = np.concatenate([self._power, values[:, 0]])
+        if not self._timestamps.size:
+            return np.full(times.size, np.nan)
+
+        i = np.searchsorted(self._timestamps, times, side='right') - 1
+        valid = i >= 0
+        i = np.maximum(i, 0)
+        valid &= times - self._timestamps[i] < self.max_sample_period
+        power = np.where(valid, self._power[i], np.nan)
+        # Samples before the last one used are never needed again
+        self._timestamps = self._timestamps[i[-1]:]
+        self._power = self._power[i[-1]:]
+        return power
+
+    def close(self):
+        self._chunks.close()
+
+
+def local_midnight(day, tz=TIMEZONE):
+    """Returns the UNIX timestamp of the start of local `day`."""
+    t = day * SECONDS_PER_DAY
+    offset = int(utc_offsets(t, tz))
+    return t - int(utc_offsets(t - offset, tz))
+
+
+def day_grid(day, period=GRID_PERIOD):
+    """Returns the int64 grid points in local `day`."""
+    start = local_midnight(day)
+    end = local_midnight(day + 1)
+    first = -(-start // period) * period
+    return np.arange(first, end, period, dtype=np.int64)
+
+
+def iter_aligned(sources, first_day, last_day, period=GRID_PERIOD):
+    """Streams several data files onto a common grid, a local day at a
+    time.
+
+    Parameters
+    ----------
+    sources : list of (filename, max_sample_period)
+    first_day, last_day : int
+        Local day numbers, inclusive.
+    period : int, optional
+
+    Yields
+    ------
+    day, grid, power : int, int64 array, float64 array
+        `power` has a row for each grid point and a column for each of
+        `sources`, NaN where there is no data.
+    """
+    start = day_grid(first_day, period)[0]
+    streams = [HoldStream(filename, max_sample_period, start)
+               for filename, max_sample_period in sources]
+    try:
+        for day in range(first_day, last_day + 1):
+            grid = day_grid(day, period)
+            power = np.empty((grid.size, len(streams)))
+            for column, stream in enumerate(streams):
+                power[:, column] = stream.sample(grid)
+            yield day, grid, power
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+def month_location(location, day):
+    """Returns the location of the month file holding local `day`."""
+    month = np.datetime64(int(day), 'D').astype('datetime64[M]')
+    return posixpath.join(location, '{}.npz'.format(month))
+
+
+class MonthWriter(object):
+    """Collects rows a day at a time and writes a file for each month.
+
+    Parameters
+    ----------
+    output_path, location : str
+    carry : (month_location, dict of arrays), optional
+        Rows already written for the month of the first day which will
+        be added, to keep.
+    constants : dict of arrays, optional
+        Written to every month file as they are.
+    """
+
+    def __init__(self, output_path, location, carry=None, constants=None):
+        self.output_path = output_path
+        self.location = location
+        self.constants = constants or {}
+        self._month_location = None
+        self._pending = []
+        if carry is not None:
+            self._month_location, rows = carry
+            self._pending.append(rows)
+
+    def add(self, day, rows):
+        location = month_location(self.location, day)
+        if location != self._month_location:
+            self.flush()
+            self._month_location = location
+        self._pending.append(rows)
+
+    def flush(self):
+        if self._month_location is None:
+            return
+        arrays = dict(self.constants)
+        arrays.update({name: np.concatenate([rows[name]
+                                             for rows in self._pending])
+                       for name in self._pending[-1]})
+        save_arrays(self.output_path, self._month_location, **arrays)
+        self._pending = []
+
+
+def resume_day(last_day, old_entries, statuses):
+    """Returns the first local day whose aligned data may have changed
+    since `last_day` was the last day written, given the old cache
+    entries and statuses of the data files involved."""
+    return min([last_day] + [
+        int(local_days(old_entry['end']))
+        for old_entry, status in zip(old_entries, statuses)
+        if status == APPENDED])
+
+
+def load_carry(output_path, location, day, columns):
+    """Returns the rows of `columns` already written for the month of
+    `day` before that day, as a `MonthWriter` carry, or None."""
+    location = month_location(location, day)
+    month = load_arrays(output_path, location)
+    if month is None:
+        return None
+    keep = month['timestamp'] < local_midnight(day)
+    return location, {name: month[name][keep] for name in columns}
+
+
+def remove_months(output_path, location):
+    """Removes all of the month files in `location`."""
+    directory = join(output_path, location)
+    if not isdir(directory):
+        return
+    for filename in listdir(directory):
+        if _MONTH_FILENAME.match(filename):
+            remove(join(directory, filename))
+
+
+def aligned_location(building_i):
+    return posixpath.join('aligned', 'house_{:d}'.format(building_i))
+
+
+def update_aligned(data_path, meters, data_locations, max_sample_periods,
+                   statuses, old_entries, new_entries, output_path, location,
+                   cached=None):
+    """Writes the aligned table of a building's meters, reusing cached
+    work.
+
+    Nothing is read if none of the data files have changed.  If some have
+    been appended to, only the days from the earliest day which could
+    have changed are aligned again.
+
+    Parameters
+    ----------
+    data_path : str
+    meters : list of int
+        Meter instance numbers, one per column.
+    data_locations, max_sample_periods, statuses : lists
+        The data file, max_sample_period and the status of the data file
+        of each of `meters`.
+    old_entries, new_entries : lists of dicts
+        The previous (or None) and up-to-date cache entries of the data
+        files.
+    output_path, location : str
+    cached : dict, optional
+        What this returned last time.
+
+    Returns
+    -------
+    aligned : dict
+        Suitable for the cache.
+    """
+    first_day = int(local_days(min(entry['start'] for entry in new_entries)))
+    last_day = int(local_days(max(entry['end'] for entry in new_entries)))
+    result = {'location': location, 'meters': list(meters),
+              'data_locations': list(data_locations),
+              'max_sample_periods': list(max_sample_periods),
+              'grid_period': GRID_PERIOD, 'timezone': TIMEZONE,
+              'last_day': last_day}
+
+    resume = (
+        cached is not None and
+        all(cached[key] == result[key] for key in (
+            'location', 'meters', 'data_locations', 'max_sample_periods',
+            'grid_period', 'timezone')) and
+        all(status in (UNCHANGED, APPENDED) for status in statuses) and
+        isfile(join(output_path,
+                    month_location(location, cached['last_day']))))
+    if resume and all(status == UNCHANGED for status in statuses):
+        return result
+
+    carry = None
+    if resume:
+        first_day = max(resume_day(cached['last_day'], old_entries, statuses),
+                        first_day)
+        carry = load_carry(output_path, location, first_day,
+                           ('timestamp', 'power'))
+    else:
+        remove_months(output_path, location)
+
+    writer = MonthWriter(output_path, location, carry,
+                         {'meters': np.array(meters, dtype=np.int64)})
+    for day, grid, power in iter_aligned(
+            [(join(data_path, data_location), max_sample_period)
+             for data_location, max_sample_period in zip(
+                 data_locations, max_sample_periods)],
+            first_day, last_day):
+        rows = ~np.isnan(power).all(axis=1)
+        writer.add(day, {'timestamp': grid[rows],
+                         'power': power[rows].astype(np.float32)})
+    writer.flush()
+    return result
+
+
+def read_aligned(output_path, location, start=None, end=None):
+    """Reads an aligned table back.
+
+    Parameters
+    ----------
+    output_path, location : str
+    start, end : number, optional
+        Only return rows with start <= timestamp < end.
+
+    Returns
+    -------
+    meters, timestamps, power : np.ndarray
+        As in the month files.
+    """
+    directory = join(output_path, location)
+    months = sorted(filename for filename in listdir(directory)
+                    if _MONTH_FILENAME.match(filename))
+    if start is not None:
+        first = month_location(location, local_days(start))
+        months = [month for month in months
+                  if posixpath.join(location, month) >= first]
+    if end is not None:
+        last = month_location(location, local_days(end))
+        months = [month for month in months
+                  if posixpath.join(location, month) <= last]
+
+    meters = None
+    timestamps = []
+    power = []
+    for month in months:
+        table = load_arrays(output_path, posixpath.join(location, month))
+        in_range = np.ones(len(table['timestamp']), dtype=bool)
+        if start is not None:
+            in_range &= table['timestamp'] >= start
+        if end is not None:
+            in_range &= table['timestamp'] < end
+        meters = table['meters']
+        timestamps.append(table['timestamp'][in_range])
+        power.append(table['power'][in_range])
+    if meters is None:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                np.empty((0, 0), dtype=np.float32))
+    return meters, np.concatenate(timestamps), np.concatenate(power)
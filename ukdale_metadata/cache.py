@@ -0,0 +1,156 @@
+"""Persistent cache of what the converter has learnt about each data file.
+
+UK-DALE data files only ever grow by having lines appended, so each file
+is recorded by its size and mtime along with its first timestamp and the
+byte offset of its last line.  On a rerun:
+
+* unchanged files (same size and mtime) are not opened at all;
+* appended files (larger, with the same first line and with the
+  previously recorded last line still in place) are only read from the
+  previously recorded last-line offset onwards;
+* anything else (the file shrank or was rewritten) is rescanned from
+  scratch.
+
+A compressed data file (see `compressed`) is recorded by the size and
+mtime of the compressed file, with its boundaries from its block index
+and its last-line offset counting uncompressed bytes.  It counts as
+appended if it is bigger, its old compressed bytes are unchanged (see
+`compressed.is_appended`) and its old last line was terminated.
+"""
+from __future__ import print_function, division
+import json
+from os import stat, rename
+from os.path import isfile, join
+
+from .compressed import (block_index, block_index_location, compressed_suffix,
+                         find_data_file, is_appended)
+from .reader import last_line, line_timestamp
+
+CACHE_FILENAME = '.convert_cache.json'
+
+# How a data file has changed since it was cached
+NEW = 'new'
+UNCHANGED = 'unchanged'
+APPENDED = 'appended'
+REWRITTEN = 'rewritten'
+
+# Bump whenever the format of the cache entries changes so that stale
+# caches are discarded rather than misread.
+CACHE_VERSION = 2
+
+
+def cache_filename(output_path):
+    return join(output_path, CACHE_FILENAME)
+
+
+def load_cache(filename):
+    """Loads cache entries from `filename`.
+
+    Returns
+    -------
+    entries : dict
+        Maps data_location (str) to a cache entry (dict).  Empty if the
+        cache does not exist, cannot be parsed or is from another version.
+    """
+    if not isfile(filename):
+        return {}
+    try:
+        with open(filename) as fh:
+            cache = json.load(fh)
+    except ValueError:
+        return {}
+    if cache.get('version') != CACHE_VERSION:
+        return {}
+    return cache.get('entries', {})
+
+
+def save_cache(filename, entries):
+    """Atomically writes cache `entries` to `filename`."""
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as fh:
+        json.dump({'version': CACHE_VERSION, 'entries': entries}, fh,
+                  indent=1, sort_keys=True)
+    rename(tmp_filename, filename)
+
+
+def _is_append(fh, entry, first_line, size):
+    """Returns True if the file now open as `fh` looks like the cached file
+    with more lines appended to it."""
+    if size < entry['size'] or line_timestamp(first_line) != entry['start']:
+        return False
+    cached_last_line = entry['last_line'].encode('ascii')
+    fh.seek(entry['last_line_offset'])
+    # The cached last line must still be in place and terminated, otherwise
+    # the append started part-way through a line (or the file was rewritten)
+    return fh.read(len(cached_last_line) + 1).rstrip(b'\r\n') == cached_last_line
+
+
+def scan_boundaries(filename, entry=None, output_path=None,
+                    data_location=None):
+    """Returns an up-to-date cache entry for `filename`.
+
+    Parameters
+    ----------
+    filename : str
+    entry : dict, optional
+        The previously cached entry for `filename`, if there is one.
+    output_path, data_location : str, optional
+        Where to keep the block index of a compressed file as a sidecar.
+        If not given it is only kept in memory.
+
+    Returns
+    -------
+    entry, status : dict, str
+        `entry` has keys 'size', 'mtime', 'start', 'end', 'last_line' and
+        'last_line_offset' (and for compressed files 'uncompressed_size'
+        and 'prefix_digest'); the old `entry` itself is returned if the
+        file has not changed.  `status` is one of NEW, UNCHANGED,
+        APPENDED or REWRITTEN.
+    """
+    filename = find_data_file(filename)
+    st = stat(filename)
+    if entry is None:
+        status = NEW
+    elif entry['size'] == st.st_size and entry['mtime'] == st.st_mtime:
+        return entry, UNCHANGED
+    else:
+        status = REWRITTEN
+
+    if compressed_suffix(filename):
+        if (entry is not None and 'prefix_digest' in entry and
+                entry['last_line_offset'] + len(entry['last_line']) <
+                entry['uncompressed_size'] and
+                is_appended(filename, entry['size'], entry['prefix_digest'])):
+            status = APPENDED
+        location = None
+        if output_path is not None:
+            location = block_index_location(data_location)
+        index = block_index(filename, output_path, location)
+        return {
+            'size': st.st_size,
+            'mtime': st.st_mtime,
+            'start': line_timestamp(index['first_line']),
+            'end': line_timestamp(index['last_line']),
+            'last_line': index['last_line'].decode('ascii'),
+            'last_line_offset': index['last_line_offset'],
+            'uncompressed_size': index['uncompressed_size'],
+            'prefix_digest': index['prefix_digest']
+        }, status
+
+    with open(filename, 'rb') as fh:
+        first_line = fh.readline()
+        floor = 0
+        if entry is not None and _is_append(fh, entry, first_line, st.st_size):
+            status = APPENDED
+            floor = entry['last_line_offset']
+        offset, final_line = last_line(fh, floor=floor)
+
+    new_entry = {
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'start': line_timestamp(first_line),
+        'end': line_timestamp(final_line),
+        'last_line': final_line.decode('ascii'),
+        'last_line_offset': offset
+    }
+    return new_entry, status
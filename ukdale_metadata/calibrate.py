@@ -0,0 +1,279 @@
+"""Calibrating appliance parameters from the distribution of their power.
+
+Each meter's power readings are streamed into a quantile sketch: a
+histogram with logarithmically spaced bins, so any quantile it gives is
+within SKETCH_ACCURACY (relative) of the true quantile, however many
+readings went in.  A sketch is a small JSON-friendly dict, so (like the
+statistics state) it is kept in the conversion cache and carried on when
+data is appended, and sketches of different files or parts of files can
+be merged by adding their counts.
+
+An appliance's readings mix its off (standby) and on states.  These are
+split at the bin which best separates the two in log power (Otsu's
+method), which becomes the proposed `on_power_threshold`.  Any split in
+the empty gap between standby and on power separates them equally well,
+so the middle of the gap is taken.  The readings above it give a normal
+model of the on power, fitted robustly from the median and the 16th and
+84th percentiles, and the proposed `max_power` is the MAX_POWER_QUANTILE
+of all of the readings.
+
+These are only proposals: they are written to the metadata as
+`calibrated_*` fields and to a proposed APPLIANCE_PARAMS_CSV, and never
+replace the curated parameters which the other stages use.
+"""
+from __future__ import print_function, division
+import math
+import numpy as np
+
+from .cache import UNCHANGED, APPENDED
+from .metadata import APPLIANCE_SYNONYMS, appliance_params
+from .reader import iter_chunks
+
+SKETCH_ACCURACY = 0.01
+
+# Readings below this many watts are counted as zero
+SKETCH_MIN_POWER = 1.0
+
+MAX_POWER_QUANTILE = 0.9999
+
+# Fewer on readings than this, or a smaller fraction of all of the
+# readings, are not enough to calibrate from
+MIN_ON_SAMPLES = 100
+MIN_ON_FRACTION = 0.001
+
+
+def _gamma(sketch):
+    accuracy = sketch['accuracy']
+    return (1 + accuracy) / (1 - accuracy)
+
+
+def new_sketch(accuracy=SKETCH_ACCURACY, min_power=SKETCH_MIN_POWER):
+    """Returns an empty power sketch.
+
+    Bin i of a sketch holds readings in (gamma ** (i - 1), gamma ** i],
+    where gamma = (1 + accuracy) / (1 - accuracy), and counts[j] is the
+    count of bin offset + j.
+    """
+    return {'accuracy': accuracy, 'min_power': min_power, 'n_zero': 0,
+            'offset': 0, 'counts': []}
+
+
+def _add_counts(sketch, offset, counts):
+    """Adds `counts` of bins from `offset` on to `sketch` (in place)."""
+    if not len(counts):
+        return
+    old = np.array(sketch['counts'], dtype=np.int64)
+    if not old.size:
+        sketch['offset'] = offset
+    start = min(sketch['offset'], offset)
+    end = max(sketch['offset'] + old.size, offset + len(counts))
+    merged = np.zeros(end - start, dtype=np.int64)
+    merged[sketch['offset'] - start:sketch['offset'] - start + old.size] += old
+    merged[offset - start:offset - start + len(counts)] += counts
+    sketch['offset'] = int(start)
+    sketch['counts'] = [int(count) for count in merged]
+
+
+def update_sketch(sketch, power):
+    """Adds an array of power readings to `sketch` (in place)."""
+    above = power[power >= sketch['min_power']]
+    sketch['n_zero'] += int(power.size - above.size)
+    if not above.size:
+        return
+    bins = np.ceil(np.log(above) / math.log(_gamma(sketch))).astype(np.int64)
+    offset = int(bins.min())
+    _add_counts(sketch, offset, np.bincount(bins - offset))
+
+
+def merge_sketches(sketches):
+    """Returns a sketch of all of the readings in `sketches`, which must
+    have the same accuracy and min_power."""
+    sketches = list(sketches)
+    merged = new_sketch(sketches[0]['accuracy'], sketches[0]['min_power'])
+    for sketch in sketches:
+        if (sketch['accuracy'] != merged['accuracy'] or
+                sketch['min_power'] != merged['min_power']):
+            raise ValueError('Cannot merge sketches with different parameters')
+        merged['n_zero'] += sketch['n_zero']
+        _add_counts(merged, sketch['offset'],
+                    np.array(sketch['counts'], dtype=np.int64))
+    return merged
+
+
+def _bin_values(sketch, bins):
+    """Returns the value representing each of `bins`: the one with equal
+    relative error to either edge."""
+    gamma = _gamma(sketch)
+    return 2 * gamma ** np.asarray(bins, dtype=np.float64) / (gamma + 1)
+
+
+def sketch_quantiles(sketch, quantiles, min_bin=None):
+    """Returns the `quantiles` (0 to 1) of the readings in `sketch`, or of
+    those in bins from `min_bin` on.  Zero readings count as 0 W."""
+    counts = np.array(sketch['counts'], dtype=np.int64)
+    bins = sketch['offset'] + np.arange(counts.size)
+    n_zero = sketch['n_zero']
+    if min_bin is not None:
+        counts = counts[bins >= min_bin]
+        bins = bins[bins >= min_bin]
+        n_zero = 0
+    n = n_zero + counts.sum()
+    if not n:
+        raise ValueError('Empty sketch')
+    ranks = np.asarray(quantiles, dtype=np.float64) * (n - 1)
+    cumulative = n_zero + np.cumsum(counts)
+    i = np.searchsorted(cumulative, ranks, side='right')
+    values = _bin_values(sketch, bins[np.minimum(i, bins.size - 1)])
+    return np.where(ranks < n_zero, 0.0, values)
+
+
+def otsu_bin(sketch):
+    """Returns the last bin of the off state: the split of the sketch which
+    maximises the between-class variance of log power.  Zero readings
+    count as being in the bin below the lowest.  None if there are fewer
+    than two non-empty bins.
+
+    The variance is the same for every split within a run of empty bins,
+    so of the best splits the one in the middle of the run is returned.
+    """
+    counts = np.array([sketch['n_zero']] + sketch['counts'], dtype=np.float64)
+    bins = sketch['offset'] - 1 + np.arange(counts.size)
+    if np.count_nonzero(counts) < 2:
+        return None
+    weight = np.cumsum(counts)[:-1]
+    total = counts.sum()
+    weighted = np.cumsum(counts * bins)[:-1]
+    mean_below = weighted / np.maximum(weight, 1)
+    mean_above = (weighted[-1] + counts[-1] * bins[-1] - weighted) / np.maximum(
+        total - weight, 1)
+    between = weight * (total - weight) * (mean_below - mean_above) ** 2
+    first = int(np.argmax(between))
+    last = first
+    while last + 1 < between.size and between[last + 1] == between[first]:
+        last += 1
+    return int(bins[(first + last) // 2])
+
+
+def calibrate(sketch):
+    """Proposes parameters for an appliance from a sketch of its meter's
+    power.
+
+    Returns
+    -------
+    params : dict or None
+        With 'on_power_threshold' and 'max_power' (int watts),
+        'on_power' (a normal model: a dict with 'distribution_name', 'mu'
+        and 'sigma') and 'n_on_samples'.  None if the readings do not have
+        at least MIN_ON_SAMPLES on readings, and MIN_ON_FRACTION of all of
+        them, separable from the rest.
+    """
+    off_bin = otsu_bin(sketch)
+    if off_bin is None:
+        return None
+    counts = np.array(sketch['counts'], dtype=np.int64)
+    bins = sketch['offset'] + np.arange(counts.size)
+    n_on = int(counts[bins > off_bin].sum())
+    if (n_on < MIN_ON_SAMPLES or
+            n_on < MIN_ON_FRACTION * (sketch['n_zero'] + counts.sum())):
+        return None
+    # The upper edge of the last off bin
+    threshold = _gamma(sketch) ** off_bin
+    low, median, high = sketch_quantiles(
+        sketch, [0.16, 0.5, 0.84], min_bin=off_bin + 1)
+    max_power = sketch_quantiles(sketch, [MAX_POWER_QUANTILE])[0]
+    return {
+        'on_power_threshold': max(int(math.ceil(threshold)), 1),
+        'max_power': int(math.ceil(max_power)),
+        'on_power': {'distribution_name': 'normal',
+                     'mu': round(float(median), 1),
+                     'sigma': round(float(high - low) / 2, 1)},
+        'n_on_samples': n_on}
+
+
+def scan_sketch(filename, sketch=None, offset=0):
+    """Streams through `filename` adding its power readings to a sketch.
+
+    If `sketch` is given then the line at `offset` must be the last line
+    already counted in it.
+    """
+    if sketch is None:
+        sketch = new_sketch()
+        skip = 0
+    else:
+        sketch = dict(sketch)
+        skip = 1
+    for _, values in iter_chunks(filename, offset=offset):
+        update_sketch(sketch, values[skip:, 0])
+        skip = 0
+    return sketch
+
+
+def update_power_sketch(filename, status, old_entry):
+    """Returns a power sketch of `filename`, reusing cached work."""
+    sketch = (old_entry or {}).get('power_sketch')
+    if (sketch is not None and sketch['accuracy'] == SKETCH_ACCURACY and
+            sketch['min_power'] == SKETCH_MIN_POWER):
+        if status == UNCHANGED:
+            return sketch
+        elif status == APPENDED:
+            return scan_sketch(filename, sketch,
+                               offset=old_entry['last_line_offset'])
+    return scan_sketch(filename)
+
+
+def dedicated_meters(building):
+    """Returns a list of (appliance, meter instance) for each appliance of
+    `building` with a meter of its own: one which is not a site meter and
+    which no other appliance shares."""
+    users = {}
+    for appliance in building['appliances']:
+        for meter in appliance.get('meters', []):
+            users[meter] = users.get(meter, 0) + 1
+    return [(appliance, appliance['meters'][0])
+            for appliance in building['appliances']
+            if len(appliance.get('meters', [])) == 1 and
+            users[appliance['meters'][0]] == 1 and
+            not building['elec_meters'].get(
+                appliance['meters'][0], {}).get('site_meter')]
+
+
+def apply_calibration(appliance, params):
+    """Adds calibrated `params` to an appliance's metadata as proposals:
+    'calibrated_on_power_threshold', 'calibrated_max_power' and
+    'calibrated_on_power' (the normal model).  Its curated parameters
+    are left alone."""
+    appliance['calibrated_on_power_threshold'] = params['on_power_threshold']
+    appliance['calibrated_max_power'] = params['max_power']
+    appliance['calibrated_on_power'] = dict(params['on_power'])
+
+
+def appliance_params_csv(sketches):
+    """Returns a proposed APPLIANCE_PARAMS_CSV.
+
+    Parameters
+    ----------
+    sketches : dict
+        Maps each appliance type in APPLIANCE_PARAMS_CSV (synonyms are
+        mapped to their type) to a list of sketches of appliances of that
+        type.  Types without a calibration keep their current parameters.
+    """
+    params = appliance_params()
+    columns = ['max_power', 'on_power_threshold', 'min_on_duration',
+               'min_off_duration']
+    by_type = {}
+    for appliance_type, type_sketches in sketches.items():
+        appliance_type = APPLIANCE_SYNONYMS.get(appliance_type,
+                                                appliance_type)
+        by_type.setdefault(appliance_type, []).extend(type_sketches)
+    lines = ['{:<16} {}'.format('', ', '.join(
+        '{:>18}'.format(column) for column in columns))]
+    for appliance_type in sorted(params):
+        row = dict(params[appliance_type])
+        if by_type.get(appliance_type):
+            proposal = calibrate(merge_sketches(by_type[appliance_type]))
+            if proposal is not None:
+                row['max_power'] = proposal['max_power']
+                row['on_power_threshold'] = proposal['on_power_threshold']
+        lines.append('{:<16} {}'.format(appliance_type + ',', ', '.join(
+            '{:>18d}'.format(row[column]) for column in columns)))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,420 @@
+"""Reading data files which are stored compressed.
+
+A data file such as `house_3/channel_2.dat` may be stored as
+`channel_2.dat.gz`, `.bz2` or `.zst` instead.  `find_data_file` finds
+whichever exists, and the functions in `reader` (and so every stage of
+the converter) read compressed files through a `DecompressingReader`,
+with byte offsets counting uncompressed bytes.
+
+Finding the last line of a compressed file means decompressing all of
+it, so that is done once per file, in one pass which also builds its
+block index:
+
+* the file's first line, last line (and its offset) and number of lines;
+* every BLOCK_INDEX_SPACING uncompressed bytes or so, the compressed and
+  uncompressed offsets of the start of a member (gzip), stream (bzip2) or
+  frame (zstd), and the timestamp and offset of the first line after it.
+
+Decompression can start afresh at any of these, so a reader seeks to the
+nearest one before an offset and only decompresses from there.  Files
+written as many independent members (e.g. by `bgzip`, `pbzip2` or
+`pzstd`) can so be read from the middle; a file written as a single
+stream always has to be decompressed from the start, though its
+boundaries and number of lines still come straight from the index.
+
+Indexes are kept in memory for the life of the process and, when
+`block_index` is given an output path (as it is by
+`cache.scan_boundaries`), as sidecars in `block_index/` there, which are
+reused for as long as the compressed file's size and mtime are
+unchanged.
+
+Compressed data files grow by having members appended (e.g. with
+`bgzip` or `pzstd`), which leaves the bytes before them as they were.
+A file which is bigger than when it was indexed, and whose old bytes
+look the same (judged by a digest of PREFIX_CHECK_SIZE bytes at each end
+of them), only has its new members decompressed to extend its index,
+and `cache.scan_boundaries` counts it as appended.  Reading .zst files
+needs Python >= 3.14 or the `zstandard` package.
+"""
+from __future__ import print_function, division
+import bz2
+import hashlib
+import zlib
+from os import stat
+from os.path import isfile, join
+import numpy as np
+
+from .sidecars import load_arrays, save_arrays, sidecar_location
+
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.zst')
+
+# Approximate number of uncompressed bytes between block index entries
+BLOCK_INDEX_SPACING = 4 * 1024 * 1024
+
+# Number of compressed bytes to read at a time
+READ_SIZE = 1024 * 1024
+
+# Compressed bytes hashed at each end of the part of a file which was
+# indexed, to tell whether it is still there
+PREFIX_CHECK_SIZE = 64 * 1024
+
+# Bytes kept from the end of the decompressed data to find the last line
+_TAIL_SIZE = 64 * 1024
+
+# Block indexes built or loaded by this process, keyed by filename
+_block_indexes = {}
+
+
+def compressed_suffix(filename):
+    """Returns the compression suffix of `filename`, or None."""
+    for suffix in COMPRESSED_SUFFIXES:
+        if filename.endswith(suffix):
+            return suffix
+    return None
+
+
+def find_data_file(filename):
+    """Returns `filename` if it exists, otherwise the first compressed
+    version of it which exists, otherwise `filename`."""
+    if isfile(filename) or compressed_suffix(filename):
+        return filename
+    for suffix in COMPRESSED_SUFFIXES:
+        if isfile(filename + suffix):
+            return filename + suffix
+    return filename
+
+
+def _zstd_decompressor():
+    try:
+        from compression import zstd
+    except ImportError:
+        pass
+    else:
+        return zstd.ZstdDecompressor()
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('Reading .zst files needs Python >= 3.14 or the'
+                          ' zstandard package')
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def _decompressor(suffix):
+    if suffix == '.gz':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif suffix == '.bz2':
+        return bz2.BZ2Decompressor()
+    return _zstd_decompressor()
+
+
+def iter_members(fh, suffix, offset=0):
+    """Decompresses the open file `fh` from the start of the member (or
+    stream or frame) at compressed `offset` to the end of the file.
+
+    Yields
+    ------
+    member_offset, data : int or None, bytes
+        `member_offset` is the compressed offset of the member which
+        `data` is the first output of, else None.
+    """
+    fh.seek(offset)
+    position = offset
+    member_offset = offset
+    decompressor = _decompressor(suffix)
+    pending = b''
+    while True:
+        if not pending:
+            pending = fh.read(READ_SIZE)
+            if not pending:
+                break
+        try:
+            data = decompressor.decompress(pending)
+            rest = decompressor.unused_data
+        except EOFError:
+            # Python 2's bz2 refuses more input after the end of a stream
+            data, rest = b'', pending
+        if member_offset is not None:
+            yield member_offset, data
+            member_offset = None
+        elif data:
+            yield None, data
+        position += len(pending) - len(rest)
+        if rest or getattr(decompressor, 'eof', False):
+            if not rest.strip(b'\0'):
+                # Padding after the last member
+                position += len(rest)
+                rest = b''
+            decompressor = _decompressor(suffix)
+            member_offset = position
+        pending = rest
+
+
+def prefix_digest(filename, size):
+    """Returns a hex digest of PREFIX_CHECK_SIZE bytes from each end of
+    the first `size` bytes of `filename`."""
+    sha256 = hashlib.sha256()
+    n_bytes = min(size, PREFIX_CHECK_SIZE)
+    with open(filename, 'rb') as fh:
+        sha256.update(fh.read(n_bytes))
+        fh.seek(size - n_bytes)
+        sha256.update(fh.read(n_bytes))
+    return sha256.hexdigest()
+
+
+def is_appended(filename, size, digest):
+    """Returns True if `filename` is bigger than `size` bytes and its first
+    `size` bytes still have the `prefix_digest` `digest`."""
+    return (stat(filename).st_size > size and
+            prefix_digest(filename, size) == digest)
+
+
+def build_block_index(filename, spacing=BLOCK_INDEX_SPACING, previous=None):
+    """Decompresses `filename` once to build its block index.
+
+    Parameters
+    ----------
+    filename : str
+    spacing : int, optional
+    previous : dict, optional
+        The block index of the file before members were appended to it,
+        which must have ended with a newline.  Only the new members are
+        decompressed.
+
+    Returns
+    -------
+    index : dict
+        With arrays 'compressed_offset', 'offset' (uncompressed),
+        'line_offset' and 'timestamp', one entry per indexed member, and
+        the compressed file's 'size', 'mtime' and 'prefix_digest', its
+        'uncompressed_size', 'n_lines', 'first_line', 'last_line',
+        'last_line_offset' and 'tail' (the bytes from the start of the
+        last line to the end).
+    """
+    from .reader import line_timestamp
+
+    st = stat(filename)
+    entries = []
+    first_line = None
+    compressed_offset = 0
+    position = 0
+    n_lines = 0
+    tail = b''
+    if previous is not None:
+        entries = [list(entry) for entry in zip(
+            previous['compressed_offset'].tolist(),
+            previous['offset'].tolist(), previous['line_offset'].tolist(),
+            previous['timestamp'].tolist())]
+        first_line = previous['first_line'] or None
+        compressed_offset = previous['size']
+        position = previous['uncompressed_size']
+        n_lines = previous['n_lines']
+        tail = previous['tail']
+    # The entry waiting for the timestamp of the first whole line after
+    # the start of its member, and the bytes of that line seen so far
+    waiting = None
+    head = b''
+    with open(filename, 'rb') as fh:
+        for member_offset, data in iter_members(
+                fh, compressed_suffix(filename), compressed_offset):
+            if (member_offset is not None and waiting is None and
+                    (not entries or position - entries[-1][1] >= spacing)):
+                # A member starting part-way through a line indexes the
+                # line after
+                waiting = [member_offset, position, None, None]
+                if not position or tail.endswith(b'\n'):
+                    waiting[2] = position
+                head = data
+            elif waiting is not None:
+                head += data
+            if waiting is not None and waiting[2] is None:
+                newline = head.find(b'\n')
+                if newline != -1:
+                    waiting[2] = position + len(data) - len(head) + newline + 1
+                    head = head[newline+1:]
+                else:
+                    head = b''
+            if waiting is not None and waiting[2] is not None:
+                # Skip blank lines
+                stripped = head.lstrip(b'\r\n')
+                waiting[2] += len(head) - len(stripped)
+                head = stripped
+                newline = head.find(b'\n')
+                if newline != -1:
+                    waiting[3] = line_timestamp(head[:newline])
+                    entries.append(waiting)
+                    waiting = None
+                    if first_line is None:
+                        first_line = head[:newline].rstrip(b'\r')
+            position += len(data)
+            n_lines += data.count(b'\n')
+            tail = (tail + data[-_TAIL_SIZE:])[-_TAIL_SIZE:]
+    if waiting is not None and waiting[2] is not None and head.strip():
+        # The last line, without a trailing newline
+        waiting[3] = line_timestamp(head)
+        entries.append(waiting)
+        if first_line is None:
+            first_line = head.strip()
+    if tail and not tail.endswith(b'\n'):
+        n_lines += 1
+
+    stripped = tail.rstrip(b'\r\n')
+    newline = stripped.rfind(b'\n')
+    compressed_offsets, offsets, line_offsets, timestamps = (
+        zip(*entries) if entries else ([], [], [], []))
+    return {
+        'compressed_offset': np.array(compressed_offsets, dtype=np.int64),
+        'offset': np.array(offsets, dtype=np.int64),
+        'line_offset': np.array(line_offsets, dtype=np.int64),
+        'timestamp': np.array(timestamps, dtype=np.float64),
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'prefix_digest': prefix_digest(filename, st.st_size),
+        'uncompressed_size': position,
+        'n_lines': n_lines,
+        'first_line': first_line or b'',
+        'last_line': stripped[newline+1:],
+        'last_line_offset': position - len(tail) + newline + 1,
+        'tail': tail[newline+1:]}
+
+
+def block_index_location(data_location):
+    """Returns the sidecar path of the block index of the data file at
+    `data_location` (relative to the dataset)."""
+    return sidecar_location('block_index', data_location, '.npz')
+
+
+_SCALARS = ('size', 'mtime', 'prefix_digest', 'uncompressed_size',
+            'n_lines', 'first_line', 'last_line', 'last_line_offset', 'tail')
+
+
+def block_index(filename, output_path=None, location=None):
+    """Returns the block index of the compressed `filename`.
+
+    An up-to-date index in memory, or in the sidecar at `location` under
+    `output_path` if given, is reused; an index of the file from before
+    members were appended to it is extended; otherwise the index is built
+    from scratch.  A new index is saved to the sidecar if given.
+    """
+    st = stat(filename)
+    index = _block_indexes.get(filename)
+    if index is None and output_path is not None:
+        index = load_arrays(output_path, location)
+        if index is not None and not all(name in index for name in _SCALARS):
+            index = None
+        if index is not None:
+            for name in _SCALARS:
+                index[name] = index[name].item()
+    save = (output_path is not None and
+            not isfile(join(output_path, location)))
+    if (index is None or index['size'] != st.st_size or
+            index['mtime'] != st.st_mtime):
+        if (index is not None and index['tail'].endswith(b'\n') and
+                is_appended(filename, index['size'], index['prefix_digest'])):
+            index = build_block_index(filename, previous=index)
+        else:
+            index = build_block_index(filename)
+        save = output_path is not None
+    if save:
+        save_arrays(output_path, location, **{
+            name: np.array(value) for name, value in index.items()})
+    _block_indexes[filename] = index
+    return index
+
+
+class DecompressingReader(object):
+    """A read-only binary file object over the decompressed contents of a
+    compressed data file, supporting read, readline, tell and seek.
+
+    Parameters
+    ----------
+    filename : str
+    index : dict, optional
+        The file's block index.  Looked up with `block_index` the first
+        time a seek needs it.
+    """
+
+    def __init__(self, filename, index=None):
+        self.filename = filename
+        self._suffix = compressed_suffix(filename)
+        self._index = index
+        self._fh = open(filename, 'rb')
+        self._restart(0, 0)
+
+    def _restart(self, compressed_offset, offset):
+        self._members = iter_members(self._fh, self._suffix,
+                                     compressed_offset)
+        # Decompressed bytes from self._start on are yet to be read.  Reads
+        # only move self._start, so reading line by line does not copy the
+        # rest of the buffer each time.
+        self._buffer = b''
+        self._start = 0
+        self._position = offset
+
+    def _n_buffered(self):
+        return len(self._buffer) - self._start
+
+    def _fill(self, n):
+        """Decompresses until at least `n` bytes are buffered or the end
+        of the file is reached, dropping the bytes already read."""
+        blocks = [self._buffer[self._start:]]
+        n_buffered = len(blocks[0])
+        while n_buffered < n:
+            try:
+                _, data = next(self._members)
+            except StopIteration:
+                break
+            blocks.append(data)
+            n_buffered += len(data)
+        self._buffer = b''.join(blocks)
+        self._start = 0
+
+    def read(self, n=-1):
+        if n < 0:
+            self._fill(float('inf'))
+            n = self._n_buffered()
+        elif self._n_buffered() < n:
+            self._fill(n)
+        data = self._buffer[self._start:self._start+n]
+        self._start += len(data)
+        self._position += len(data)
+        return data
+
+    def readline(self):
+        newline = self._buffer.find(b'\n', self._start)
+        while newline == -1:
+            n_buffered = self._n_buffered()
+            self._fill(n_buffered + READ_SIZE)
+            if self._n_buffered() == n_buffered:
+                return self.read(n_buffered)
+            newline = self._buffer.find(b'\n', n_buffered)
+        return self.read(newline + 1 - self._start)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset):
+        if (offset < self._position or
+                offset - self._position > BLOCK_INDEX_SPACING):
+            if self._index is None:
+                self._index = block_index(self.filename)
+            i = np.searchsorted(self._index['offset'], offset,
+                                side='right') - 1
+            if i >= 0 and (offset < self._position or
+                           self._index['offset'][i] > self._position):
+                self._restart(int(self._index['compressed_offset'][i]),
+                              int(self._index['offset'][i]))
+            elif offset < self._position:
+                self._restart(0, 0)
+        while self._position < offset:
+            if not self.read(min(offset - self._position, READ_SIZE)):
+                break
+
+    def close(self):
+        self._members.close()
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,698 @@
+"""Converts the UK-DALE labels and data files into NILM Metadata YAML."""
+from __future__ import print_function, division
+from argparse import ArgumentParser
+from copy import deepcopy
+from datetime import datetime
+from functools import partial
+from os import makedirs
+from os.path import join, isdir, isfile
+import platform
+import time
+import pytz
+from .instrument import Recorder, write_report
+from .metadata import (
+    N_BULDINGS, TIMEZONE, add_appliance_params, appliances_for_each_building,
+    building_metadata, dataset, load_labels, meter_devices)
+
+# The modules which read the data files all import numpy, so they (and
+# multiprocessing) are only imported once there is a conversion to run.
+
+RAW_UKPD_DATA_PATH = "/data/mine/vadeec/merged"
+OUTPUT_PATH = "."
+
+# Written to OUTPUT_PATH along with the YAML
+REPORT_FILENAME = 'conversion_report.json'
+CALIBRATED_PARAMS_FILENAME = 'calibrated_appliance_params.csv'
+
+TZ = pytz.timezone(TIMEZONE)
+
+
+def set_paths(data_path=None, output_path=None):
+    """Overrides RAW_UKPD_DATA_PATH and/or OUTPUT_PATH."""
+    global RAW_UKPD_DATA_PATH, OUTPUT_PATH
+    if data_path is not None:
+        RAW_UKPD_DATA_PATH = data_path
+    if output_path is not None:
+        OUTPUT_PATH = output_path
+
+
+def _timestamp_to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=TZ)
+
+
+def measurement_names(device_model):
+    """Returns a name for each measurement of a meter device, in the order
+    of the value columns of its data files, e.g. 'power_active'."""
+    names = []
+    for measurement in meter_devices()[device_model]['measurements']:
+        name = measurement['physical_quantity']
+        if 'type' in measurement:
+            name += '_' + measurement['type']
+        names.append(name)
+    return names
+
+
+def scan_meter(meter, cache_entries, new_cache_entries, stages=(),
+               recorder=None):
+    """Fills in the parts of `meter` which come from its data file.
+
+    Parameters
+    ----------
+    meter : dict
+        Meter metadata, including its 'data_location' and any
+        'preprocessing_applied'.  Updated in place with its 'timeframe'
+        and with the results of any optional `stages`.
+    cache_entries : dict
+        Conversion cache entries from the previous run, keyed by
+        data_location.
+    new_cache_entries : dict
+        The up-to-date cache entry for this meter's data file is put here.
+    stages : sequence of str, optional
+        Names of optional passes to run over the whole data file,
+        e.g. 'statistics'.
+    recorder : instrument.Recorder, optional
+        Records the cost of reading the file's boundaries and of each
+        stage.
+
+    Returns
+    -------
+    start, end, status : datetime, datetime, str
+        `status` says how the data file has changed since it was cached.
+    """
+    from .cache import scan_boundaries
+    from .calibrate import update_power_sketch
+    from .energy import update_daily_energy
+    from .export import update_columnar
+    from .good_sections import update_good_sections
+    from .index import update_index
+    from .pyramid import update_pyramid
+    from .samples import update_n_samples
+    from .stats import statistics_metadata, update_statistics
+
+    if recorder is None:
+        recorder = Recorder()
+    data_location = meter['data_location']
+    filename = join(RAW_UKPD_DATA_PATH, data_location)
+    old_entry = cache_entries.get(data_location)
+    with recorder.stage('boundaries', data_location=data_location):
+        entry, status = scan_boundaries(filename, old_entry, OUTPUT_PATH,
+                                        data_location)
+    start = _timestamp_to_datetime(entry['start'])
+    end = _timestamp_to_datetime(entry['end'])
+    meter['timeframe'] = timeframe(start, end)
+
+    if 'samples' in stages:
+        with recorder.stage('samples', data_location=data_location):
+            entry['n_samples'] = update_n_samples(filename, status, old_entry)
+        meter['n_samples'] = entry['n_samples']
+        # The size of the file as stored, so of the compressed file if it
+        # is compressed, and of the data in it, which is the same whatever
+        # the format
+        meter['n_bytes'] = entry['size']
+        meter['n_uncompressed_bytes'] = entry.get('uncompressed_size',
+                                                  entry['size'])
+
+    if 'statistics' in stages:
+        upper_limit = (meter.get('preprocessing_applied', {})
+                       .get('clip', {}).get('upper_limit'))
+        with recorder.stage('statistics', data_location=data_location):
+            entry['statistics'] = update_statistics(
+                filename, status, old_entry, upper_limit)
+        meter['statistics'] = statistics_metadata(entry['statistics'])
+
+    # Only appliances are calibrated, so site meters need no sketch
+    if 'calibration' in stages and not meter.get('site_meter'):
+        with recorder.stage('sketch', data_location=data_location):
+            entry['power_sketch'] = update_power_sketch(
+                filename, status, old_entry)
+
+    max_sample_period = (
+        meter_devices()[meter['device_model']]['max_sample_period'])
+    if 'good_sections' in stages:
+        with recorder.stage('good_sections', data_location=data_location):
+            entry['good_sections'] = update_good_sections(
+                filename, status, old_entry, max_sample_period, OUTPUT_PATH,
+                data_location)
+        meter['good_sections'] = {
+            'location': entry['good_sections']['location'],
+            'n_sections': entry['good_sections']['n_sections']}
+
+    if 'index' in stages:
+        with recorder.stage('index', data_location=data_location):
+            entry['index'] = update_index(
+                filename, status, old_entry, OUTPUT_PATH, data_location)
+        meter['index'] = {'location': entry['index']['location']}
+
+    if 'pyramid' in stages:
+        with recorder.stage('pyramid', data_location=data_location):
+            entry['pyramid'] = update_pyramid(
+                filename, status, old_entry, max_sample_period, OUTPUT_PATH,
+                data_location)
+        meter['pyramid'] = dict(entry['pyramid']['locations'])
+
+    if 'energy' in stages:
+        with recorder.stage('energy', data_location=data_location):
+            entry['energy'] = update_daily_energy(
+                filename, status, old_entry, max_sample_period, OUTPUT_PATH,
+                data_location)
+
+    if 'columnar' in stages:
+        with recorder.stage('columnar', data_location=data_location):
+            entry['columnar'] = update_columnar(
+                filename, status, old_entry, OUTPUT_PATH, data_location,
+                measurement_names(meter['device_model']))
+        meter['columnar'] = dict(entry['columnar'])
+
+    new_cache_entries[data_location] = entry
+    return start, end, status
+
+
+def scan_activations(building_i, building, cache_entries, new_cache_entries,
+                     statuses, recorder):
+    """Extracts activations for each appliance which has APPLIANCE_PARAMS
+    and a single meter, adding an 'activations' summary to the appliance.
+
+    Parameters
+    ----------
+    building_i : int
+    building : dict
+        With its 'elec_meters' and 'appliances' filled in.
+    cache_entries, new_cache_entries : dict
+        As for `scan_meter`.  `new_cache_entries` is updated in place.
+    statuses : dict
+        Maps data_location to the status returned by `scan_meter`.
+    recorder : instrument.Recorder
+    """
+    from .activations import (
+        PARAMS as ACTIVATION_PARAMS, activations_location, update_activations)
+
+    for appliance in building['appliances']:
+        if (len(appliance['meters']) != 1 or
+                not all(param in appliance for param in ACTIVATION_PARAMS)):
+            continue
+        meter = building['elec_meters'][appliance['meters'][0]]
+        data_location = meter['data_location']
+        params = {param: appliance[param] for param in ACTIVATION_PARAMS}
+        params['max_sample_period'] = (
+            meter_devices()[meter['device_model']]['max_sample_period'])
+        location = activations_location(building_i, appliance)
+        with recorder.stage('activations', data_location=data_location):
+            n_activations = update_activations(
+                join(RAW_UKPD_DATA_PATH, data_location),
+                statuses[data_location], cache_entries.get(data_location),
+                new_cache_entries[data_location], params, OUTPUT_PATH,
+                location)
+        appliance['activations'] = {
+            'location': location, 'n_activations': n_activations}
+
+
+def scan_residuals(building, cache_entries, new_cache_entries, statuses,
+                   recorder):
+    """Computes the unmetered residual of each meter which has submeters,
+    adding a 'residual' summary to the meter.
+
+    Parameters are as for `scan_activations`.
+    """
+    from .residual import residual_metadata, submeter_tree, update_residual
+
+    meters = building['elec_meters']
+    for parent, children in sorted(submeter_tree(meters).items()):
+        data_locations = [meters[instance]['data_location']
+                          for instance in [parent] + children]
+        max_sample_periods = [
+            meter_devices()[meters[instance]['device_model']]
+            ['max_sample_period'] for instance in [parent] + children]
+        with recorder.stage('residual', data_location=data_locations[0]):
+            residual = update_residual(
+                RAW_UKPD_DATA_PATH, data_locations, max_sample_periods,
+                [statuses[location] for location in data_locations],
+                [cache_entries.get(location) for location in data_locations],
+                [new_cache_entries[location] for location in data_locations],
+                OUTPUT_PATH)
+        new_cache_entries[data_locations[0]]['residual'] = residual
+        meters[parent]['residual'] = residual_metadata(
+            OUTPUT_PATH, residual['location'])
+        meters[parent]['residual']['children'] = children
+
+
+def calibrate_appliances(building, new_cache_entries):
+    """Adds parameters calibrated from the power sketch of each appliance
+    with a meter of its own to the appliance's metadata, as `calibrated_*`
+    proposals alongside its curated parameters."""
+    from .calibrate import apply_calibration, calibrate, dedicated_meters
+
+    for appliance, instance in dedicated_meters(building):
+        data_location = building['elec_meters'][instance]['data_location']
+        params = calibrate(new_cache_entries[data_location]['power_sketch'])
+        if params is not None:
+            apply_calibration(appliance, params)
+
+
+def scan_aligned(building_i, building, cache_entries, new_cache_entries,
+                 statuses, recorder):
+    """Writes the aligned table of all of a building's meters, adding its
+    location to the building as 'aligned'.
+
+    Parameters are as for `scan_activations`.  The table's cache entry
+    is kept with that of the building's first meter.
+    """
+    from .align import aligned_location, update_aligned
+
+    meters = building['elec_meters']
+    instances = sorted(meters)
+    data_locations = [meters[instance]['data_location']
+                      for instance in instances]
+    max_sample_periods = [
+        meter_devices()[meters[instance]['device_model']]
+        ['max_sample_period'] for instance in instances]
+    with recorder.stage('aligned', building=building_i):
+        aligned = update_aligned(
+            RAW_UKPD_DATA_PATH, instances, data_locations, max_sample_periods,
+            [statuses[location] for location in data_locations],
+            [cache_entries.get(location) for location in data_locations],
+            [new_cache_entries[location] for location in data_locations],
+            OUTPUT_PATH, aligned_location(building_i),
+            (cache_entries.get(data_locations[0]) or {}).get('aligned'))
+    new_cache_entries[data_locations[0]]['aligned'] = aligned
+    building['aligned'] = {'location': aligned_location(building_i)}
+
+
+def timeframe(start, end):
+    return {'start': start.isoformat(), 'end': end.isoformat()}
+
+
+def convert_building(building_i, cache_entries=None, stages=()):
+    """Converts the metadata and data boundaries for a single building.
+
+    Only reads from the raw data directory and only writes this building's
+    sidecar files, so it is safe to run several buildings in parallel
+    worker processes.
+
+    Parameters
+    ----------
+    building_i : int
+    cache_entries : dict, optional
+        Conversion cache entries, keyed by data_location.
+    stages : sequence of str, optional
+        Names of optional passes to run over each data file.
+
+    Returns
+    -------
+    building, building_start, building_end, building_cache_entries, records
+        : dict, datetime, datetime, dict, list
+        `building_cache_entries` holds the up-to-date cache entries for
+        this building's data files.  `records` are the
+        `instrument.Recorder` records of the conversion.
+    """
+    recorder = Recorder()
+    with recorder.stage('building', building=building_i):
+        result = _convert_building(
+            building_i, cache_entries or {}, stages, recorder)
+    return result + (recorder.records,)
+
+
+def _convert_building(building_i, cache_entries, stages, recorder):
+    from .compressed import find_data_file
+
+    building_cache_entries = {}
+    statuses = {}
+    # Copies, so converting again in the same process starts afresh
+    building = deepcopy(building_metadata[building_i])
+    building['instance'] = building_i
+    original_building_name = 'house_{:d}'.format(building_i)
+    building['original_name'] = original_building_name
+    building_path = join(RAW_UKPD_DATA_PATH, original_building_name)
+
+    # --------- METERS -------------------------------
+    with recorder.stage('labels', building=building_i):
+        labels = load_labels(building_path)
+    building_start = None
+    building_end = None
+    building['elec_meters'] = {}
+    chans = sorted(labels)  # we want to process meters in order
+
+    # sound card power meter
+    scpm_data_location = 'house_{:d}/mains.dat'.format(building_i)
+    scpm_exists = isfile(
+        find_data_file(join(RAW_UKPD_DATA_PATH, scpm_data_location)))
+    scpm_instance_number = chans[-1] + 1
+
+    for chan in chans:
+        label = labels[chan]
+        meter = {
+            'data_location':
+                 'house_{:d}/channel_{:d}.dat'.format(building_i, chan)
+        }
+
+        if label == 'aggregate':
+            meter.update({"site_meter": True,
+                          'device_model': 'EcoManagerWholeHouseTx',
+                          'preprocessing_applied':
+                              {'clip': {'upper_limit': 20000}}})
+            if scpm_exists:
+                meter.update({"disabled": True,
+                              "submeter_of": scpm_instance_number})
+        else:
+            meter.update({"submeter_of": 0 if scpm_exists else 1,
+                          'device_model': 'EcoManagerTxPlug',
+                          'preprocessing_applied':
+                              {'clip': {'upper_limit': 4000}}})
+            if building_i == 1:
+                if label in ['boiler', 'solar_thermal_pump', 'lighting_circuit',
+                             'kitchen_lights']:
+                    meter.update({'device_model': 'CurrentCostTx'})
+
+                if label == 'kitchen_lights':
+                    meter.update({"submeter_of":
+                                  labels.channel('lighting_circuit')})
+
+                if label == 'toaster':
+                    meter.update({'warning': 'For the five days from Mon 24th June 2013 to Fri 28th June we had someone staying at the house who occassionally swapped the toaster and kettle around (i.e. the toaster was plugged into the kettle sensor and visa-versa!) and also appeared to plug the hoover sensor into the kettle sensor (i.e. both the hoover and kettle sensor would have recorded the same appliance for a few hours).'})
+
+        start, end, statuses[meter['data_location']] = scan_meter(
+            meter, cache_entries, building_cache_entries, stages, recorder)
+        if building_start is None or start < building_start:
+            building_start = start
+        if building_end is None or end > building_end:
+            building_end = end
+
+        building['elec_meters'][chan] = meter
+
+    # Handle buildings with sound card power meters
+    if scpm_exists:
+        meter = {
+            'device_model': 'SoundCardPowerMeter',
+            'site_meter': True,
+            'data_location': scpm_data_location
+        }
+        _, _, statuses[scpm_data_location] = scan_meter(
+            meter, cache_entries, building_cache_entries, stages, recorder)
+        building['elec_meters'][scpm_instance_number] = meter
+
+    building['timeframe'] = timeframe(building_start, building_end)
+
+    # ------------ APPLIANCES --------------------
+    appliances = deepcopy(appliances_for_each_building[building_i])
+    with recorder.stage('appliances', building=building_i):
+        add_appliance_params(appliances)
+
+        # infer meter IDs from original_name and labels.dat
+        unmetered = [appliance for appliance in appliances
+                     if not appliance.get('meters')]
+        chans = labels.channels(
+            [appliance['original_name'] for appliance in unmetered])
+        for appliance, chan in zip(unmetered, chans):
+            appliance['meters'] = [chan]
+
+    instances = {}
+    for appliance in appliances:
+        if not appliance.get('instance'):
+            appliance_type = appliance.get('type')
+            instance = instances.setdefault(appliance_type, 1)
+            appliance['instance'] = instance
+            instances[appliance_type] += 1
+
+    building['appliances'] = appliances
+    if 'activations' in stages:
+        scan_activations(building_i, building, cache_entries,
+                         building_cache_entries, statuses, recorder)
+
+    # Calibrated parameters are only proposals, so the activations above
+    # use the curated ones
+    if 'calibration' in stages:
+        with recorder.stage('calibration', building=building_i):
+            calibrate_appliances(building, building_cache_entries)
+
+    if 'energy' in stages:
+        from .energy import write_energy_table
+        meter_locations = {
+            instance: building_cache_entries[
+                meter['data_location']]['energy']['location']
+            for instance, meter in building['elec_meters'].items()}
+        with recorder.stage('energy_table', building=building_i):
+            building['energy'] = {'location': write_energy_table(
+                OUTPUT_PATH, building_i, meter_locations, appliances)}
+
+    if 'aligned' in stages:
+        scan_aligned(building_i, building, cache_entries,
+                     building_cache_entries, statuses, recorder)
+
+    if 'residual' in stages:
+        scan_residuals(building, cache_entries, building_cache_entries,
+                       statuses, recorder)
+
+    return building, building_start, building_end, building_cache_entries
+
+
+def _profiled(func, profile_path, building_i):
+    """Calls `func(building_i)` under cProfile, writing the profile to
+    building<building_i>.prof in `profile_path`."""
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, building_i)
+    finally:
+        profiler.dump_stats(
+            join(profile_path, 'building{:d}.prof'.format(building_i)))
+
+
+def convert_buildings(building_ids, processes=1, cache_entries=None,
+                      stages=(), profile_path=None):
+    """Runs `convert_building` for each building ID.
+
+    Parameters
+    ----------
+    building_ids : list of ints
+    processes : int, optional
+        Number of worker processes.  If 1 then buildings are converted
+        one after another in this process.
+    cache_entries : dict, optional
+        Conversion cache entries, keyed by data_location.
+    stages : sequence of str, optional
+        Names of optional passes to run over each data file.
+    profile_path : str, optional
+        If given, each building is converted under cProfile and its
+        profile is written to this directory.
+
+    Returns
+    -------
+    list of the tuples returned by `convert_building`, in the same order
+    as `building_ids`.
+    """
+    convert = partial(convert_building, cache_entries=cache_entries,
+                      stages=stages)
+    if profile_path is not None:
+        convert = partial(_profiled, convert, profile_path)
+    if processes == 1:
+        return [convert(building_i) for building_i in building_ids]
+
+    from multiprocessing import Pool
+    # Workers need the paths even if they do not inherit this module's state
+    pool = Pool(processes, initializer=set_paths,
+                initargs=(RAW_UKPD_DATA_PATH, OUTPUT_PATH))
+    try:
+        results = pool.map(convert, building_ids, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+def write_calibrated_params(buildings, cache_entries):
+    """Merges the power sketches of the appliances of each type across
+    `buildings` and writes the proposed APPLIANCE_PARAMS to
+    CALIBRATED_PARAMS_FILENAME in OUTPUT_PATH."""
+    from .calibrate import appliance_params_csv, dedicated_meters
+
+    sketches = {}
+    for building in buildings.values():
+        for appliance, instance in dedicated_meters(building):
+            data_location = building['elec_meters'][instance]['data_location']
+            sketches.setdefault(appliance['type'], []).append(
+                cache_entries[data_location]['power_sketch'])
+    with open(join(OUTPUT_PATH, CALIBRATED_PARAMS_FILENAME), 'w') as fh:
+        fh.write(appliance_params_csv(sketches))
+
+
+def main(argv=None):
+    from multiprocessing import cpu_count
+    from .cache import cache_filename, load_cache, save_cache
+    from .output import write_yaml
+    from .snapshot import read_snapshot, write_snapshot
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--data-path',
+        help='directory holding the raw house_N directories'
+        ' (default: {})'.format(RAW_UKPD_DATA_PATH))
+    parser.add_argument(
+        '--output-path',
+        help='directory to write the metadata to (default: {})'
+        .format(OUTPUT_PATH))
+    parser.add_argument(
+        '-j', '--processes', type=int, default=1,
+        help='number of buildings to convert in parallel (0 = one per CPU)')
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='ignore and do not update the conversion cache in OUTPUT_PATH')
+    parser.add_argument(
+        '--samples', dest='stages', action='append_const', const='samples',
+        help='count the samples in every data file and add n_samples,'
+        ' n_bytes (compressed, if the file is) and n_uncompressed_bytes to'
+        ' every meter')
+    parser.add_argument(
+        '--stats', dest='stages', action='append_const', const='statistics',
+        help='stream through every data file to add per-meter statistics')
+    parser.add_argument(
+        '--good-sections', dest='stages', action='append_const',
+        const='good_sections',
+        help='find the good sections of every meter and write them to'
+        ' good_sections/ in OUTPUT_PATH')
+    parser.add_argument(
+        '--index', dest='stages', action='append_const', const='index',
+        help='write a sparse timestamp to byte offset index of every data'
+        ' file to index/ in OUTPUT_PATH')
+    parser.add_argument(
+        '--activations', dest='stages', action='append_const',
+        const='activations',
+        help='extract the activations of appliances with APPLIANCE_PARAMS'
+        ' and write them to activations/ in OUTPUT_PATH')
+    parser.add_argument(
+        '--calibrate', dest='stages', action='append_const',
+        const='calibration',
+        help='propose on_power_threshold, max_power and an on power'
+        ' distribution for each appliance with a meter of its own from its'
+        ' data, as calibrated_* fields, and write proposed APPLIANCE_PARAMS'
+        ' to {} in OUTPUT_PATH'.format(CALIBRATED_PARAMS_FILENAME))
+    parser.add_argument(
+        '--pyramid', dest='stages', action='append_const', const='pyramid',
+        help='write 1 minute, 15 minute, 1 hour and 1 day aggregates of every'
+        ' meter to pyramid/ in OUTPUT_PATH')
+    parser.add_argument(
+        '--energy', dest='stages', action='append_const', const='energy',
+        help='total the energy of every meter for each local day and month'
+        ' and write a table for each building to energy/ in OUTPUT_PATH')
+    parser.add_argument(
+        '--aligned', dest='stages', action='append_const', const='aligned',
+        help='align all of the meters of each building onto a common 6'
+        ' second grid and write the table to aligned/ in OUTPUT_PATH')
+    parser.add_argument(
+        '--residual', dest='stages', action='append_const', const='residual',
+        help='compute the unmetered residual (parent minus the sum of its'
+        ' submeters) of every meter with submeters and write it to'
+        ' residual/ in OUTPUT_PATH')
+    parser.add_argument(
+        '--columnar', dest='stages', action='append_const', const='columnar',
+        help='export every data file to a chunked, compressed columnar store'
+        ' in columnar/ in OUTPUT_PATH')
+    parser.add_argument(
+        '--manifest', action='store_true',
+        help='write the size and SHA-256 hash of every raw file read to'
+        ' manifest.json in OUTPUT_PATH')
+    parser.add_argument(
+        '--hash-threads', type=int,
+        help='number of threads hashing files for --manifest')
+    parser.add_argument(
+        '--profile', metavar='DIR',
+        help='run cProfile and write a profile of each building and of the'
+        ' rest of the run (main.prof) to DIR, for use with pstats')
+    args = parser.parse_args(argv)
+    stages = tuple(args.stages or ())
+    set_paths(args.data_path, args.output_path)
+    if not isdir(OUTPUT_PATH):
+        makedirs(OUTPUT_PATH)
+
+    if args.profile is not None and not isdir(args.profile):
+        makedirs(args.profile)
+    started = time.time()
+    recorder = Recorder()
+
+    cache_entries = {}
+    if not args.no_cache:
+        with recorder.stage('load_cache'):
+            cache_entries = load_cache(cache_filename(OUTPUT_PATH))
+
+    building_ids = range(1, N_BULDINGS+1)
+    processes = min(args.processes or cpu_count(), len(building_ids))
+    with recorder.stage('buildings'):
+        results = convert_buildings(building_ids, processes, cache_entries,
+                                    stages, args.profile)
+
+    if args.profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # Merge: fold the per-building timeframes into the dataset timeframe
+    dataset_start = None
+    dataset_end = None
+    buildings = {}
+    # Only keep entries for files seen in this run
+    new_cache_entries = {}
+    records = []
+    for building_i, (building, building_start, building_end,
+                     building_cache_entries, building_records) in zip(
+                         building_ids, results):
+        if dataset_start is None or building_start < dataset_start:
+            dataset_start = building_start
+        if dataset_end is None or building_end > dataset_end:
+            dataset_end = building_end
+        buildings[building_i] = building
+        new_cache_entries.update(building_cache_entries)
+        records.extend(building_records)
+
+    if not args.no_cache:
+        with recorder.stage('save_cache'):
+            save_cache(cache_filename(OUTPUT_PATH), new_cache_entries)
+
+    if 'calibration' in stages:
+        with recorder.stage('calibration'):
+            write_calibrated_params(buildings, new_cache_entries)
+
+    if args.manifest:
+        from .compressed import find_data_file
+        from .manifest import HASH_THREADS, write_manifest
+        data_locations = []
+        for building in buildings.values():
+            data_locations.append(building['original_name'] + '/labels.dat')
+            for meter in building['elec_meters'].values():
+                # The file as stored, which may be compressed
+                filename = join(RAW_UKPD_DATA_PATH, meter['data_location'])
+                data_locations.append(meter['data_location'] +
+                                      find_data_file(filename)[len(filename):])
+        with recorder.stage('manifest'):
+            write_manifest(RAW_UKPD_DATA_PATH, sorted(data_locations),
+                           OUTPUT_PATH, args.hash_threads or HASH_THREADS)
+
+    dataset_metadata = deepcopy(dataset)
+    dataset_metadata['timeframe'] = timeframe(dataset_start, dataset_end)
+    dataset_metadata['date'] = dataset_end.date().isoformat()
+
+    with recorder.stage('yaml', filename='dataset.yaml'):
+        write_yaml(join(OUTPUT_PATH, 'dataset.yaml'), dataset_metadata)
+
+    for building_i, building in buildings.items():
+        filename = 'building{:d}.yaml'.format(building_i)
+        with recorder.stage('yaml', building=building_i, filename=filename):
+            write_yaml(join(OUTPUT_PATH, filename), building)
+
+    with recorder.stage('snapshot'):
+        if read_snapshot(OUTPUT_PATH) is None:
+            write_snapshot(OUTPUT_PATH)
+
+    if args.profile is not None:
+        profiler.disable()
+        profiler.dump_stats(join(args.profile, 'main.prof'))
+
+    write_report(
+        join(OUTPUT_PATH, REPORT_FILENAME), records + recorder.records,
+        started=datetime.fromtimestamp(started, tz=TZ).isoformat(),
+        wall=time.time() - started, data_path=RAW_UKPD_DATA_PATH,
+        processes=processes, stages=list(stages),
+        python=platform.python_version())
+
+    print("done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Daily and monthly energy totals of each meter.
+
+As for the pyramids, each sample is taken to last until the next sample
+but for no more than the meter's `max_sample_period`, and its energy is
+attributed to the local (Europe/London) day in which it starts.  So gaps
+in the data contribute no energy, and each day also records its
+coverage: the number of seconds of that day which are covered by data.
+
+Each meter's daily totals are kept in a sidecar with the columns:
+
+* day : local day number, as from `localtime.local_days` (int64)
+* energy : joules (float64)
+* duration : seconds covered by data (float64)
+
+and once all of a building's meters have been scanned they are gathered
+into one table per building, energy/buildingN.npz, holding:
+
+* meters : meter instance numbers (int64, n_meters)
+* days : local day numbers with data for any meter (int64, n_days)
+* daily_kwh, daily_coverage : (n_meters, n_days) float64 kWh and
+  seconds
+* months : months since 1970-01 (int64, n_months)
+* monthly_kwh, monthly_coverage : (n_meters, n_months)
+* appliance_types, appliance_instances : one per appliance
+* appliance_meter_offsets, appliance_meters : the rows (into `meters`)
+  of appliance i's meters are
+  appliance_meters[appliance_meter_offsets[i]:appliance_meter_offsets[i+1]]
+
+Several appliances may share a meter, so an appliance's energy is that
+of all of its meters (see `appliance_kwh`).
+"""
+from __future__ import print_function, division
+import posixpath
+import numpy as np
+
+from .cache import UNCHANGED, APPENDED
+from .localtime import local_days
+from .metadata import TIMEZONE
+from .reader import iter_chunks
+from .sidecars import load_arrays, save_arrays, sidecar_location
+
+JOULES_PER_KWH = 3600000.0
+
+
+def _sum_by(keys, *columns):
+    """Sums each of `columns` over runs of equal (sorted) `keys`."""
+    if not keys.size:
+        return (keys,) + columns
+    starts = np.flatnonzero(np.concatenate([[True], np.diff(keys) != 0]))
+    return (keys[starts],) + tuple(
+        np.add.reduceat(column, starts) for column in columns)
+
+
+class DailyEnergy(object):
+    """Accumulates energy per local day from a stream of (timestamps,
+    power) chunks.  Call `update` for each chunk then `finish`.
+
+    Parameters
+    ----------
+    max_sample_period : number
+    days : dict of arrays, optional
+        Previously accumulated days to extend.  Streaming must then
+        restart from the last sample which went into them.
+    """
+
+    def __init__(self, max_sample_period, days=None):
+        self.max_sample_period = max_sample_period
+        self._last_sample = None
+        self._days = []
+        if days is not None:
+            self._days.append(
+                (days['day'], days['energy'], days['duration']))
+
+    def update(self, timestamps, power):
+        if self._last_sample is not None:
+            timestamps = np.concatenate([[self._last_sample[0]], timestamps])
+            power = np.concatenate([[self._last_sample[1]], power])
+        if timestamps.size < 2:
+            if timestamps.size:
+                self._last_sample = (timestamps[-1], power[-1])
+            return
+        self._last_sample = (timestamps[-1], power[-1])
+        durations = np.minimum(np.diff(timestamps), self.max_sample_period)
+        # Local days never go backwards, even when the clocks do
+        self._days.append(_sum_by(
+            local_days(timestamps[:-1]), power[:-1] * durations, durations))
+
+    def finish(self):
+        """Returns a dict of the 'day', 'energy' and 'duration' columns.
+
+        The last sample's duration is unknown, so it adds nothing.
+        """
+        if self._days:
+            day, energy, duration = [
+                np.concatenate(column) for column in zip(*self._days)]
+        else:
+            day, energy, duration = [np.empty(0)] * 3
+        day, energy, duration = _sum_by(
+            day.astype(np.int64), energy.astype(np.float64),
+            duration.astype(np.float64))
+        return {'day': day, 'energy': energy, 'duration': duration}
+
+
+def update_daily_energy(filename, status, old_entry, max_sample_period,
+                        output_path, data_location):
+    """Finds the daily energy of a data file and writes it to a sidecar.
+
+    Cached work is reused: nothing is read if the file is unchanged and
+    only the new lines are read if the file has been appended to.
+
+    Returns
+    -------
+    energy : dict
+        With keys 'location' (of the sidecar, relative to `output_path`),
+        'max_sample_period' and 'timezone'.  Suitable for the cache.
+    """
+    location = sidecar_location('energy', data_location, '.npz')
+    result = {'location': location, 'max_sample_period': max_sample_period,
+              'timezone': TIMEZONE}
+    cached = (old_entry or {}).get('energy')
+    days = None
+    if (cached is not None and
+            cached['max_sample_period'] == max_sample_period and
+            cached['timezone'] == TIMEZONE):
+        days = load_arrays(output_path, location)
+        if days is not None and status == UNCHANGED:
+            return result
+        elif status != APPENDED:
+            days = None
+
+    accumulator = DailyEnergy(max_sample_period, days)
+    if days is None:
+        chunks = iter_chunks(filename)
+    else:
+        # Restart from the previous last line, whose duration was unknown
+        # (so it added no energy) last time
+        chunks = iter_chunks(filename, offset=old_entry['last_line_offset'])
+    for timestamps, values in chunks:
+        accumulator.update(timestamps, values[:, 0])
+    save_arrays(output_path, location, **accumulator.finish())
+    return result
+
+
+def energy_table_location(building_i):
+    return posixpath.join('energy', 'building{:d}.npz'.format(building_i))
+
+
+def _months(days):
+    """Returns months since 1970-01 (int64) of local day numbers."""
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(
+        np.int64)
+
+
+def write_energy_table(output_path, building_i, meter_locations,
+                       appliances):
+    """Gathers the daily energy sidecars of a building's meters into its
+    energy table.
+
+    Parameters
+    ----------
+    output_path : str
+    building_i : int
+    meter_locations : dict
+        Maps meter instance number to the location of its daily energy
+        sidecar.
+    appliances : list of dicts
+        The building's appliances, each with 'type', 'instance' and
+        'meters'.
+
+    Returns
+    -------
+    location : str
+        Of the table, relative to `output_path`.
+    """
+    meters = sorted(meter_locations)
+    meter_days = [load_arrays(output_path, meter_locations[meter])
+                  for meter in meters]
+    days = np.unique(np.concatenate(
+        [np.empty(0, dtype=np.int64)] +
+        [meter_day['day'] for meter_day in meter_days]))
+    daily_kwh = np.zeros((len(meters), len(days)))
+    daily_coverage = np.zeros((len(meters), len(days)))
+    for row, meter_day in enumerate(meter_days):
+        columns = np.searchsorted(days, meter_day['day'])
+        daily_kwh[row, columns] = meter_day['energy'] / JOULES_PER_KWH
+        daily_coverage[row, columns] = meter_day['duration']
+
+    months, month_starts = np.unique(_months(days), return_index=True)
+    if days.size:
+        monthly_kwh = np.add.reduceat(daily_kwh, month_starts, axis=1)
+        monthly_coverage = np.add.reduceat(
+            daily_coverage, month_starts, axis=1)
+    else:
+        monthly_kwh = monthly_coverage = np.zeros((len(meters), 0))
+
+    rows = {meter: row for row, meter in enumerate(meters)}
+    appliance_meters = [[rows[meter] for meter in appliance['meters']
+                         if meter in rows] for appliance in appliances]
+    location = energy_table_location(building_i)
+    save_arrays(
+        output_path, location,
+        meters=np.array(meters, dtype=np.int64),
+        days=days, daily_kwh=daily_kwh, daily_coverage=daily_coverage,
+        months=months, monthly_kwh=monthly_kwh,
+        monthly_coverage=monthly_coverage,
+        appliance_types=np.array(
+            [appliance['type'] for appliance in appliances]),
+        appliance_instances=np.array(
+            [appliance['instance'] for appliance in appliances],
+            dtype=np.int64),
+        appliance_meter_offsets=np.cumsum(
+            [0] + [len(meter_rows) for meter_rows in appliance_meters]
+        ).astype(np.int64),
+        appliance_meters=np.array(
+            sum(appliance_meters, []), dtype=np.int64))
+    return location
+
+
+def appliance_kwh(table, appliance_type, instance=1, period='daily'):
+    """Returns the energy, in kWh, of an appliance for each day (or month)
+    of an energy table loaded with `sidecars.load_arrays`.
+
+    The energy of an appliance which shares a meter with other appliances
+    includes theirs.
+    """
+    matches = np.flatnonzero(
+        (table['appliance_types'] == appliance_type) &
+        (table['appliance_instances'] == instance))
+    if not matches.size:
+        raise KeyError('no {} {:d} in energy table'.format(
+            appliance_type, instance))
+    i = matches[0]
+    offsets = table['appliance_meter_offsets']
+    rows = table['appliance_meters'][offsets[i]:offsets[i+1]]
+    return table[period + '_kwh'][rows].sum(axis=0)
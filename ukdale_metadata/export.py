@@ -0,0 +1,237 @@
+"""Exporting data files to a chunked, compressed, columnar store.
+
+Each data file is exported to a directory (e.g. `columnar/house_1/channel_1`
+in OUTPUT_PATH) holding:
+
+* `chunk_NNNNNN.npz` files, each with up to EXPORT_CHUNK_ROWS rows stored
+  column by column: 'timestamp' (int64) and one float32 array per value
+  column;
+* `chunks.npy`, an array of CHUNK_INDEX_DTYPE with each chunk's first and
+  last timestamps and number of rows, which is written last.
+
+Timestamps are in TIMESTAMP_UNIT since the UNIX epoch (microseconds, as
+some files have fractional timestamps), which is also recorded as
+'timestamp_unit' in the meter's `columnar` metadata.
+
+Export streams through the data file so memory use is bounded by the chunk
+size, not the file size.  `iter_columnar` reads a store back, skipping
+chunks outside the requested time range.
+"""
+from __future__ import print_function, division
+import posixpath
+import re
+from os import listdir, remove
+from os.path import isdir, join
+import numpy as np
+
+from .cache import UNCHANGED, APPENDED
+from .reader import iter_chunks
+from .sidecars import load_array, load_arrays, save_array, save_arrays
+
+EXPORT_CHUNK_ROWS = 1000000
+
+# Unit of the exported timestamps, as for np.datetime64
+TIMESTAMP_UNIT = 'us'
+_UNITS_PER_SECOND = 1000000
+
+CHUNK_INDEX_DTYPE = np.dtype([('start', np.int64), ('end', np.int64),
+                              ('n_rows', np.int64)])
+
+_CHUNK_FILENAME = re.compile(r'chunk_(\d+)\.npz$')
+
+
+def columnar_location(data_location):
+    return posixpath.join('columnar', posixpath.splitext(data_location)[0])
+
+
+def _chunk_location(location, i):
+    return posixpath.join(location, 'chunk_{:06d}.npz'.format(i))
+
+
+def _index_location(location):
+    return posixpath.join(location, 'chunks.npy')
+
+
+def to_timestamp_units(timestamps):
+    """Converts UNIX timestamps in seconds to int64 TIMESTAMP_UNITs."""
+    return np.round(np.asarray(timestamps, dtype=np.float64) *
+                    _UNITS_PER_SECOND).astype(np.int64)
+
+
+class _ChunkWriter(object):
+    """Re-chunks a stream of rows into files of EXPORT_CHUNK_ROWS rows."""
+
+    def __init__(self, output_path, location, columns, chunk_rows,
+                 index=None, carry=None):
+        self.output_path = output_path
+        self.location = location
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.index = [] if index is None else list(index)
+        self._pending = [] if carry is None else [carry]
+        self._n_pending = 0 if carry is None else len(carry['timestamp'])
+
+    def add(self, timestamps, values):
+        if not timestamps.size:
+            return
+        if values.shape[1] != len(self.columns):
+            raise ValueError('Expected {:d} value columns in {}'.format(
+                len(self.columns), self.location))
+        rows = {'timestamp': to_timestamp_units(timestamps)}
+        for i, column in enumerate(self.columns):
+            rows[column] = values[:, i].astype(np.float32)
+        self._pending.append(rows)
+        self._n_pending += timestamps.size
+        while self._n_pending >= self.chunk_rows:
+            self._write(self.chunk_rows)
+
+    def finish(self):
+        """Writes any remaining rows and the chunk index.
+
+        Returns
+        -------
+        n_rows : int
+        """
+        if self._n_pending:
+            self._write(self._n_pending)
+        index = np.array(self.index, dtype=CHUNK_INDEX_DTYPE)
+        save_array(self.output_path, _index_location(self.location), index)
+        self._remove_stale_chunks(len(index))
+        return int(index['n_rows'].sum())
+
+    def _write(self, n_rows):
+        pending = {name: np.concatenate([rows[name] for rows in self._pending])
+                   for name in self._pending[0]}
+        chunk = {name: column[:n_rows] for name, column in pending.items()}
+        rest = {name: column[n_rows:] for name, column in pending.items()}
+        save_arrays(self.output_path,
+                    _chunk_location(self.location, len(self.index)), **chunk)
+        self.index.append((chunk['timestamp'][0], chunk['timestamp'][-1],
+                           n_rows))
+        self._pending = [rest] if len(rest['timestamp']) else []
+        self._n_pending = len(rest['timestamp'])
+
+    def _remove_stale_chunks(self, n_chunks):
+        directory = join(self.output_path, self.location)
+        for filename in listdir(directory):
+            match = _CHUNK_FILENAME.match(filename)
+            if match and int(match.group(1)) >= n_chunks:
+                remove(join(directory, filename))
+
+
+def export_columnar(filename, output_path, location, columns,
+                    chunk_rows=EXPORT_CHUNK_ROWS, resume_from=None):
+    """Exports a data file to a columnar store.
+
+    Parameters
+    ----------
+    filename : str
+    output_path : str
+    location : str
+        Directory of the store, relative to `output_path`.
+    columns : list of str
+        Names for the value columns of the data file.
+    chunk_rows : int, optional
+    resume_from : int, optional
+        Byte offset of the last line already exported to the store at
+        `location`.  If given then only the lines after it are exported
+        and the store's last chunk is extended.
+
+    Returns
+    -------
+    n_rows : int
+    """
+    index = None
+    carry = None
+    offset = 0
+    skip = 0
+    if resume_from is not None:
+        index = load_array(output_path, _index_location(location))
+        if index is not None and len(index):
+            carry = load_arrays(output_path,
+                                _chunk_location(location, len(index) - 1))
+        if carry is None:
+            index = None
+        else:
+            index = index[:-1]
+            offset = resume_from
+            skip = 1
+
+    writer = _ChunkWriter(output_path, location, columns, chunk_rows,
+                          index, carry)
+    for timestamps, values in iter_chunks(filename, offset=offset):
+        writer.add(timestamps[skip:], values[skip:])
+        skip = 0
+    return writer.finish()
+
+
+def update_columnar(filename, status, old_entry, output_path, data_location,
+                    columns):
+    """Exports a data file to a columnar store, reusing cached work.
+
+    Nothing is read if the file is unchanged and only the new lines are
+    read if the file has been appended to.
+
+    Returns
+    -------
+    columnar : dict
+        With keys 'location' (relative to `output_path`), 'columns',
+        'timestamp_unit' and 'n_rows'.  Suitable for the cache.
+    """
+    location = columnar_location(data_location)
+    cached = (old_entry or {}).get('columnar')
+    resume_from = None
+    index = load_array(output_path, _index_location(location))
+    # Stores with timestamps in another unit or type are exported again
+    if (cached is not None and list(cached['columns']) == list(columns) and
+            cached.get('timestamp_unit') == TIMESTAMP_UNIT and
+            index is not None and index.dtype == CHUNK_INDEX_DTYPE):
+        if status == UNCHANGED:
+            return dict(cached, location=location)
+        elif status == APPENDED:
+            resume_from = old_entry['last_line_offset']
+
+    n_rows = export_columnar(filename, output_path, location, columns,
+                             resume_from=resume_from)
+    return {'location': location, 'columns': list(columns),
+            'timestamp_unit': TIMESTAMP_UNIT, 'n_rows': n_rows}
+
+
+def iter_columnar(output_path, location, start=None, end=None):
+    """Reads a columnar store back chunk by chunk.
+
+    Parameters
+    ----------
+    output_path : str
+    location : str
+        Directory of the store, relative to `output_path`.
+    start, end : number, optional
+        UNIX timestamps in seconds.  Only yield rows with
+        start <= timestamp < end.
+
+    Yields
+    ------
+    chunk : dict
+        Maps column names (including 'timestamp', in TIMESTAMP_UNITs) to
+        arrays.
+    """
+    if start is not None:
+        start = to_timestamp_units(start)
+    if end is not None:
+        end = to_timestamp_units(end)
+    if not isdir(join(output_path, location)):
+        raise IOError('No columnar store at ' + join(output_path, location))
+    index = load_array(output_path, _index_location(location))
+    for i, (chunk_start, chunk_end, _) in enumerate(index):
+        if ((start is not None and chunk_end < start) or
+                (end is not None and chunk_start >= end)):
+            continue
+        chunk = load_arrays(output_path, _chunk_location(location, i))
+        mask = np.ones(len(chunk['timestamp']), dtype=bool)
+        if start is not None:
+            mask &= chunk['timestamp'] >= start
+        if end is not None:
+            mask &= chunk['timestamp'] < end
+        if not mask.all():
+            chunk = {name: column[mask] for name, column in chunk.items()}
+        yield chunk
@@ -0,0 +1,117 @@
+"""Finding the good sections of each meter's data.
+
+A good section is a span of time in which every pair of consecutive
+samples is no more than the meter device's `max_sample_period` apart
+(see meter_devices.yaml).  UK-DALE's wireless transmitters drop out
+regularly, so a meter's single `timeframe` hides many gaps.
+
+Good sections are stored as an (n_sections, 2) float64 array of
+[start, end] UNIX timestamps in a sidecar .npy file.
+"""
+from __future__ import print_function, division
+import numpy as np
+
+from .cache import UNCHANGED, APPENDED
+from .reader import iter_chunks
+from .sidecars import load_array, save_array, sidecar_location
+
+
+def find_good_sections(chunks, max_sample_period, sections=None):
+    """Finds good sections in a stream of timestamps.
+
+    Parameters
+    ----------
+    chunks : iterable of 1D np.ndarrays
+        Sorted timestamps, in chunks.
+    max_sample_period : number
+        Gaps longer than this (in seconds) end a good section.
+    sections : np.ndarray, optional
+        Good sections found in earlier data.  The last of these is
+        continued if the first new timestamp is close enough to its end.
+
+    Returns
+    -------
+    sections : np.ndarray, shape (n_sections, 2)
+    """
+    prior_sections = np.empty((0, 2))
+    section_start = last_timestamp = None
+    if sections is not None and len(sections):
+        prior_sections = sections[:-1]
+        section_start, last_timestamp = sections[-1]
+
+    new_starts = []
+    new_ends = []
+    for timestamps in chunks:
+        if not timestamps.size:
+            continue
+        if last_timestamp is None:
+            section_start = timestamps[0]
+            previous = np.concatenate([timestamps[:1], timestamps[:-1]])
+        else:
+            previous = np.concatenate([[last_timestamp], timestamps[:-1]])
+        breaks = np.flatnonzero(timestamps - previous > max_sample_period)
+        new_starts.append(timestamps[breaks])
+        new_ends.append(previous[breaks])
+        last_timestamp = timestamps[-1]
+
+    if section_start is None:
+        return prior_sections
+    starts = np.concatenate([[section_start]] + new_starts)
+    ends = np.concatenate(new_ends + [[last_timestamp]])
+    return np.concatenate([prior_sections, np.column_stack([starts, ends])])
+
+
+def _timestamp_chunks(filename, offset=0, skip=0):
+    for timestamps, _ in iter_chunks(filename, offset=offset):
+        yield timestamps[skip:]
+        skip = 0
+
+
+def update_good_sections(filename, status, old_entry, max_sample_period,
+                         output_path, data_location):
+    """Finds the good sections of a data file and writes them to a sidecar.
+
+    Cached work is reused: nothing is read if the file is unchanged and
+    only the new lines are read if the file has been appended to.
+
+    Parameters
+    ----------
+    filename : str
+    status : str
+        How the file changed since `old_entry`, as reported by
+        `cache.scan_boundaries`.
+    old_entry : dict or None
+        The previous cache entry for `filename`.
+    max_sample_period : number
+    output_path : str
+    data_location : str
+
+    Returns
+    -------
+    good_sections : dict
+        With keys 'location' (of the sidecar, relative to `output_path`),
+        'n_sections' and 'max_sample_period'.  Suitable for the cache.
+    """
+    location = sidecar_location('good_sections', data_location, '.npy')
+    cached = (old_entry or {}).get('good_sections')
+    sections = None
+    if (cached is not None and cached['location'] == location and
+            cached['max_sample_period'] == max_sample_period):
+        sections = load_array(output_path, location)
+
+    if sections is not None and status == UNCHANGED:
+        # Use the str `location` rather than the cached (possibly unicode)
+        # copy, which would be tagged as such in the YAML
+        return dict(cached, location=location)
+    elif sections is not None and status == APPENDED:
+        chunks = _timestamp_chunks(
+            filename, offset=old_entry['last_line_offset'], skip=1)
+    else:
+        sections = None
+        chunks = _timestamp_chunks(filename)
+
+    sections = find_good_sections(chunks, max_sample_period, sections)
+    save_array(output_path, location, sections)
+    return {'location': location,
+            'n_sections': len(sections),
+            'max_sample_period': max_sample_period}
@@ -0,0 +1,139 @@
+"""Sparse timestamp -> byte offset indexes for random access to data files.
+
+An index holds the timestamp and byte offset of the first line starting at
+or after every INDEX_SPACING bytes of a data file.  Building one only needs
+a seek and a couple of short reads per entry, not a scan of the whole file.
+Given an index, `read_range` finds the bytes which hold a time range with a
+binary search and parses only those.
+
+The index of a compressed data file has an entry for each entry of its
+block index (see `compressed`), the places from which it can be read
+without decompressing everything before.
+
+Data files must be sorted by timestamp, as all UK-DALE files are.
+"""
+from __future__ import print_function, division
+from os import SEEK_END
+from os.path import isfile, join
+import numpy as np
+
+from .cache import UNCHANGED
+from .compressed import block_index, compressed_suffix, find_data_file
+from .reader import boundary_lines, iter_chunks, line_timestamp
+from .sidecars import load_array, save_array, sidecar_location
+
+# Approximate number of bytes of data file between index entries.
+INDEX_SPACING = 1024 * 1024
+
+INDEX_DTYPE = np.dtype([('timestamp', np.float64), ('offset', np.int64)])
+
+
+def build_index(filename, spacing=INDEX_SPACING):
+    """Builds a sparse index of `filename`.
+
+    Returns
+    -------
+    index : np.ndarray of INDEX_DTYPE
+        Sorted by offset (and so by timestamp).  The first entry is for
+        the first line of the file.
+    """
+    filename = find_data_file(filename)
+    if compressed_suffix(filename):
+        blocks = block_index(filename)
+        index = np.empty(len(blocks['timestamp']), dtype=INDEX_DTYPE)
+        index['timestamp'] = blocks['timestamp']
+        index['offset'] = blocks['line_offset']
+        return index
+    entries = []
+    with open(filename, 'rb') as fh:
+        fh.seek(0, SEEK_END)
+        size = fh.tell()
+        position = 0
+        while position < size:
+            if position:
+                # Skip to the start of the next line
+                fh.seek(position - 1)
+                fh.readline()
+            else:
+                fh.seek(0)
+            offset = fh.tell()
+            line = fh.readline()
+            if not line.strip():
+                break
+            if not entries or offset > entries[-1][1]:
+                entries.append((line_timestamp(line), offset))
+            position = max(position + spacing, fh.tell())
+    return np.array(entries, dtype=INDEX_DTYPE)
+
+
+def index_location(data_location):
+    return sidecar_location('index', data_location, '.npy')
+
+
+def update_index(filename, status, old_entry, output_path, data_location,
+                 spacing=INDEX_SPACING):
+    """Builds the index for a data file and writes it to a sidecar, unless
+    the file and the cached index are unchanged.
+
+    Returns
+    -------
+    index : dict
+        With keys 'location' (of the sidecar, relative to `output_path`),
+        'n_entries' and 'spacing'.  Suitable for the cache.
+    """
+    location = index_location(data_location)
+    cached = (old_entry or {}).get('index')
+    if (status == UNCHANGED and cached is not None and
+            cached['spacing'] == spacing and
+            isfile(join(output_path, location))):
+        return dict(cached, location=location)
+
+    index = build_index(filename, spacing)
+    save_array(output_path, location, index)
+    return {'location': location, 'n_entries': len(index), 'spacing': spacing}
+
+
+def read_range(data_location, start, end, data_path, index_path=None):
+    """Reads the samples with start <= timestamp < end from a data file.
+
+    Parameters
+    ----------
+    data_location : str
+        e.g. 'house_1/channel_1.dat'
+    start, end : number
+        UNIX timestamps.
+    data_path : str
+        Directory holding the raw UK-DALE data (house_N directories).
+    index_path : str, optional
+        Directory holding the index sidecars (the converter's OUTPUT_PATH).
+        If the index is not there then it is built in memory.
+
+    Returns
+    -------
+    timestamps, values : np.ndarray
+        As for `reader.iter_chunks`.
+    """
+    filename = join(data_path, data_location)
+    index = None
+    if index_path is not None:
+        index = load_array(index_path, index_location(data_location))
+    if index is None:
+        index = build_index(filename)
+
+    # The last entry before `start` and the first entry at or after `end`
+    # bound the bytes which can hold the range
+    first = max(np.searchsorted(index['timestamp'], start, side='left') - 1, 0)
+    last = np.searchsorted(index['timestamp'], end, side='left')
+    stop = int(index['offset'][last]) if last < len(index) else None
+
+    timestamps = []
+    values = []
+    for chunk_timestamps, chunk_values in iter_chunks(
+            filename, offset=int(index['offset'][first]), stop=stop):
+        in_range = (chunk_timestamps >= start) & (chunk_timestamps < end)
+        timestamps.append(chunk_timestamps[in_range])
+        values.append(chunk_values[in_range])
+    if not timestamps:
+        first_line, _ = boundary_lines(filename)
+        return np.empty(0), np.empty((0, len(first_line.split()) - 1))
+    return np.concatenate(timestamps), np.concatenate(values)
@@ -0,0 +1,134 @@
+"""Records what each part of a conversion costs.
+
+Code to be measured runs inside `Recorder.stage`, which notes the wall
+time, CPU time, bytes read and peak resident set size of the process at
+either end of the stage.  The kernel only keeps the process's lifetime
+peak, so a stage's own memory use shows up as how much it raised that
+peak ('peak_rss_growth'), which is zero for a stage which stayed below
+the peak of an earlier one.  The records are plain dicts, so they can be
+sent back from worker processes and written out with `write_report`.
+
+Bytes read are counted by the kernel (`rchar` in /proc/self/io), so they
+include reads made by numpy but not pages touched through a memory map,
+and are None on platforms without /proc.
+"""
+from __future__ import print_function, division
+import json
+import sys
+import time
+from contextlib import contextmanager
+from os import rename, times
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _bytes_read():
+    try:
+        with open('/proc/self/io', 'rb') as fh:
+            for line in fh:
+                if line.startswith(b'rchar:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def _peak_rss():
+    """Returns the peak resident set size of this process so far, in
+    bytes, or None if it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _cpu_time():
+    user, system = times()[:2]
+    return user + system
+
+
+class Recorder(object):
+    """Collects one record per measured stage, in the order in which the
+    stages finished (so nested stages come before the stage around them).
+
+    Attributes
+    ----------
+    records : list of dicts
+        Each with the stage name, any labels passed to `stage`, and
+        'wall' and 'cpu' (seconds), 'bytes_read', 'peak_rss_growth' and
+        'process_peak_rss_so_far' (bytes).
+    """
+    def __init__(self):
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """Measures the code run inside the `with` block.
+
+        Parameters
+        ----------
+        name : str
+            e.g. 'boundaries'.
+        **labels
+            Saying what was being worked on, e.g. building=1,
+            data_location='house_1/channel_1.dat'.
+        """
+        record = {'stage': name}
+        record.update(labels)
+        bytes_read = _bytes_read()
+        peak_rss = _peak_rss()
+        cpu = _cpu_time()
+        wall = time.time()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.time() - wall
+            record['cpu'] = _cpu_time() - cpu
+            if bytes_read is not None:
+                bytes_read = _bytes_read() - bytes_read
+            record['bytes_read'] = bytes_read
+            record['process_peak_rss_so_far'] = _peak_rss()
+            if peak_rss is not None:
+                peak_rss = record['process_peak_rss_so_far'] - peak_rss
+            record['peak_rss_growth'] = peak_rss
+            self.records.append(record)
+
+
+def summarise(records, key):
+    """Returns dict mapping each value of `key` found in `records` to the
+    number of records and their total wall time, CPU time and bytes read.
+    Records without `key` are ignored."""
+    totals = {}
+    for record in records:
+        if key not in record:
+            continue
+        total = totals.setdefault(
+            record[key], {'n': 0, 'wall': 0.0, 'cpu': 0.0, 'bytes_read': 0})
+        total['n'] += 1
+        total['wall'] += record['wall']
+        total['cpu'] += record['cpu']
+        total['bytes_read'] += record['bytes_read'] or 0
+    return totals
+
+
+def write_report(filename, records, **info):
+    """Atomically writes a JSON report of `records` to `filename`.
+
+    The report holds `info`, the records themselves and their totals for
+    each stage and each building.
+    """
+    report = dict(info)
+    report['records'] = records
+    report['stages'] = summarise(records, 'stage')
+    report['buildings'] = {
+        str(building): total for building, total in
+        summarise([record for record in records
+                   if record['stage'] == 'building'], 'building').items()}
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as fh:
+        json.dump(report, fh, indent=1, sort_keys=True)
+    rename(tmp_filename, filename)
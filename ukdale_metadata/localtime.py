@@ -0,0 +1,122 @@
+"""Converting arrays of UNIX timestamps to local (Europe/London) time.
+
+`datetime.fromtimestamp(t, tz=TZ)` is fine for the odd timestamp but far
+too slow for whole series.  Instead, the zone's table of UTC transition
+times and UTC offsets is turned into arrays once, after which a whole
+array of timestamps is localised with a single `np.searchsorted`.  BST
+transitions are therefore exactly those pytz uses.
+
+Local days are numbered like UNIX days (day 0 is 1970-01-01) but split
+at local midnight, so, for example, every timestamp from 2013-06-01
+00:00 BST (2013-05-31 23:00 UTC) up to the next local midnight is in
+the same day bucket.
+"""
+from __future__ import print_function, division
+import calendar
+import numpy as np
+import pytz
+
+from .metadata import TIMEZONE
+
+SECONDS_PER_DAY = 86400
+
+_transitions = {}
+
+
+def _epoch(dt):
+    return calendar.timegm(dt.utctimetuple())
+
+
+def _offset_string(seconds):
+    sign = '-' if seconds < 0 else '+'
+    hours, minutes = divmod(abs(seconds) // 60, 60)
+    return '{}{:02d}:{:02d}'.format(sign, hours, minutes)
+
+
+def transitions(tz=TIMEZONE):
+    """Returns the UTC offsets of the time zone `tz` and when they apply.
+
+    Parameters
+    ----------
+    tz : str or pytz time zone, optional
+
+    Returns
+    -------
+    starts, offsets : int64 arrays
+        offsets[i] (seconds east of UTC) applies to UNIX timestamps from
+        starts[i] up to starts[i+1].  starts[0] is the earliest int64.
+    """
+    if not hasattr(tz, 'utcoffset'):
+        tz = pytz.timezone(tz)
+    try:
+        return _transitions[tz.zone]
+    except KeyError:
+        pass
+    utc_transition_times = getattr(tz, '_utc_transition_times', None)
+    if utc_transition_times is None:
+        # A zone with a fixed offset
+        starts = [np.iinfo(np.int64).min]
+        offsets = [int(tz.utcoffset(None).total_seconds())]
+    else:
+        starts = [np.iinfo(np.int64).min] + [
+            _epoch(dt) for dt in utc_transition_times[1:]]
+        offsets = [int(utcoffset.total_seconds())
+                   for utcoffset, _, _ in tz._transition_info]
+    result = (np.array(starts, dtype=np.int64),
+              np.array(offsets, dtype=np.int64))
+    _transitions[tz.zone] = result
+    return result
+
+
+def _transition_indices(timestamps, tz):
+    starts, _ = transitions(tz)
+    return np.searchsorted(starts, timestamps, side='right') - 1
+
+
+def utc_offsets(timestamps, tz=TIMEZONE):
+    """Returns an int64 array of the UTC offset, in seconds, of `tz` at
+    each of the UNIX `timestamps`."""
+    timestamps = np.asarray(timestamps)
+    _, offsets = transitions(tz)
+    return offsets[_transition_indices(timestamps, tz)]
+
+
+def local_days(timestamps, tz=TIMEZONE):
+    """Returns an int64 array of the local day bucket of each of the UNIX
+    `timestamps` (int or float).  See `day_isoformat`."""
+    timestamps = np.asarray(timestamps)
+    local = np.floor(timestamps + utc_offsets(timestamps, tz))
+    return (local // SECONDS_PER_DAY).astype(np.int64)
+
+
+def day_isoformat(days):
+    """Returns the local dates of day buckets as 'YYYY-MM-DD' strings."""
+    return np.datetime_as_string(
+        np.asarray(days, dtype=np.int64).astype('datetime64[D]'))
+
+
+def isoformat(timestamps, tz=TIMEZONE):
+    """Returns the local time of each of the UNIX `timestamps` as an ISO
+    8601 string with its UTC offset, formatted exactly as
+    `datetime.fromtimestamp(t, tz).isoformat()` would be, e.g.
+    '2013-06-01T00:00:00+01:00'.
+
+    Fractional seconds are kept to the microsecond.
+    """
+    timestamps = np.asarray(timestamps)
+    _, offsets = transitions(tz)
+    indices = _transition_indices(timestamps, tz)
+    offset_strings = np.array([_offset_string(offset) for offset in offsets])
+    if timestamps.dtype.kind in 'iu':
+        local = (timestamps + offsets[indices]).astype('datetime64[s]')
+        strings = np.datetime_as_string(local)
+    else:
+        microseconds = np.round(timestamps * 1e6).astype(np.int64)
+        local = (microseconds + offsets[indices] * 1000000).astype(
+            'datetime64[us]')
+        strings = np.datetime_as_string(local)
+        # Like datetime.isoformat, only show microseconds if there are any
+        whole = microseconds % 1000000 == 0
+        strings[whole] = np.datetime_as_string(
+            local[whole].astype('datetime64[s]'))
+    return np.char.add(strings, offset_strings[indices])
@@ -0,0 +1,242 @@
+"""A manifest of the raw data files, with their sizes and SHA-256 hashes.
+
+Each file is hashed in pieces of PIECE_SIZE bytes, and its digest is the
+SHA-256 of the concatenated (binary) SHA-256 digests of its pieces.  So
+the pieces of all of the files, including the several of a big mains.dat,
+can be hashed at once by a pool of threads, each reading its piece
+sequentially in blocks of READ_SIZE bytes (hashlib and file reads release
+the GIL).  A piece which does not match its manifest also says which part
+of a copy is bad.  The digest is therefore not what `sha256sum` gives for
+the file, and the manifest's 'algorithm' (e.g. 'sha256-tree-64MiB') says
+how it was made.
+
+The hashes of finished pieces are checkpointed to a state file every
+CHECKPOINT_INTERVAL seconds, so an interrupted run carries on from where
+it stopped.  The state file is kept afterwards and files with the same
+size and mtime as when they were hashed are not read again.
+
+The manifest is JSON:
+
+    {"version": 1, "algorithm": "sha256-tree-64MiB", "piece_size": ...,
+     "files": {"house_1/labels.dat":
+               {"size": ..., "digest": HEX, "pieces": [HEX, ...]}, ...}}
+
+Copies of the dataset can be checked against a manifest with
+
+    python -m ukdale_metadata.manifest DATA_PATH MANIFEST
+"""
+from __future__ import print_function, division
+import hashlib
+import json
+import time
+from argparse import ArgumentParser
+from binascii import unhexlify
+from multiprocessing.pool import ThreadPool
+from os import rename, stat
+from os.path import isfile, join
+
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_STATE_FILENAME = '.manifest_state.json'
+MANIFEST_VERSION = 1
+
+PIECE_SIZE = 64 * 1024 * 1024
+READ_SIZE = 8 * 1024 * 1024
+HASH_THREADS = 4
+
+# Seconds between checkpoints of the finished pieces
+CHECKPOINT_INTERVAL = 10
+
+
+def _write_json(filename, data):
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as fh:
+        json.dump(data, fh, indent=1, sort_keys=True)
+    rename(tmp_filename, filename)
+
+
+def _read_json(filename, version):
+    if not isfile(filename):
+        return None
+    try:
+        with open(filename) as fh:
+            data = json.load(fh)
+    except ValueError:
+        return None
+    if data.get('version') != version:
+        return None
+    return data
+
+
+def hash_piece(filename, i, piece_size=PIECE_SIZE):
+    """Returns the hex SHA-256 digest of piece `i` of `filename`."""
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as fh:
+        fh.seek(i * piece_size)
+        remaining = piece_size
+        while remaining:
+            block = fh.read(min(READ_SIZE, remaining))
+            if not block:
+                break
+            sha256.update(block)
+            remaining -= len(block)
+    return sha256.hexdigest()
+
+
+def file_digest(pieces):
+    """Returns the hex digest of a file from the hex digests of its
+    pieces."""
+    sha256 = hashlib.sha256()
+    for piece in pieces:
+        sha256.update(unhexlify(piece))
+    return sha256.hexdigest()
+
+
+def algorithm(piece_size):
+    """Returns the name of the digest of files hashed in pieces of
+    `piece_size` bytes."""
+    if piece_size % (1024 * 1024):
+        return 'sha256-tree-{:d}B'.format(piece_size)
+    return 'sha256-tree-{:d}MiB'.format(piece_size // (1024 * 1024))
+
+
+def _n_pieces(size, piece_size):
+    return -(-size // piece_size)
+
+
+def hash_files(data_path, data_locations, threads=HASH_THREADS,
+               state_filename=None, piece_size=PIECE_SIZE):
+    """Hashes files in pieces, in parallel.
+
+    Parameters
+    ----------
+    data_path : str
+    data_locations : list of str
+        Paths of the files relative to `data_path`.
+    threads : int, optional
+    state_filename : str, optional
+        Where to checkpoint finished pieces to and resume from.
+    piece_size : int, optional
+
+    Returns
+    -------
+    files : dict
+        Maps each of `data_locations` to a dict of its 'size', 'digest'
+        and 'pieces', as in the manifest.
+    """
+    state = None
+    if state_filename is not None:
+        state = _read_json(state_filename, MANIFEST_VERSION)
+    if state is None or state['piece_size'] != piece_size:
+        state = {'version': MANIFEST_VERSION, 'piece_size': piece_size,
+                 'files': {}}
+    old_files = state['files']
+    state['files'] = {}
+
+    todo = []
+    for data_location in data_locations:
+        st = stat(join(data_path, data_location))
+        entry = old_files.get(data_location)
+        if (entry is None or entry['size'] != st.st_size or
+                entry['mtime'] != st.st_mtime):
+            entry = {'size': st.st_size, 'mtime': st.st_mtime,
+                     'pieces': [None] * _n_pieces(st.st_size, piece_size)}
+        state['files'][data_location] = entry
+        todo.extend((data_location, i)
+                    for i, piece in enumerate(entry['pieces'])
+                    if piece is None)
+
+    def work(task):
+        data_location, i = task
+        return data_location, i, hash_piece(
+            join(data_path, data_location), i, piece_size)
+
+    pool = ThreadPool(threads)
+    checkpointed = time.time()
+    try:
+        for data_location, i, piece in pool.imap_unordered(work, todo):
+            state['files'][data_location]['pieces'][i] = piece
+            if (state_filename is not None and
+                    time.time() - checkpointed >= CHECKPOINT_INTERVAL):
+                _write_json(state_filename, state)
+                checkpointed = time.time()
+    finally:
+        pool.terminate()
+        pool.join()
+        if state_filename is not None:
+            _write_json(state_filename, state)
+
+    return {data_location: {'size': entry['size'],
+                            'digest': file_digest(entry['pieces']),
+                            'pieces': entry['pieces']}
+            for data_location, entry in state['files'].items()}
+
+
+def write_manifest(data_path, data_locations, output_path,
+                   threads=HASH_THREADS):
+    """Hashes `data_locations` and writes MANIFEST_FILENAME to
+    `output_path`, checkpointing to MANIFEST_STATE_FILENAME there."""
+    files = hash_files(data_path, data_locations, threads,
+                       join(output_path, MANIFEST_STATE_FILENAME))
+    _write_json(join(output_path, MANIFEST_FILENAME), {
+        'version': MANIFEST_VERSION, 'algorithm': algorithm(PIECE_SIZE),
+        'piece_size': PIECE_SIZE, 'files': files})
+
+
+def verify(data_path, manifest, threads=HASH_THREADS):
+    """Checks the files under `data_path` against a loaded `manifest`.
+
+    Returns
+    -------
+    problems : list of (data_location, str)
+        Saying what is wrong with each file which does not match,
+        including which pieces differ.
+    """
+    if manifest.get('algorithm') != algorithm(manifest['piece_size']):
+        raise ValueError('Unsupported manifest algorithm: {}'.format(
+            manifest.get('algorithm')))
+    files = manifest['files']
+    problems = []
+    to_hash = []
+    for data_location in sorted(files):
+        filename = join(data_path, data_location)
+        if not isfile(filename):
+            problems.append((data_location, 'missing'))
+        elif stat(filename).st_size != files[data_location]['size']:
+            problems.append((data_location, 'size {:d} != {:d}'.format(
+                stat(filename).st_size, files[data_location]['size'])))
+        else:
+            to_hash.append(data_location)
+
+    hashed = hash_files(data_path, to_hash, threads,
+                        piece_size=manifest['piece_size'])
+    for data_location in to_hash:
+        expected = files[data_location]['pieces']
+        bad = [i for i, (piece, expected_piece) in enumerate(
+            zip(hashed[data_location]['pieces'], expected))
+            if piece != expected_piece]
+        if bad:
+            problems.append((data_location, 'pieces {} differ'.format(
+                ', '.join(str(i) for i in bad))))
+    return problems
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        description='Checks a copy of the raw data against a manifest.')
+    parser.add_argument('data_path')
+    parser.add_argument('manifest')
+    parser.add_argument('-t', '--threads', type=int, default=HASH_THREADS)
+    args = parser.parse_args(argv)
+    with open(args.manifest) as fh:
+        manifest = json.load(fh)
+    problems = verify(args.data_path, manifest, args.threads)
+    for data_location, problem in problems:
+        print('{}: {}'.format(data_location, problem))
+    print('{:d} of {:d} files OK'.format(
+        len(manifest['files']) - len(problems), len(manifest['files'])))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
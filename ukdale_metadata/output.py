@@ -0,0 +1,43 @@
+"""Writes the YAML metadata files.
+
+Each file is streamed to a temporary file alongside its destination,
+using the libyaml emitter if PyYAML was built with it.  If the result is
+identical to the existing file then the temporary file is discarded, so
+unchanged files keep their mtime (and anything watching them is not
+triggered), otherwise it is renamed over the destination, so a crash
+never leaves a truncated file behind.
+"""
+from __future__ import print_function, division
+import filecmp
+from os import remove, rename
+from os.path import isfile
+import yaml
+
+# The libyaml emitter produces the same output as the pure Python one, as
+# tests/test_output.py checks on the generated metadata
+Dumper = getattr(yaml, 'CDumper', yaml.Dumper)
+
+
+def write_yaml(filename, data):
+    """Writes `data` to `filename` as YAML unless `filename` already
+    holds exactly that YAML.
+
+    Returns
+    -------
+    written : bool
+        False if `filename` was left untouched.
+    """
+    tmp_filename = filename + '.tmp'
+    try:
+        with open(tmp_filename, 'w') as fh:
+            yaml.dump(data, fh, Dumper=Dumper)
+        if isfile(filename) and filecmp.cmp(tmp_filename, filename,
+                                            shallow=False):
+            remove(tmp_filename)
+            return False
+        rename(tmp_filename, filename)
+    except BaseException:
+        if isfile(tmp_filename):
+            remove(tmp_filename)
+        raise
+    return True
@@ -0,0 +1,187 @@
+"""Downsampled pyramids of each meter's power.
+
+A pyramid holds the meter's power aggregated into buckets of 1 minute,
+15 minutes, 1 hour and 1 day, aligned to the UNIX epoch (so daily buckets
+are UTC days).  Each level is a columnar .npz sidecar with the columns:
+
+* timestamp : start of the bucket, UNIX time (int64)
+* mean : time-weighted mean power in watts (float32)
+* max : maximum power in watts (float32)
+* energy : joules, i.e. watt-seconds (float64)
+* duration : seconds of the bucket covered by data (float64)
+
+Only buckets containing samples are stored.  Each sample is taken to last
+until the next sample, but for no more than the meter's
+`max_sample_period`, and its energy is attributed to the bucket in which
+it starts.  The 1 minute level is built from the raw data and the coarser
+levels are built from the 1 minute level.
+"""
+from __future__ import print_function, division
+from os.path import isfile, join
+import numpy as np
+
+from .cache import UNCHANGED, APPENDED
+from .reader import iter_chunks
+from .sidecars import load_arrays, save_arrays, sidecar_location
+
+# (label, bucket size in seconds), finest first
+LEVELS = (('1min', 60), ('15min', 900), ('1h', 3600), ('1d', 86400))
+
+COLUMNS = ('timestamp', 'mean', 'max', 'energy', 'duration')
+
+
+def _aggregate(buckets, energy, duration, maximum):
+    """Sums `energy` and `duration` and takes the max of `maximum` over
+    runs of equal (sorted) `buckets`."""
+    starts = np.flatnonzero(np.concatenate([[True], np.diff(buckets) != 0]))
+    return (buckets[starts],
+            np.add.reduceat(energy, starts),
+            np.add.reduceat(duration, starts),
+            np.maximum.reduceat(maximum, starts))
+
+
+def _level(buckets, energy, duration, maximum):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(duration > 0, energy / duration, maximum)
+    return {'timestamp': buckets.astype(np.int64),
+            'mean': mean.astype(np.float32),
+            'max': maximum.astype(np.float32),
+            'energy': energy.astype(np.float64),
+            'duration': duration.astype(np.float64)}
+
+
+class PyramidBuilder(object):
+    """Builds a pyramid from a stream of (timestamps, power) chunks.
+
+    Call `update` for each chunk then `finish` to get the levels.
+
+    Parameters
+    ----------
+    max_sample_period : number
+    finest : dict of arrays, optional
+        A previously built finest level to extend.  Streaming must then
+        restart from the last sample which went into it.
+    """
+
+    def __init__(self, max_sample_period, finest=None):
+        self.max_sample_period = max_sample_period
+        self.bucket_size = LEVELS[0][1]
+        self._last_sample = None
+        self._bins = []
+        self._open_bin = None
+        if finest is not None and len(finest['timestamp']):
+            self._bins.append([
+                finest['timestamp'][:-1] // self.bucket_size,
+                finest['energy'][:-1], finest['duration'][:-1],
+                finest['max'][:-1].astype(float)])
+            self._open_bin = [
+                finest['timestamp'][-1] // self.bucket_size,
+                finest['energy'][-1], float(finest['duration'][-1]),
+                float(finest['max'][-1])]
+
+    def update(self, timestamps, power):
+        if self._last_sample is not None:
+            timestamps = np.concatenate([[self._last_sample[0]], timestamps])
+            power = np.concatenate([[self._last_sample[1]], power])
+        if not timestamps.size:
+            return
+        self._last_sample = (timestamps[-1], power[-1])
+        if timestamps.size == 1:
+            return
+        durations = np.minimum(np.diff(timestamps), self.max_sample_period)
+        self._add(timestamps[:-1], power[:-1], durations)
+
+    def finish(self):
+        """Returns a dict mapping each level's label to a dict of columns."""
+        if self._last_sample is not None:
+            timestamp, power = self._last_sample
+            self._add(np.array([timestamp]), np.array([power]), np.zeros(1))
+            self._last_sample = None
+        if self._open_bin is not None:
+            self._bins.append([np.array([value]) for value in self._open_bin])
+            self._open_bin = None
+
+        if self._bins:
+            buckets, energy, duration, maximum = [
+                np.concatenate(column) for column in zip(*self._bins)]
+        else:
+            buckets, energy, duration, maximum = [np.empty(0)] * 4
+        # Each level is aggregated from the one below it
+        buckets = (buckets * self.bucket_size).astype(np.int64)
+        levels = {}
+        for label, bucket_size in LEVELS:
+            if buckets.size:
+                buckets, energy, duration, maximum = _aggregate(
+                    buckets // bucket_size * bucket_size, energy, duration,
+                    maximum)
+            levels[label] = _level(buckets, energy, duration, maximum)
+        return levels
+
+    def _add(self, timestamps, power, durations):
+        buckets, energy, duration, maximum = _aggregate(
+            (timestamps // self.bucket_size).astype(np.int64),
+            power * durations, durations, power)
+        if self._open_bin is not None:
+            if buckets[0] == self._open_bin[0]:
+                energy[0] += self._open_bin[1]
+                duration[0] += self._open_bin[2]
+                maximum[0] = max(maximum[0], self._open_bin[3])
+            else:
+                self._bins.append(
+                    [np.array([value]) for value in self._open_bin])
+        self._open_bin = [buckets[-1], energy[-1], duration[-1], maximum[-1]]
+        if buckets.size > 1:
+            self._bins.append([buckets[:-1], energy[:-1], duration[:-1],
+                               maximum[:-1]])
+
+
+def pyramid_locations(data_location):
+    """Returns a dict mapping each level's label to its sidecar path."""
+    return {label: sidecar_location('pyramid', data_location,
+                                    '/{}.npz'.format(label))
+            for label, _ in LEVELS}
+
+
+def update_pyramid(filename, status, old_entry, max_sample_period,
+                   output_path, data_location):
+    """Builds the pyramid for a data file and writes it to sidecars.
+
+    Cached work is reused: nothing is read if the file is unchanged and
+    only the new lines are read if the file has been appended to.
+
+    Returns
+    -------
+    pyramid : dict
+        With keys 'locations' (dict of sidecar paths relative to
+        `output_path`, keyed by level label) and 'max_sample_period'.
+        Suitable for the cache.
+    """
+    locations = pyramid_locations(data_location)
+    cached = (old_entry or {}).get('pyramid')
+    finest = None
+    if (cached is not None and
+            cached['max_sample_period'] == max_sample_period and
+            all(isfile(join(output_path, location))
+                for location in locations.values())):
+        if status == UNCHANGED:
+            return {'locations': locations,
+                    'max_sample_period': max_sample_period}
+        elif status == APPENDED:
+            finest = load_arrays(output_path, locations[LEVELS[0][0]])
+            # Durations used to be float32, which rounds a little more
+            # every time they are added to
+            if finest['duration'].dtype != np.float64:
+                finest = None
+
+    builder = PyramidBuilder(max_sample_period, finest)
+    if finest is None:
+        chunks = iter_chunks(filename)
+    else:
+        # Restart from the previous last line: its duration was unknown
+        # (so zero) last time.  Re-adding it is harmless to max.
+        chunks = iter_chunks(filename, offset=old_entry['last_line_offset'])
+    for timestamps, values in chunks:
+        builder.update(timestamps, values[:, 0])
+    for label, level in builder.finish().items():
+        save_arrays(output_path, locations[label], **level)
+    return {'locations': locations, 'max_sample_period': max_sample_period}
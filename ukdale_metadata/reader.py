@@ -0,0 +1,485 @@
+"""Readers for the UK-DALE `.dat` data files.
+
+Each line of a data file is a whitespace-separated record which starts
+with a UNIX timestamp, e.g. `channel_N.dat` lines are "timestamp watts"
+and `mains.dat` lines have several value columns.
+
+Anything which needs more than the first and last lines of a file should
+stream through it with `iter_chunks`, which yields NumPy arrays parsed in
+bulk from fixed-size blocks of bytes.
+
+A data file may be stored compressed (e.g. `channel_N.dat.gz`, see
+`compressed`).  Each function here reads the `.dat` file if it exists and
+its compressed version otherwise, with byte offsets counting uncompressed
+bytes, and takes boundaries from the compressed file's block index.
+"""
+from __future__ import print_function, division
+import mmap
+import warnings
+from os import SEEK_END, fstat
+import numpy as np
+
+from .compressed import (DecompressingReader, block_index, compressed_suffix,
+                         find_data_file)
+
+# Number of bytes to read per step when seeking backwards from the end of
+# a data file to find its last line.
+BOUNDARY_BLOCK_SIZE = 4096
+
+# Number of bytes to read per chunk when streaming through a data file.
+# Big enough to amortise the per-chunk overhead of the vectorized parser but
+# small enough for its working arrays to stay in the CPU caches.
+CHUNK_SIZE = 1024 * 1024
+
+# Files at least this big are memory-mapped by `iter_chunks` by default.
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+def line_timestamp(line):
+    """Returns the UNIX timestamp (float) at the start of `line`."""
+    return float(line.split(None, 1)[0])
+
+
+def last_line(fh, floor=0, block_size=BOUNDARY_BLOCK_SIZE):
+    """Finds the last non-empty line of the binary file object `fh`.
+
+    Reads backwards from the end of the file in blocks of `block_size`
+    bytes so only the tail of the file is ever touched.  Works for files
+    with or without a trailing newline.
+
+    Parameters
+    ----------
+    fh : file opened in binary mode
+    floor : int, optional
+        Byte offset of the start of a line.  The search never reads
+        before this offset, so if no newline is found after `floor` then
+        the last line is taken to start at `floor`.
+    block_size : int, optional
+
+    Returns
+    -------
+    offset, line : int, bytes
+        The byte offset of the start of the last line and the line itself
+        (without its line terminator).
+    """
+    fh.seek(0, SEEK_END)
+    pos = fh.tell()
+    tail = b''
+    while pos > floor:
+        read_size = min(block_size, pos - floor)
+        pos -= read_size
+        fh.seek(pos)
+        tail = fh.read(read_size) + tail
+        stripped = tail.rstrip(b'\r\n')
+        newline = stripped.rfind(b'\n')
+        if newline != -1:
+            return pos + newline + 1, stripped[newline+1:]
+    return floor, tail.rstrip(b'\r\n')
+
+
+def boundary_lines(filename):
+    """Returns the first and last lines of `filename`, without their line
+    endings, using a single open()."""
+    filename = find_data_file(filename)
+    if compressed_suffix(filename):
+        index = block_index(filename)
+        return index['first_line'], index['last_line']
+    with open(filename, 'rb') as fh:
+        first_line = fh.readline().rstrip(b'\r\n')
+        _, final_line = last_line(fh)
+    return first_line, final_line
+
+
+def find_offset(filename, timestamp, block_size=BOUNDARY_BLOCK_SIZE):
+    """Returns the byte offset of the first line of `filename` whose
+    timestamp is at least `timestamp`, or the size of the file if there is
+    no such line.
+
+    The lines must be in timestamp order.  The file is bisected until
+    fewer than `block_size` bytes are left to search, so only a few dozen
+    lines are read however big the file is.  In a compressed file the
+    search starts from the last block index entry before `timestamp`.
+    """
+    filename = find_data_file(filename)
+    if compressed_suffix(filename):
+        return _find_offset_compressed(filename, timestamp)
+    with open(filename, 'rb') as fh:
+        fh.seek(0, SEEK_END)
+        # Lines before `lo` are all earlier than `timestamp` and the line
+        # wanted starts no later than `hi`
+        lo = 0
+        hi = fh.tell()
+        while hi - lo > block_size:
+            mid = (lo + hi) // 2
+            fh.seek(mid - 1)
+            fh.readline()
+            position = fh.tell()
+            if position >= hi:
+                break
+            line = fh.readline()
+            if not line.strip():
+                break
+            if line_timestamp(line) < timestamp:
+                lo = fh.tell()
+            else:
+                hi = position
+        fh.seek(lo)
+        position = lo
+        while position < hi:
+            line = fh.readline()
+            if line.strip() and line_timestamp(line) >= timestamp:
+                break
+            position += len(line)
+    return min(position, hi)
+
+
+def _find_offset_compressed(filename, timestamp):
+    index = block_index(filename)
+    i = np.searchsorted(index['timestamp'], timestamp, side='left') - 1
+    position = int(index['line_offset'][i]) if i >= 0 else 0
+    with DecompressingReader(filename, index) as fh:
+        fh.seek(position)
+        while True:
+            line = fh.readline()
+            if not line or (line.strip() and
+                            line_timestamp(line) >= timestamp):
+                break
+            position += len(line)
+    return position
+
+
+def count_lines(filename, offset=0, block_size=CHUNK_SIZE):
+    """Returns the number of lines in `filename` from byte `offset` on,
+    counting a final line which has no trailing newline.
+
+    Each block is read into the same buffer and its newlines are counted
+    with vectorized NumPy operations into a reused output array.  This
+    runs at close to the speed at which the file can be read, several
+    times faster than `bytes.count`.  The lines of a whole compressed file
+    are counted once, when its block index is built.
+    """
+    filename = find_data_file(filename)
+    if compressed_suffix(filename):
+        if offset == 0:
+            return block_index(filename)['n_lines']
+        return _count_lines_compressed(filename, offset, block_size)
+    buf = bytearray(block_size)
+    u = np.frombuffer(buf, dtype=np.uint8)
+    is_newline = np.empty(block_size, dtype=bool)
+    n_lines = 0
+    last_byte = _NEWLINE
+    with open(filename, 'rb') as fh:
+        fh.seek(offset)
+        while True:
+            n_bytes = fh.readinto(buf)
+            if not n_bytes:
+                break
+            np.equal(u[:n_bytes], _NEWLINE, out=is_newline[:n_bytes])
+            n_lines += int(np.count_nonzero(is_newline[:n_bytes]))
+            last_byte = u[n_bytes-1]
+    if last_byte != _NEWLINE:
+        n_lines += 1
+    return n_lines
+
+
+def _count_lines_compressed(filename, offset, block_size):
+    n_lines = 0
+    block = b'\n'
+    with DecompressingReader(filename) as fh:
+        fh.seek(offset)
+        while True:
+            data = fh.read(block_size)
+            if not data:
+                break
+            block = data
+            n_lines += block.count(b'\n')
+    if not block.endswith(b'\n'):
+        n_lines += 1
+    return n_lines
+
+
+class _Unparseable(Exception):
+    """Raised when a block is not in the simple "digits, '.' and '-'
+    separated by single spaces" form handled by the vectorized parser."""
+
+
+_ZERO = ord('0')
+# Characters other than digits, after subtracting _ZERO as uint8
+_DOT = (ord('.') - _ZERO) % 256
+_MINUS = (ord('-') - _ZERO) % 256
+_NEWLINE = ord('\n')
+
+# Powers of ten, indexed by the number of digits after the decimal point.
+# All are exact, so dividing by one is correctly rounded, as float() is.
+_POW10 = 10.0 ** np.arange(19)
+
+# Accumulators below this convert to float64 exactly.
+_MAX_EXACT = 2 ** 53
+
+# More digits than this would overflow the int64 accumulator.
+_MAX_DIGITS = 18
+
+
+def _parse_fields(u, starts, lengths):
+    """Parses the decimal numbers u[starts[i]:starts[i]+lengths[i]].
+
+    Works one character position at a time across all fields at once
+    (Horner's method) so the Python-level loop runs at most _MAX_DIGITS
+    times per block, however many lines the block holds.
+    """
+    n = starts.size
+    min_length = int(lengths.min())
+    max_length = int(lengths.max())
+    if min_length == 0 or max_length > _MAX_DIGITS + 2:
+        raise _Unparseable()
+
+    acc = np.zeros(n, dtype=np.int64)
+    n_decimals = None
+    seen_dot = None
+    negative = None
+    index = starts.copy()
+    for position in range(max_length):
+        digit = u.take(index, mode='clip')
+        digit -= _ZERO
+        index += 1
+        is_digit = digit <= 9
+        if position < min_length and seen_dot is None and is_digit.all():
+            # Fast path: every field has a digit here
+            acc *= 10
+            acc += digit
+            continue
+
+        active = lengths > position
+        is_digit &= active
+        is_dot = active & (digit == _DOT)
+        is_valid = is_digit | is_dot
+        if position == 0:
+            negative = active & (digit == _MINUS)
+            if negative.any():
+                is_valid |= negative
+            else:
+                negative = None
+        if np.any(active & ~is_valid):
+            raise _Unparseable()
+        if seen_dot is None and is_dot.any():
+            seen_dot = np.zeros(n, dtype=bool)
+            n_decimals = np.zeros(n, dtype=np.int64)
+        # Multiply by 10 and add the digit only where there is a digit
+        digit *= is_digit
+        acc *= 1 + 9 * is_digit.view(np.uint8)
+        acc += digit
+        if seen_dot is not None:
+            if np.any(seen_dot & is_dot):
+                raise _Unparseable()
+            n_decimals += is_digit & seen_dot
+            seen_dot |= is_dot
+
+    if n_decimals is None:
+        values = acc.astype(np.float64)
+    elif n_decimals.max() > _MAX_DIGITS or acc.max() >= _MAX_EXACT:
+        raise _Unparseable()
+    else:
+        values = acc / _POW10[n_decimals]
+    if negative is not None:
+        values[negative] *= -1
+    return values
+
+
+def _bad_line_error(u, n_columns):
+    """Returns a ValueError naming the first line of the block `u` which
+    does not hold `n_columns` numbers."""
+    for line in u.tobytes().splitlines():
+        fields = line.split()
+        if not fields:
+            continue
+        if len(fields) != n_columns:
+            return ValueError('Expected {:d} columns but got {:d} in line'
+                              ' {!r}'.format(n_columns, len(fields), line))
+        try:
+            [float(field) for field in fields]
+        except ValueError:
+            return ValueError('Non-numeric value in line {!r}'.format(line))
+    return ValueError('Cannot parse block')
+
+
+def _parse_block_slowly(u, n_columns):
+    """Fallback parser for blocks which _parse_fields cannot handle, e.g.
+    with repeated whitespace, CRLF line endings or exponents.
+
+    np.fromstring ignores line boundaries and, in older NumPy, stops
+    quietly at the first bad value, so the fields on each line are counted
+    separately and must all have been parsed.
+    """
+    is_space = u <= ord(' ')
+    field_starts = ~is_space
+    field_starts[1:] &= is_space[:-1]
+    lines = np.cumsum(u == _NEWLINE)
+    n_fields = np.bincount(lines[field_starts], minlength=int(lines[-1]) + 1)
+    with warnings.catch_warnings():
+        # Newer NumPy warns about (or raises on) bad values instead
+        warnings.simplefilter('ignore', DeprecationWarning)
+        try:
+            data = np.fromstring(u.tobytes(), dtype=np.float64, sep=' ')
+        except ValueError:
+            raise _bad_line_error(u, n_columns)
+    if (np.any((n_fields != 0) & (n_fields != n_columns)) or
+            data.size != n_fields.sum()):
+        raise _bad_line_error(u, n_columns)
+    return data.reshape(-1, n_columns).T
+
+
+def parse_block(block):
+    """Parses a block of whole lines into (timestamps, values) arrays.
+
+    The block is parsed as bytes with vectorized NumPy operations: the
+    positions of all separators are found in one pass and then each
+    column is converted to numbers in bulk, with no per-line Python code.
+
+    Parameters
+    ----------
+    block : bytes-like
+        One or more complete lines, the last of which must end in a
+        newline.  Every line must have the same number of columns.
+
+    Returns
+    -------
+    timestamps, values : np.ndarray
+        `timestamps` is a 1D float64 array of UNIX timestamps and `values`
+        is a 2D float64 array with one column per value column.
+    """
+    u = np.frombuffer(block, dtype=np.uint8)
+    first_newline = int(np.argmax(u == _NEWLINE))
+    n_columns = len(u[:first_newline].tobytes().split())
+    if n_columns < 2:
+        raise ValueError('Expected at least a timestamp and a value per line')
+    separators = np.flatnonzero(u <= ord(' '))
+    n_lines = separators.size // n_columns
+    try:
+        if (separators.size % n_columns or separators[0] == 0 or
+                np.any(np.diff(separators) == 1) or
+                np.any(u[separators[n_columns-1::n_columns]] != _NEWLINE)):
+            raise _Unparseable()
+        ends = separators.reshape(n_lines, n_columns).T
+        starts = np.empty_like(ends)
+        starts[0, 0] = 0
+        starts[0, 1:] = ends[-1, :-1] + 1
+        starts[1:] = ends[:-1] + 1
+        columns = [_parse_fields(u, starts[i], ends[i] - starts[i])
+                   for i in range(n_columns)]
+    except _Unparseable:
+        columns = _parse_block_slowly(u, n_columns)
+    return columns[0], np.column_stack(columns[1:])
+
+
+def _iter_chunks_read(fh, offset, stop, chunk_size):
+    """Reads chunks with fh.read(), copying each into a bytes object."""
+    fh.seek(offset)
+    remainder = b''
+    while True:
+        if stop is None:
+            block = fh.read(chunk_size)
+        else:
+            block = fh.read(min(chunk_size, stop - fh.tell()))
+        if not block:
+            break
+        block = remainder + block
+        end = block.rfind(b'\n') + 1
+        remainder = block[end:]
+        if block[:end].strip():
+            yield parse_block(block[:end])
+    if remainder.strip():
+        yield parse_block(remainder + b'\n')
+
+
+def _iter_chunks_mmap(fh, offset, stop, chunk_size):
+    """Parses chunks directly from a read-only memory map of the file.
+
+    Blocks are NumPy views of the mapping so no bytes are copied before
+    parsing, and the page cache is shared with any other process mapping
+    the same file.  Where mmap.madvise is available (Python >= 3.8), pages
+    are dropped from this process's mapping once parsed so its resident
+    size does not grow with the file.
+    """
+    size = fstat(fh.fileno()).st_size
+    stop = size if stop is None else stop
+    if offset >= stop:
+        return
+    mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    can_release = hasattr(mm, 'madvise')
+    if can_release:
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    try:
+        released = offset - offset % mmap.PAGESIZE
+        position = offset
+        while position < stop:
+            end = min(position + chunk_size, stop)
+            newline = mm.rfind(b'\n', position, end)
+            if newline == -1:
+                newline = mm.find(b'\n', end, stop)
+            if newline == -1:
+                # Last line, without a trailing newline
+                tail = buf[position:stop].tobytes()
+                if tail.strip():
+                    yield parse_block(tail + b'\n')
+                break
+            end = newline + 1
+            # No views of `buf` may be alive at the yield, otherwise the
+            # map could not be closed if the consumer stops early
+            if buf[position:end].max() > ord(' '):
+                yield parse_block(buf[position:end])
+            position = end
+            if can_release:
+                release_to = position - position % mmap.PAGESIZE
+                if release_to > released:
+                    mm.madvise(mmap.MADV_DONTNEED, released,
+                               release_to - released)
+                    released = release_to
+    finally:
+        del buf
+        mm.close()
+
+
+def iter_chunks(filename, offset=0, stop=None, chunk_size=CHUNK_SIZE,
+                use_mmap=None):
+    """Streams through a data file in chunks of whole lines.
+
+    Parameters
+    ----------
+    filename : str
+    offset : int, optional
+        Byte offset of the start of a line to start reading from.
+    stop : int, optional
+        Byte offset of the start of a line to stop reading at.  Defaults
+        to the end of the file.
+    chunk_size : int, optional
+        Approximate number of bytes per chunk.
+    use_mmap : bool, optional
+        Whether to parse directly from a memory map of the file rather than
+        from copies made by read().  Defaults to memory-mapping files of at
+        least MMAP_THRESHOLD bytes.
+
+    Yields
+    ------
+    timestamps, values : np.ndarray
+        `timestamps` is a 1D float64 array of UNIX timestamps and `values`
+        is a 2D float64 array with one column per value column in the file.
+    """
+    filename = find_data_file(filename)
+    if compressed_suffix(filename):
+        fh = DecompressingReader(filename)
+        use_mmap = False
+    else:
+        fh = open(filename, 'rb')
+    with fh:
+        if use_mmap is None:
+            use_mmap = fstat(fh.fileno()).st_size >= MMAP_THRESHOLD
+        if use_mmap:
+            chunks = _iter_chunks_mmap(fh, offset, stop, chunk_size)
+        else:
+            chunks = _iter_chunks_read(fh, offset, stop, chunk_size)
+        try:
+            for chunk in chunks:
+                yield chunk
+        finally:
+            chunks.close()
@@ -0,0 +1,214 @@
+"""The unmetered residual of each meter which has submeters.
+
+The `submeter_of` tree says which meters are downstream of which: a
+parent meter's power, less the sum of its children's, is what flows
+through the parent without being metered further down (lights, fixed
+appliances, standby loads, ...).  Disaggregation evaluation needs this
+residual all the time.
+
+Parents and children are streamed onto a common grid by
+`align.iter_aligned`, so memory use depends on the number of meters and
+the length of a day, not on the length of the recording.
+
+Power is the first value column of each data file.  A child's missing
+values count as zero, so the residual is only exact at 'complete' grid
+points, where the parent and all of its children have data.
+
+Each parent's residual goes in a directory (e.g. `residual/house_1/mains`
+in OUTPUT_PATH) holding:
+
+* `YYYY-MM.npz` files, one per local month, with the grid points at which
+  the parent has data: 'timestamp' (int64), 'residual' (float32 watts)
+  and 'complete' (bool);
+* `days.npz`, with one row per local day of the parent's recording:
+  'day' (as from `localtime.local_days`), 'n_points' (grid points in the
+  day), 'parent_coverage' and 'complete_coverage' (the fraction of those
+  points at which the parent, or the parent and all its children, have
+  data) and 'residual_energy' (joules, over the complete points).
+"""
+from __future__ import print_function, division
+import posixpath
+from os.path import join
+import numpy as np
+
+from .align import (GRID_PERIOD, MonthWriter, iter_aligned, load_carry,
+                    remove_months, resume_day)
+from .cache import UNCHANGED, APPENDED
+from .localtime import local_days
+from .metadata import TIMEZONE
+from .sidecars import load_arrays, save_arrays, sidecar_location
+
+DAY_COLUMNS = ('day', 'n_points', 'parent_coverage', 'complete_coverage',
+               'residual_energy')
+
+
+def submeter_tree(elec_meters):
+    """Returns dict mapping each parent meter's instance number to a sorted
+    list of the instance numbers of its children.
+
+    `submeter_of: 0` means the site meter, which is taken to be the first
+    enabled site meter.  Disabled meters are left out of the tree, so in
+    houses with a sound card power meter the (disabled) aggregate channel
+    is not counted as one of its children.
+    """
+    site_meters = sorted(
+        instance for instance, meter in elec_meters.items()
+        if meter.get('site_meter') and not meter.get('disabled'))
+    children = {}
+    for instance, meter in sorted(elec_meters.items()):
+        parent = meter.get('submeter_of')
+        if parent is None or meter.get('disabled'):
+            continue
+        if parent == 0:
+            if not site_meters:
+                continue
+            parent = site_meters[0]
+        if (parent == instance or parent not in elec_meters or
+                elec_meters[parent].get('disabled')):
+            continue
+        children.setdefault(parent, []).append(instance)
+    return children
+
+
+def residual_location(data_location):
+    """Returns the directory of the residual of the meter at
+    `data_location`, relative to OUTPUT_PATH."""
+    return sidecar_location('residual', data_location, '')
+
+
+def _days_location(location):
+    return posixpath.join(location, 'days.npz')
+
+
+def compute_residual(parent, children, first_day, last_day, output_path,
+                     location, days=None, carry=None):
+    """Computes a parent's residual for local days `first_day` to
+    `last_day` inclusive.
+
+    Parameters
+    ----------
+    parent : (filename, max_sample_period)
+    children : list of (filename, max_sample_period)
+    first_day, last_day : int
+    output_path, location : str
+    days : dict of arrays, optional
+        Rows of `days.npz` for days before `first_day`, to keep.
+    carry : (month_location, dict of arrays), optional
+        The residual series already written for the month of `first_day`
+        before that day, to keep.
+
+    Returns
+    -------
+    days : dict of arrays
+        All the rows of `days.npz`, which has been written.
+    """
+    writer = MonthWriter(output_path, location, carry)
+    rows = []
+    for day, grid, power in iter_aligned([parent] + children, first_day,
+                                         last_day):
+        parent_valid = ~np.isnan(power[:, 0])
+        children_valid = ~np.isnan(power[:, 1:])
+        residual = power[:, 0] - np.where(
+            children_valid, power[:, 1:], 0).sum(axis=1)
+        complete = parent_valid & children_valid.all(axis=1)
+        writer.add(day, {'timestamp': grid[parent_valid],
+                         'residual': residual[parent_valid].astype(np.float32),
+                         'complete': complete[parent_valid]})
+        rows.append((day, grid.size, parent_valid.mean(), complete.mean(),
+                     residual[complete].sum() * GRID_PERIOD))
+    writer.flush()
+
+    new_days = [np.array(column) for column in zip(*rows)] if rows else [
+        np.empty(0)] * len(DAY_COLUMNS)
+    columns = {}
+    for name, column in zip(DAY_COLUMNS, new_days):
+        if days is not None:
+            column = np.concatenate([days[name], column])
+        columns[name] = column.astype(
+            np.int64 if name in ('day', 'n_points') else np.float64)
+    save_arrays(output_path, _days_location(location), **columns)
+    return columns
+
+
+def update_residual(data_path, data_locations, max_sample_periods, statuses,
+                    old_entries, new_entries, output_path):
+    """Computes a parent's residual, reusing cached work.
+
+    Nothing is read if none of the data files have changed.  If some have
+    been appended to, only the days from the earliest day which could
+    have changed are computed again.
+
+    Parameters
+    ----------
+    data_path : str
+    data_locations : list of str
+        Of the parent then each of its children.
+    max_sample_periods, statuses : lists
+        Of the meter and the status of the data file at each of
+        `data_locations`.
+    old_entries, new_entries : lists of dicts
+        The previous (or None) and up-to-date cache entries of the data
+        files at `data_locations`.
+    output_path : str
+
+    Returns
+    -------
+    residual : dict
+        Suitable for the parent's cache entry.
+    """
+    location = residual_location(data_locations[0])
+    result = {'location': location, 'children': list(data_locations[1:]),
+              'max_sample_periods': list(max_sample_periods),
+              'grid_period': GRID_PERIOD, 'timezone': TIMEZONE}
+    first_day, last_day = [
+        int(day) for day in local_days(
+            [new_entries[0]['start'], new_entries[0]['end']])]
+    result['last_day'] = last_day
+
+    cached = (old_entries[0] or {}).get('residual')
+    days = None
+    if (cached is not None and
+            all(cached[key] == result[key] for key in (
+                'location', 'children', 'max_sample_periods',
+                'grid_period', 'timezone')) and
+            all(status in (UNCHANGED, APPENDED) for status in statuses)):
+        days = load_arrays(output_path, _days_location(location))
+    if days is not None and all(status == UNCHANGED for status in statuses):
+        return result
+
+    carry = None
+    if days is not None:
+        first_day = max(resume_day(cached['last_day'], old_entries, statuses),
+                        first_day)
+        keep = days['day'] < first_day
+        days = {name: column[keep] for name, column in days.items()}
+        carry = load_carry(output_path, location, first_day,
+                           ('timestamp', 'residual', 'complete'))
+    else:
+        remove_months(output_path, location)
+
+    compute_residual(
+        (join(data_path, data_locations[0]), max_sample_periods[0]),
+        [(join(data_path, data_location), max_sample_period)
+         for data_location, max_sample_period in zip(
+             data_locations[1:], max_sample_periods[1:])],
+        first_day, last_day, output_path, location, days, carry)
+    return result
+
+
+def residual_metadata(output_path, location):
+    """Returns a summary of a residual for the parent meter's metadata:
+    its 'location', the fraction of grid points at which it is complete
+    ('complete_coverage') and its mean power in watts at those points
+    ('mean_power', None if there are none)."""
+    days = load_arrays(output_path, _days_location(location))
+    complete_points = (days['complete_coverage'] * days['n_points']).sum()
+    n_points = days['n_points'].sum()
+    return {
+        'location': location,
+        'complete_coverage':
+            float(complete_points / n_points) if n_points else 0.0,
+        'mean_power':
+            float(days['residual_energy'].sum() /
+                  (complete_points * GRID_PERIOD))
+            if complete_points else None}
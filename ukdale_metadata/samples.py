@@ -0,0 +1,37 @@
+"""Counting the samples in each data file.
+
+Every line of a data file is one sample, so the number of samples is
+found by counting newlines (see `reader.count_lines`) without parsing
+anything.
+"""
+from __future__ import print_function, division
+
+from .cache import UNCHANGED, APPENDED
+from .reader import count_lines
+
+
+def update_n_samples(filename, status, old_entry):
+    """Returns the number of samples in `filename`, reusing cached work.
+
+    Parameters
+    ----------
+    filename : str
+    status : str
+        How the file changed since `old_entry`, as reported by
+        `cache.scan_boundaries`.
+    old_entry : dict or None
+        The previous cache entry for `filename`.
+
+    Returns
+    -------
+    n_samples : int
+    """
+    n_samples = (old_entry or {}).get('n_samples')
+    if n_samples is not None:
+        if status == UNCHANGED:
+            return n_samples
+        elif status == APPENDED:
+            # Counting resumes at the start of the previous last line
+            return n_samples - 1 + count_lines(
+                filename, offset=old_entry['last_line_offset'])
+    return count_lines(filename)
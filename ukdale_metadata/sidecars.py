@@ -0,0 +1,79 @@
+"""Sidecar files written alongside the YAML metadata.
+
+Per-meter results which are too big to go in the YAML (e.g. arrays of
+timestamps) are written to files under OUTPUT_PATH and referenced from
+the meter's metadata by their path relative to OUTPUT_PATH.  Sidecar paths
+mirror the meter's data_location, e.g. the good sections of
+`house_1/channel_5.dat` go in `good_sections/house_1/channel_5.npy`.
+"""
+from __future__ import print_function, division
+import errno
+import posixpath
+from os import makedirs, rename
+from os.path import dirname, isfile, join
+import numpy as np
+
+
+def sidecar_location(kind, data_location, extension):
+    """Returns the path, relative to OUTPUT_PATH, of a sidecar file.
+
+    Parameters
+    ----------
+    kind : str
+        e.g. 'good_sections'.  Used as the top-level directory.
+    data_location : str
+        The meter's data_location, e.g. 'house_1/channel_5.dat'.
+    extension : str
+        e.g. '.npy'
+    """
+    return posixpath.join(
+        kind, posixpath.splitext(data_location)[0] + extension)
+
+
+def _make_parent_dirs(filename):
+    try:
+        makedirs(dirname(filename))
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def save_array(output_path, location, array):
+    """Atomically writes `array` to `location` (relative to `output_path`)
+    in NumPy's .npy format."""
+    filename = join(output_path, location)
+    _make_parent_dirs(filename)
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as fh:
+        np.save(fh, array)
+    rename(tmp_filename, filename)
+
+
+def load_array(output_path, location):
+    """Loads a sidecar written by `save_array`, or returns None if it is
+    missing."""
+    filename = join(output_path, location)
+    if not isfile(filename):
+        return None
+    return np.load(filename)
+
+
+def save_arrays(output_path, location, **arrays):
+    """Atomically writes named `arrays` to `location` (relative to
+    `output_path`) as a compressed NumPy .npz file, one array per column."""
+    filename = join(output_path, location)
+    _make_parent_dirs(filename)
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as fh:
+        np.savez_compressed(fh, **arrays)
+    rename(tmp_filename, filename)
+
+
+def load_arrays(output_path, location):
+    """Loads a sidecar written by `save_arrays` into a dict of arrays, or
+    returns None if it is missing."""
+    filename = join(output_path, location)
+    if not isfile(filename):
+        return None
+    with np.load(filename) as npz:
+        return dict(npz.items())
@@ -0,0 +1,138 @@
+"""Binary snapshot of the YAML metadata written by the converter.
+
+Parsing dataset.yaml and building1.yaml..building5.yaml with PyYAML takes
+a noticeable time, which every process which reads the metadata pays at
+startup.  The converter therefore also writes `metadata.pickle` to
+OUTPUT_PATH, which holds the already-parsed YAML files along with the
+SHA-256 of each YAML file it was made from.
+
+`load_metadata` uses the snapshot if it is intact and every YAML file it
+was made from is unchanged (and no YAML file has been added), and parses
+the YAML otherwise.  Hashing the YAML files is much cheaper than parsing
+them.  As with any pickle, only load snapshots from a trusted OUTPUT_PATH.
+"""
+from __future__ import print_function, division
+import hashlib
+import pickle
+import sys
+from os import listdir, rename
+from os.path import isfile, join
+import yaml
+
+SNAPSHOT_FILENAME = 'metadata.pickle'
+
+# Bump whenever the layout of the snapshot changes so that stale
+# snapshots are ignored rather than misread.
+SNAPSHOT_VERSION = 1
+MAGIC = b'UK-DALE metadata snapshot'
+
+# Protocol 2 is the newest that Python 2 can read
+PICKLE_PROTOCOL = 2
+
+_SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def snapshot_filename(output_path):
+    return join(output_path, SNAPSHOT_FILENAME)
+
+
+def metadata_filenames(output_path):
+    """Returns the names of the YAML metadata files in `output_path`."""
+    return sorted(
+        name for name in listdir(output_path)
+        if name == 'dataset.yaml' or
+        (name.startswith('building') and name.endswith('.yaml')))
+
+
+def _read(filename):
+    with open(filename, 'rb') as fh:
+        return fh.read()
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _parse(filenames, output_path):
+    """Returns dict mapping each YAML filename to its parsed contents and
+    a list of (filename, sha256) pairs."""
+    metadata = {}
+    sources = []
+    for name in filenames:
+        text = _read(join(output_path, name))
+        metadata[name] = yaml.load(text, Loader=_SafeLoader)
+        sources.append((name, _sha256(text)))
+    return metadata, sources
+
+
+def write_snapshot(output_path):
+    """Writes a snapshot of the YAML metadata files in `output_path`.
+
+    The snapshot is made by parsing the YAML files as written, so it
+    holds exactly what `yaml.safe_load` would return for each of them.
+    """
+    metadata, sources = _parse(metadata_filenames(output_path), output_path)
+    payload = pickle.dumps(
+        {'sources': sources, 'metadata': metadata}, PICKLE_PROTOCOL)
+    header = b' '.join(
+        [MAGIC, str(SNAPSHOT_VERSION).encode('ascii'),
+         _sha256(payload).encode('ascii')])
+    filename = snapshot_filename(output_path)
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as fh:
+        fh.write(header + b'\n')
+        fh.write(payload)
+    rename(tmp_filename, filename)
+
+
+def _loads(payload):
+    if sys.version_info[0] >= 3:
+        # Strings pickled by Python 2 are bytes until decoded
+        return pickle.loads(payload, encoding='utf-8')
+    return pickle.loads(payload)
+
+
+def read_snapshot(output_path, filenames=None):
+    """Returns the metadata held in the snapshot in `output_path`, or None
+    if there is no snapshot or it is corrupt, from another version or out
+    of date with respect to the YAML files."""
+    filename = snapshot_filename(output_path)
+    if not isfile(filename):
+        return None
+    header, _, payload = _read(filename).partition(b'\n')
+    fields = header.split(b' ')
+    if (b' '.join(fields[:-2]) != MAGIC or
+            fields[-2:-1] != [str(SNAPSHOT_VERSION).encode('ascii')] or
+            fields[-1] != _sha256(payload).encode('ascii')):
+        return None
+    try:
+        snapshot = _loads(payload)
+    except Exception:
+        return None
+
+    if filenames is None:
+        filenames = metadata_filenames(output_path)
+    sources = snapshot['sources']
+    if [name for name, _ in sources] != filenames:
+        return None
+    for name, sha256 in sources:
+        if _sha256(_read(join(output_path, name))) != sha256:
+            return None
+    return snapshot['metadata']
+
+
+def load_metadata(output_path):
+    """Loads the YAML metadata files in `output_path`, from the snapshot
+    if it is valid.
+
+    Returns
+    -------
+    metadata : dict
+        Maps each YAML filename (e.g. 'building1.yaml') to its parsed
+        contents.
+    """
+    filenames = metadata_filenames(output_path)
+    metadata = read_snapshot(output_path, filenames)
+    if metadata is None:
+        metadata, _ = _parse(filenames, output_path)
+    return metadata
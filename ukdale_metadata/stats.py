@@ -0,0 +1,147 @@
+"""Streaming per-meter statistics.
+
+The statistics are accumulated chunk-by-chunk into a small, JSON-friendly
+state dict so that memory use does not depend on the size of the data file
+and so that the state can be kept in the conversion cache and carried on
+from when more data is appended to a file.
+"""
+from __future__ import print_function, division
+import numpy as np
+
+from .cache import UNCHANGED, APPENDED
+from .reader import iter_chunks
+
+# Bin edges (in seconds) for the histogram of intervals between
+# consecutive samples.  The last bin holds everything at or above the last
+# edge; intervals shorter than 1 second (including out-of-order samples)
+# are counted in the first bin.
+SAMPLE_PERIOD_BIN_EDGES = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 12, 15, 20, 30,
+                           60, 120, 300, 600, 1800, 3600, 86400]
+
+
+def new_state(upper_limit=None):
+    """Returns an empty statistics state.
+
+    Parameters
+    ----------
+    upper_limit : number, optional
+        The meter's clip upper limit.  Samples at or above this are
+        counted as clipped.
+    """
+    return {
+        'upper_limit': upper_limit,
+        'n_samples': 0,
+        'n_clipped': 0,
+        'sum': 0.0,
+        'min': None,
+        'max': None,
+        'last_timestamp': None,
+        'period_counts': [0] * len(SAMPLE_PERIOD_BIN_EDGES)
+    }
+
+
+def update_state(state, timestamps, power):
+    """Adds a chunk of samples to `state` (in place)."""
+    if not timestamps.size:
+        return
+
+    if state['last_timestamp'] is None:
+        intervals = np.diff(timestamps)
+    else:
+        intervals = np.diff(timestamps, prepend=state['last_timestamp'])
+    bins = np.searchsorted(SAMPLE_PERIOD_BIN_EDGES, intervals, side='right') - 1
+    counts = np.bincount(np.clip(bins, 0, None),
+                         minlength=len(SAMPLE_PERIOD_BIN_EDGES))
+    state['period_counts'] = [
+        old + int(new) for old, new in zip(state['period_counts'], counts)]
+
+    chunk_min = float(power.min())
+    chunk_max = float(power.max())
+    if state['min'] is None or chunk_min < state['min']:
+        state['min'] = chunk_min
+    if state['max'] is None or chunk_max > state['max']:
+        state['max'] = chunk_max
+    state['sum'] += float(power.sum())
+    state['n_samples'] += int(timestamps.size)
+    if state['upper_limit'] is not None:
+        state['n_clipped'] += int(np.count_nonzero(power >= state['upper_limit']))
+    state['last_timestamp'] = float(timestamps[-1])
+
+
+def scan_statistics(filename, upper_limit=None, state=None, offset=0):
+    """Streams through `filename` accumulating statistics.
+
+    Parameters
+    ----------
+    filename : str
+    upper_limit : number, optional
+    state : dict, optional
+        Statistics state for the part of the file before `offset`.  If
+        given then the line at `offset` must be the last line which was
+        already counted in `state`.
+    offset : int, optional
+
+    Returns
+    -------
+    state : dict
+    """
+    if state is None:
+        state = new_state(upper_limit)
+        skip = 0
+    else:
+        state = dict(state)
+        skip = 1
+
+    for timestamps, values in iter_chunks(filename, offset=offset):
+        timestamps, power = timestamps[skip:], values[skip:, 0]
+        skip = 0
+        update_state(state, timestamps, power)
+    return state
+
+
+def update_statistics(filename, status, old_entry, upper_limit=None):
+    """Returns statistics state for `filename`, reusing cached work.
+
+    Parameters
+    ----------
+    filename : str
+    status : str
+        How the file changed since `old_entry`, as reported by
+        `cache.scan_boundaries`.
+    old_entry : dict or None
+        The previous cache entry for `filename`.
+    upper_limit : number, optional
+
+    Returns
+    -------
+    state : dict
+    """
+    state = (old_entry or {}).get('statistics')
+    if state is not None and state['upper_limit'] == upper_limit:
+        if status == UNCHANGED:
+            return state
+        elif status == APPENDED:
+            return scan_statistics(filename, upper_limit, state=state,
+                                   offset=old_entry['last_line_offset'])
+    return scan_statistics(filename, upper_limit)
+
+
+def statistics_metadata(state):
+    """Converts a statistics state into a dict for the meter metadata."""
+    n_samples = state['n_samples']
+    statistics = {
+        'n_samples': n_samples,
+        'sample_period_histogram': {
+            'bin_edges': list(SAMPLE_PERIOD_BIN_EDGES),
+            'counts': list(state['period_counts'])
+        }
+    }
+    if n_samples:
+        statistics['power'] = {
+            'min': state['min'],
+            'max': state['max'],
+            'mean': state['sum'] / n_samples
+        }
+        if state['upper_limit'] is not None:
+            statistics['clipped_fraction'] = state['n_clipped'] / n_samples
+    return statistics
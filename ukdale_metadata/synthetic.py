@@ -0,0 +1,202 @@
+"""Writes a synthetic dataset laid out like the raw UK-DALE data.
+
+The real data runs to many gigabytes, so this makes a stand-in which the
+converter can be run on: the same houses, channel numbers and labels as
+UK-DALE (plus, optionally, extra channels), with each channel sampled at
+its meter device's sample_period, occasional gaps and appliance-like
+on/off power readings.  Only the length of the recording (and so the
+file sizes) needs to be chosen.
+"""
+from __future__ import print_function, division
+import errno
+from os import makedirs
+from os.path import join
+import numpy as np
+
+from .metadata import appliances_for_each_building, meter_devices
+
+# Number of channels in each house's labels.dat
+N_CHANNELS = {1: 53, 2: 19, 3: 5, 4: 6, 5: 25}
+
+# Houses with a sound card power meter (mains.dat)
+SCPM_HOUSES = (1, 2, 5)
+
+# 2013-01-01T00:00:00Z
+START = 1356998400
+
+# Mean number of dropouts per day, and their maximum length in seconds
+DROPOUTS_PER_DAY = 0.5
+MAX_DROPOUT = 2 * 3600
+
+# Channels of house 1 which are recorded by CurrentCostTx transmitters
+CURRENT_COST_LABELS = ('boiler', 'solar_thermal_pump', 'lighting_circuit',
+                       'kitchen_lights')
+
+
+def house_labels(building_i, extra_channels=0):
+    """Returns a dict mapping channel number to a unique label.
+
+    Channel 1 is the aggregate and each appliance which is found by its
+    `original_name` gets a channel with that label.  Any other channels,
+    including `extra_channels` beyond the real ones, are labelled
+    'channel_N'.
+    """
+    n_channels = N_CHANNELS[building_i] + extra_channels
+    labels = {1: 'aggregate'}
+    unmetered = []
+    for appliance in appliances_for_each_building[building_i]:
+        name = appliance.get('original_name')
+        # Several appliances can share a channel
+        if name is None or name in unmetered or name in labels.values():
+            continue
+        meters = appliance.get('meters')
+        if not meters:
+            unmetered.append(name)
+        elif len(meters) == 1 and meters[0] not in labels:
+            labels[meters[0]] = name
+    free = [chan for chan in range(2, n_channels + 1) if chan not in labels]
+    if len(unmetered) > len(free):
+        raise ValueError(
+            'house {:d} has too few channels'.format(building_i))
+    labels.update(zip(free, unmetered))
+    for chan in range(1, n_channels + 1):
+        labels.setdefault(chan, 'channel_{:d}'.format(chan))
+    return labels
+
+
+def timestamps(rng, start, duration, sample_period, max_sample_period,
+               dropouts_per_day=DROPOUTS_PER_DAY):
+    """Returns int64 timestamps every `sample_period` seconds from `start`
+    for `duration` seconds, with some samples dropped (gaps of up to
+    max_sample_period) and occasional longer dropouts."""
+    n = int(duration // sample_period)
+    periods = np.full(n, sample_period, dtype=np.int64)
+    # Wireless transmitters miss the odd sample...
+    missed = rng.random_sample(n) < 0.01
+    periods[missed] = rng.randint(
+        sample_period + 1, max_sample_period + 1, size=missed.sum())
+    # ...and sometimes drop out for a while
+    dropout_probability = dropouts_per_day * sample_period / 86400
+    dropouts = rng.random_sample(n) < dropout_probability
+    periods[dropouts] = rng.randint(
+        max_sample_period + 1, MAX_DROPOUT, size=dropouts.sum())
+    t = start + np.cumsum(periods)
+    return t[t < start + duration]
+
+
+def power(rng, n, on_power, upper_limit, mean_on_samples=50,
+          mean_off_samples=500):
+    """Returns `n` power readings which switch between standby and
+    `on_power` (with noise), clipped to [0, upper_limit]."""
+    states = []
+    total = 0
+    on = False
+    while total < n:
+        mean = mean_on_samples if on else mean_off_samples
+        length = rng.geometric(1 / mean)
+        states.append(np.full(length, on, dtype=bool))
+        total += length
+        on = not on
+    states = np.concatenate(states)[:n]
+    watts = rng.uniform(0, 5, size=n)
+    watts[states] = on_power * rng.normal(1, 0.05, size=states.sum())
+    return np.clip(watts, 0, upper_limit)
+
+
+def _device_model(building_i, label):
+    if label == 'aggregate':
+        return 'EcoManagerWholeHouseTx'
+    if building_i == 1 and label in CURRENT_COST_LABELS:
+        return 'CurrentCostTx'
+    return 'EcoManagerTxPlug'
+
+
+def _write_lines(filename, columns, formats):
+    fmt = ' '.join(formats)
+    with open(filename, 'w') as fh:
+        np.savetxt(fh, np.column_stack(columns), fmt=fmt)
+
+
+def write_house(data_path, building_i, duration, start=START,
+                extra_channels=0, seed=0,
+                dropouts_per_day=DROPOUTS_PER_DAY):
+    """Writes house_N/labels.dat, a channel_N.dat for every channel and,
+    for houses with a sound card power meter, mains.dat.
+
+    Returns
+    -------
+    n_lines : int
+        Total number of lines written to the data files.
+    """
+    devices = meter_devices()
+    house_path = join(data_path, 'house_{:d}'.format(building_i))
+    try:
+        makedirs(house_path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    labels = house_labels(building_i, extra_channels)
+    with open(join(house_path, 'labels.dat'), 'w') as fh:
+        for chan in sorted(labels):
+            fh.write('{:d} {}\n'.format(chan, labels[chan]))
+
+    n_lines = 0
+    for chan in sorted(labels):
+        rng = np.random.RandomState([seed, building_i, chan])
+        device = devices[_device_model(building_i, labels[chan])]
+        upper_limit = device['measurements'][0]['upper_limit']
+        t = timestamps(rng, start, duration, device['sample_period'],
+                       device['max_sample_period'], dropouts_per_day)
+        on_power = upper_limit / 4 if chan == 1 else rng.uniform(20, 3000)
+        watts = power(rng, len(t), min(on_power, upper_limit), upper_limit)
+        _write_lines(join(house_path, 'channel_{:d}.dat'.format(chan)),
+                     [t, np.round(watts)], ['%d', '%d'])
+        n_lines += len(t)
+
+    if building_i in SCPM_HOUSES:
+        rng = np.random.RandomState([seed, building_i, 0])
+        device = devices['SoundCardPowerMeter']
+        upper_limit = device['measurements'][0]['upper_limit']
+        t = timestamps(rng, start, duration, device['sample_period'],
+                       device['max_sample_period'], dropouts_per_day)
+        active = power(rng, len(t), 2000, upper_limit, mean_on_samples=600,
+                       mean_off_samples=1800) + 150
+        apparent = active * rng.uniform(1, 1.2, size=len(t))
+        voltage = rng.normal(240, 2, size=len(t))
+        _write_lines(join(house_path, 'mains.dat'),
+                     [t, active, apparent, voltage],
+                     ['%d', '%.2f', '%.2f', '%.2f'])
+        n_lines += len(t)
+    return n_lines
+
+
+def write_dataset(data_path, days=1, start=START, extra_channels=0, seed=0,
+                  dropouts_per_day=DROPOUTS_PER_DAY):
+    """Writes a synthetic dataset covering `days` days to `data_path`.
+
+    Parameters
+    ----------
+    data_path : str
+        Becomes the converter's RAW_UKPD_DATA_PATH.
+    days : float, optional
+        Length of the recording.  Roughly 25 MB per day, at 6 seconds per
+        sample for each channel and 1 second for mains.dat.
+    start : int, optional
+        UNIX timestamp of the start of the recording.
+    extra_channels : int, optional
+        Number of extra channels to add to each house.
+    seed : int, optional
+    dropouts_per_day : float, optional
+        Mean number of dropouts of up to MAX_DROPOUT seconds per day in
+        each data file.
+
+    Returns
+    -------
+    n_lines : int
+        Total number of lines written to the data files.
+    """
+    return sum(
+        write_house(data_path, building_i, days * 86400, start,
+                    extra_channels, seed, dropouts_per_day)
+        for building_i in sorted(N_CHANNELS))